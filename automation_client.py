@@ -0,0 +1,99 @@
+# automation_client.py
+# 自动化接口的 Python 客户端，只依赖标准库，脚本中无需安装 PySide6：
+#
+#     from automation_client import AutomationClient
+#     with AutomationClient() as client:
+#         note = client.call("create", text="构建开始")["id"]
+#         client.batch([("append_text", {"note": note, "text": f"第 {i} 步"}) for i in range(500)])
+#
+# 协议为 JSON-RPC 2.0，每行一个请求或批量请求(数组)，实例回复一行
+import json
+import os
+import socket
+
+from instance_client import SERVER_NAME, server_address
+
+# 设置为 1 时实例启动自动化接口
+AUTOMATION_ENV = "FLASHNOTE_AUTOMATION"
+# 自动化接口的本地套接字名称，可通过环境变量指定
+AUTOMATION_NAME = os.environ.get("FLASHNOTE_AUTOMATION_NAME") or f"{SERVER_NAME}-automation"
+TIMEOUT_SECONDS = 30
+
+
+def enabled_by_env():
+    return os.environ.get(AUTOMATION_ENV) == "1"
+
+
+class AutomationError(Exception):
+    """实例返回的 JSON-RPC 错误"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{message} ({code})")
+        self.code = code
+        self.message = message
+
+
+class AutomationClient:
+    """与运行中的实例保持一个连接，可以连续发送多个请求"""
+
+    def __init__(self, server_name=AUTOMATION_NAME, timeout=TIMEOUT_SECONDS):
+        address = server_address(server_name)
+        if os.name == "nt":
+            self._stream = open(r"\\.\pipe\\" + address, "r+b", buffering=0)
+            self._socket = None
+        else:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(timeout)
+            self._socket.connect(address)
+            self._stream = self._socket.makefile("rwb")
+        self._next_id = 0
+
+    def close(self):
+        self._stream.close()
+        if self._socket is not None:
+            self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _request(self, method, params):
+        self._next_id += 1
+        return {"jsonrpc": "2.0", "id": self._next_id, "method": method, "params": params}
+
+    def _send(self, message):
+        self._stream.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._stream.flush()
+        line = self._stream.readline()
+        if not line:
+            raise ConnectionError("实例关闭了连接")
+        return json.loads(line)
+
+    @staticmethod
+    def _result(response):
+        if "error" in response:
+            raise AutomationError(response["error"]["code"], response["error"]["message"])
+        return response["result"]
+
+    def call(self, method, **params):
+        """调用一个方法并返回结果，出错时抛出 AutomationError"""
+        return self._result(self._send(self._request(method, params)))
+
+    def batch(self, calls):
+        """
+        批量调用 [(方法, 参数)]，实例在一次主线程处理中完成全部操作。
+        按顺序返回各个结果，出错的调用对应的是 AutomationError 对象而不是抛出
+        """
+        requests = [self._request(method, params) for method, params in calls]
+        if not requests:
+            return []
+        responses = {response.get("id"): response for response in self._send(requests)}
+        results = []
+        for request in requests:
+            try:
+                results.append(self._result(responses[request["id"]]))
+            except AutomationError as e:
+                results.append(e)
+        return results
@@ -0,0 +1,366 @@
+# automation_server.py
+import inspect
+import json
+import os
+
+from PySide6.QtCore import QObject
+from PySide6.QtGui import QColor
+from PySide6.QtNetwork import QLocalServer
+
+import sticky_note
+from automation_client import AUTOMATION_NAME
+from instance_client import server_address
+from instance_server import listen
+from layout_manager import clamp_geometry
+from search_index import get_search_index
+from style_cache import deferred_styles
+
+# JSON-RPC 2.0 错误码
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+# search 默认最多返回的结果数，list 与 search 中标题的长度
+SEARCH_LIMIT = 20
+TITLE_LENGTH = 30
+THEMES = {"dark": "set_dark_mode", "light": "set_light_mode", "system": "set_system_theme_mode"}
+
+# 实际执行的修改次数：文字写入、尺寸变化(都会让文档重新排版)与置顶切换(会重建原生窗口)
+stats = {"requests": 0, "text_writes": 0, "resizes": 0, "pin_changes": 0, "font_changes": 0}
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class Batch:
+    """
+    一次请求(单个或批量)中的全部操作，在主线程中一次处理完。
+    文字、位置大小、置顶和字号的修改先按便签合并，结束时(或需要读取该便签时)每个便签只应用一次，
+    500 次更新不会触发 500 次重新排版；样式表由 deferred_styles 合并，每个控件只 polish 一次
+    """
+
+    def __init__(self):
+        # 窗口 -> 尚未应用的修改
+        self.changes = {}
+        # 窗口 -> 修改了它的请求序号；正在处理的请求序号
+        self.requests = {}
+        self.request = None
+        # 请求序号 -> 应用其修改时的错误信息
+        self.failures = {}
+        # 本次新建的便签，样式表应用之后再显示
+        self.created = []
+
+    def change(self, window):
+        change = self.changes.get(window)
+        if change is None:
+            change = self.changes[window] = {"content": None, "html": False, "append": [], "geometry": None,
+                                             "pinned": None, "font_size": None}
+        self.requests.setdefault(window, set()).add(self.request)
+        return change
+
+    def flush(self, window=None):
+        """
+        应用尚未应用的修改；window 不为 None 时只应用该便签的。
+        出错时记录到修改了该便签的每个请求，其他便签照常应用
+        """
+        for target in [window] if window is not None else list(self.changes):
+            change = self.changes.pop(target, None)
+            requests = self.requests.pop(target, ())
+            if change is None:
+                continue
+            try:
+                self._apply(target, change)
+            except Exception as e:
+                for request in requests:
+                    self.failures.setdefault(request, f"应用修改时出错: {type(e).__name__}: {e}")
+
+    def _apply(self, window, change):
+        if change["geometry"] is not None:
+            x, y, width, height = change["geometry"]
+            window.move(x, y)
+            if (width, height) != (window.width(), window.height()):
+                window.resize(width, height)
+                stats["resizes"] += 1
+        if change["pinned"] is not None and change["pinned"] != window.is_pinned:
+            window.set_pinned(change["pinned"])
+            stats["pin_changes"] += 1
+        text_edit = window.text_edit
+        if change["font_size"] is not None and change["font_size"] != text_edit.current_font_size:
+            text_edit.current_font_size = change["font_size"]
+            text_edit.set_font_size()
+            stats["font_changes"] += 1
+        if change["content"] is not None:
+            text_edit.replace_content(change["content"], html=change["html"])
+            stats["text_writes"] += 1
+        if change["append"]:
+            text_edit.append_text("\n".join(change["append"]))
+            stats["text_writes"] += 1
+        window.schedule_save()
+
+    def show_created(self):
+        for window in self.created:
+            window.show()
+            window.save()
+        self.created = []
+
+
+def _window(note):
+    window = sticky_note.note_window(str(note))
+    if window is None:
+        raise RpcError(INVALID_PARAMS, f"找不到便签: {note}")
+    return window
+
+
+def _color(value):
+    color = QColor(value)
+    if not color.isValid():
+        raise RpcError(INVALID_PARAMS, f"无效的颜色: {value}")
+    return color
+
+
+def _text(value, name="text"):
+    if not isinstance(value, str):
+        raise RpcError(INVALID_PARAMS, f"{name} 必须是字符串")
+    return value
+
+
+def _integer(value, name):
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise RpcError(INVALID_PARAMS, f"{name} 必须是整数")
+    return value
+
+
+def _geometry_param(value):
+    """参数中的 [x, y, 宽, 高]"""
+    if not isinstance(value, list) or len(value) != 4:
+        raise RpcError(INVALID_PARAMS, "geometry 必须是 [x, y, 宽, 高]")
+    return [_integer(item, "geometry") for item in value]
+
+
+def _geometry(window, change=None):
+    if change is not None and change["geometry"] is not None:
+        return change["geometry"]
+    geometry = window.geometry()
+    return [geometry.x(), geometry.y(), geometry.width(), geometry.height()]
+
+
+def create(batch, text="", html=None, geometry=None, pinned=False):
+    """新建便签，返回 {"id": 便签 id}；没有指定位置时相对上一个便签错开"""
+    # 先检查全部参数，出错时不会留下创建了一半的便签
+    state = {"id": os.urandom(16).hex(), "is_pinned": bool(pinned)}
+    if html is not None:
+        state["html"] = _text(html, "html")
+    else:
+        state["text"] = _text(text)
+    if geometry is not None:
+        state["geometry"] = clamp_geometry(_geometry_param(geometry))
+    window = sticky_note.create_window(state)
+    if geometry is None:
+        sticky_note.cascade(window)
+    batch.created.append(window)
+    return {"id": window.note_id}
+
+
+def get(batch, note):
+    """便签的纯文本、位置与样式"""
+    window = _window(note)
+    batch.flush(window)
+    text_edit = window.text_edit
+    return {"id": window.note_id, "text": text_edit.toPlainText(), "geometry": _geometry(window),
+            "is_pinned": window.is_pinned, "hidden": window.is_hidden, "bg_color": text_edit.style_manager.bg_color,
+            "text_color": text_edit.style_manager.text_color, "theme": text_edit.user_theme_preference or "system",
+            "font_size": text_edit.current_font_size}
+
+
+def set_text(batch, note, text=None, html=None):
+    """替换便签内容(纯文本或 HTML)，可以撤销"""
+    if (text is None) == (html is None):
+        raise RpcError(INVALID_PARAMS, "需要 text 或 html 其中之一")
+    content, is_html = (_text(html, "html"), True) if html is not None else (_text(text), False)
+    change = batch.change(_window(note))
+    change["content"], change["html"] = content, is_html
+    change["append"] = []
+    return True
+
+
+def append_text(batch, note, text):
+    """在便签末尾另起一段追加纯文本"""
+    _text(text)
+    change = batch.change(_window(note))
+    if change["content"] is not None and not change["html"] and not change["append"]:
+        # 同一批中先替换再追加，合并为一次写入
+        change["content"] = change["content"] + "\n" + text if change["content"] else text
+    else:
+        change["append"].append(text)
+    return True
+
+
+def set_style(batch, note, bg_color=None, text_color=None, theme=None, font_size=None):
+    """设置背景色、文字颜色、主题("dark"/"light"/"system")或字号"""
+    window = _window(note)
+    text_edit = window.text_edit
+    if theme is not None:
+        if theme not in THEMES:
+            raise RpcError(INVALID_PARAMS, f"无效的主题: {theme}")
+        getattr(text_edit, THEMES[theme])()
+    if bg_color is not None or text_color is not None:
+        colors = {"bg_color": _color(bg_color) if bg_color is not None else None,
+                  "text_color": _color(text_color) if text_color is not None else None}
+        text_edit.user_theme_preference = "custom"
+        text_edit.update_style(**colors)
+    if font_size is not None:
+        if not isinstance(font_size, int) or font_size <= 0:
+            raise RpcError(INVALID_PARAMS, f"无效的字号: {font_size}")
+        batch.change(window)["font_size"] = font_size
+    return True
+
+
+def pin(batch, note, pinned=True):
+    """置顶或取消置顶"""
+    batch.change(_window(note))["pinned"] = bool(pinned)
+    return True
+
+
+def move(batch, note, x=None, y=None, width=None, height=None):
+    """移动便签或调整大小，省略的参数保持不变；位置限制在屏幕内"""
+    window = _window(note)
+    values = [(index, _integer(value, name))
+              for index, (name, value) in enumerate((("x", x), ("y", y), ("width", width), ("height", height)))
+              if value is not None]
+    change = batch.change(window)
+    geometry = list(_geometry(window, change))
+    for index, value in values:
+        geometry[index] = value
+    change["geometry"] = clamp_geometry(geometry)
+    return True
+
+
+def search(batch, query, limit=SEARCH_LIMIT):
+    """搜索便签，返回 [{"id", "title", "snippet"}]"""
+    batch.flush()
+    sticky_note.finish_restore()
+    index = get_search_index()
+    return [{"id": note_id, "title": index.title(note_id, TITLE_LENGTH), "snippet": index.snippet(note_id, query)}
+            for note_id in index.search(query, limit=limit)]
+
+
+def list_notes(batch):
+    """列出所有便签，返回 [{"id", "title", "hidden"}]"""
+    batch.flush()
+    sticky_note.finish_restore()
+    index = get_search_index()
+    index.flush()
+    return [{"id": note_id, "title": index.title(note_id, TITLE_LENGTH), "hidden": note_id in sticky_note.hidden_notes}
+            for note_id in index.notes]
+
+
+def close(batch, note):
+    """关闭便签(归档)；不能关闭最后一个便签，否则应用会退出"""
+    window = _window(note)
+    if sticky_note.window_count <= 1:
+        raise RpcError(INVALID_PARAMS, "不能关闭最后一个便签")
+    batch.flush(window)
+    if window in batch.created:
+        batch.created.remove(window)
+    window.close_and_update_count()
+    return True
+
+
+def get_stats(batch):
+    """实际执行的修改次数，用于检查批量请求的合并效果"""
+    return dict(stats)
+
+
+METHODS = {"create": create, "get": get, "set_text": set_text, "append_text": append_text, "set_style": set_style,
+           "pin": pin, "move": move, "search": search, "list": list_notes, "close": close, "stats": get_stats}
+
+
+def _error(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+class AutomationServer(QObject):
+    """
+    本地自动化接口(JSON-RPC 2.0)，只允许当前用户连接。
+    每行一个请求或批量请求(数组)，回复一行；批量请求在一次主线程处理中完成
+    """
+
+    def __init__(self, server_name=AUTOMATION_NAME, parent=None):
+        super().__init__(parent)
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.SocketOption.UserAccessOption)
+        self.server.newConnection.connect(self._on_new_connection)
+        if not listen(self.server, server_address(server_name)):
+            print(f"无法启动自动化接口: {self.server.errorString()}")
+
+    def _on_new_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            socket.readyRead.connect(lambda s=socket: self._on_ready_read(s))
+            socket.disconnected.connect(socket.deleteLater)
+
+    def _on_ready_read(self, socket):
+        while socket.canReadLine():
+            reply = self.handle_line(socket.readLine().data())
+            if reply is not None:
+                socket.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+        socket.flush()
+
+    def handle_line(self, line):
+        """处理一行请求，返回回复；全部是通知(没有 id)时返回 None"""
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return _error(None, PARSE_ERROR, "无法解析的 JSON")
+        if isinstance(message, list) and not message:
+            return _error(None, INVALID_REQUEST, "空的批量请求")
+        requests = message if isinstance(message, list) else [message]
+        batch = Batch()
+        responses = []
+        with deferred_styles():
+            for index, request in enumerate(requests):
+                batch.request = index
+                responses.append(self._call(batch, request))
+            batch.flush()
+        batch.show_created()
+        # 修改没能应用的请求改为回复错误
+        for index, error in batch.failures.items():
+            if responses[index] is not None and "result" in responses[index]:
+                responses[index] = _error(responses[index]["id"], SERVER_ERROR, error)
+        responses = [response for response in responses if response is not None]
+        if isinstance(message, list):
+            return responses or None
+        return responses[0] if responses else None
+
+    def _call(self, batch, request):
+        stats["requests"] += 1
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), str):
+            return _error(None, INVALID_REQUEST, "无效的请求")
+        try:
+            result = self._invoke(batch, request)
+        except RpcError as e:
+            response = _error(request.get("id"), e.code, e.message)
+        except Exception as e:
+            response = _error(request.get("id"), SERVER_ERROR, f"{type(e).__name__}: {e}")
+        else:
+            response = {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+        # 通知(没有 id 的请求)不回复
+        return response if "id" in request else None
+
+    @staticmethod
+    def _invoke(batch, request):
+        method = METHODS.get(request["method"])
+        if method is None:
+            raise RpcError(METHOD_NOT_FOUND, f"没有这个方法: {request['method']}")
+        params = request.get("params", {})
+        try:
+            arguments = (inspect.signature(method).bind(batch, *params) if isinstance(params, list)
+                         else inspect.signature(method).bind(batch, **params))
+        except TypeError as e:
+            raise RpcError(INVALID_PARAMS, str(e))
+        return method(*arguments.args, **arguments.kwargs)
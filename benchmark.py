@@ -0,0 +1,1630 @@
+# benchmark.py
+"""
+FlashNote 性能基准测试，在无界面环境下运行:
+    QT_QPA_PLATFORM=offscreen python benchmark.py [基准名 ...]
+
+保存结果并与基线比较，超出允许范围的退化会使退出码为 1:
+    python benchmark.py --quick --json baseline.json
+    python benchmark.py --quick --baseline baseline.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+# 基准测试使用临时数据目录，不影响真实便签
+os.environ["FLASHNOTE_DATA_DIR"] = tempfile.mkdtemp(prefix="flashnote-bench-")
+os.environ["FLASHNOTE_SERVER_NAME"] = f"FlashNote-bench-{os.getpid()}"
+
+from PySide6.QtCore import QEvent, Qt  # noqa: E402
+from PySide6.QtWidgets import QApplication  # noqa: E402
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    """注册基准测试，名称去掉 bench_ 前缀"""
+    BENCHMARKS[func.__name__.removeprefix("bench_")] = func
+    return func
+
+
+def _sample_html(size):
+    return "<p>" + ("便签内容 sticky note text " * (size // 30 + 1))[:size] + "</p>"
+
+
+@benchmark
+def bench_store_save(notes=50, rounds=20, size=20_000):
+    """后台保存吞吐量：多个便签反复保存"""
+    from note_store import NoteStore
+    store = NoteStore(tempfile.mkdtemp(prefix="flashnote-store-"))
+    html = _sample_html(size)
+    states = [{"id": f"note-{i}", "html": html} for i in range(notes)]
+
+    start = time.perf_counter()
+    enqueue = 0.0
+    for _ in range(rounds):
+        t = time.perf_counter()
+        for state in states:
+            store.put_async(dict(state))
+        enqueue += time.perf_counter() - t
+    store.wait()
+    elapsed = time.perf_counter() - start
+    return {
+        "saves": notes * rounds,
+        "saves_per_sec": notes * rounds / elapsed,
+        "gui_thread_us_per_save": enqueue / (notes * rounds) * 1e6,
+    }
+
+
+@benchmark
+def bench_restore(notes=50, size=20_000):
+    """启动恢复耗时：读取存储并创建所有便签窗口"""
+    import sticky_note
+    from note_store import NoteStore
+    directory = tempfile.mkdtemp(prefix="flashnote-store-")
+    store = NoteStore(directory)
+    html = _sample_html(size)
+    for i in range(notes):
+        store.put({"id": f"note-{i}", "html": html, "geometry": [30 * i, 30 * i, 400, 300]})
+
+    start = time.perf_counter()
+    restored = NoteStore(directory)
+    load = time.perf_counter() - start
+    windows = [sticky_note.create_window(state) for state in restored.notes.values()]
+    for window in windows:
+        window.show()
+    QApplication.processEvents()
+    elapsed = time.perf_counter() - start
+    _close_windows(windows)
+    return {"notes": notes, "load_ms": load * 1e3, "restore_ms": elapsed * 1e3}
+
+
+@benchmark
+def bench_session(notes=200, size=2_000):
+    """
+    启动时恢复大量便签：一次性同步创建全部窗口(旧做法)与 SessionRestorer 按优先级分批恢复的对比。
+    first_note_ms 为第一个便签完成首次绘制的时间，stall_ms 为恢复期间事件循环的最大停顿
+    """
+    from PySide6.QtCore import QTimer
+    import sticky_note
+    from instrumentation import StartupTimer
+    from layout_manager import SessionRestorer, available_geometries, is_on_screen
+    html = _sample_html(size)
+    # 少数便签置顶，每十个中有一个位于已经不存在的显示器上
+    states = [{"id": f"session-{i}", "html": html, "is_pinned": i % 50 == 25,
+               "geometry": [4000, 3000, 300, 200] if i % 10 == 9 else [(7 * i) % 500, (5 * i) % 400, 300, 200]}
+              for i in range(notes)]
+
+    def measure(restore):
+        timer = StartupTimer(time.perf_counter())
+        created = []
+        poll = QTimer()
+        poll.setInterval(1)
+
+        def run(done):
+            finished = []
+            timer.watch(restore(created, lambda: finished.append(True)))
+
+            def check():
+                if finished and "first_paint_ms" in timer.phases:
+                    poll.stop()
+                    done()
+            poll.timeout.connect(check)
+            poll.start()
+
+        stall, elapsed = _max_event_loop_stall(run)
+        return created, timer.phases["first_paint_ms"], elapsed * 1e3, stall * 1e3
+
+    def legacy(created, on_finished):
+        created.extend(sticky_note.create_window(dict(state)) for state in states)
+        for window in created:
+            window.show()
+        on_finished()
+        return created[0]
+
+    # 恢复期间保持引用，避免分批恢复的定时器被回收
+    restorers = []
+
+    def staged(created, on_finished):
+        def create_window(state):
+            window = sticky_note.create_window(state)
+            created.append(window)
+            return window
+        restorer = SessionRestorer(create_window, on_finished)
+        restorers.append(restorer)
+        return restorer.start([dict(state) for state in states])
+
+    windows, legacy_first, legacy_total, legacy_stall = measure(legacy)
+    _close_windows(windows)
+    windows, first, total, stall = measure(staged)
+    screens = available_geometries()
+    if len(windows) != notes or not windows[0].is_pinned:
+        raise AssertionError("没有恢复全部便签，或没有优先恢复置顶的便签")
+    offscreen = sum(not is_on_screen([g.x(), g.y(), g.width(), g.height()], screens)
+                    for g in (window.geometry() for window in windows))
+    if offscreen:
+        raise AssertionError(f"{offscreen} 个便签恢复到了屏幕之外")
+    _close_windows(windows)
+    return {"notes": notes, "first_note_ms": first, "restore_ms": total, "stall_ms": stall,
+            "legacy_first_note_ms": legacy_first, "legacy_restore_ms": legacy_total, "legacy_stall_ms": legacy_stall}
+
+
+@benchmark
+def bench_typing(notes=30, keystrokes=500):
+    """打开多个便签时的输入延迟"""
+    import sticky_note
+    windows = [sticky_note.create_window() for _ in range(notes)]
+    for window in windows:
+        window.show()
+    QApplication.processEvents()
+
+    target = windows[-1].text_edit
+    start = time.perf_counter()
+    for _ in range(keystrokes):
+        target.insertPlainText("字")
+        QApplication.processEvents()
+    elapsed = time.perf_counter() - start
+    _close_windows(windows)
+    return {"notes": notes, "us_per_keystroke": elapsed / keystrokes * 1e6}
+
+
+@benchmark
+def bench_event_overhead(note_counts=(1, 10, 100), events=20_000):
+    """应用内每个事件的分发开销，以及系统主题变化时通知所有便签的耗时"""
+    import sticky_note
+    from PySide6.QtCore import QObject
+    from theme_dispatcher import ThemeDispatcher
+    result = {}
+    receiver = QObject()
+    for count in note_counts:
+        windows = [sticky_note.create_window() for _ in range(count)]
+        event = QEvent(QEvent.Type.User)
+        start = time.perf_counter()
+        for _ in range(events):
+            QApplication.sendEvent(receiver, event)
+        result[f"us_per_event_{count}"] = (time.perf_counter() - start) / events * 1e6
+
+        start = time.perf_counter()
+        ThemeDispatcher.instance().dispatch(force=True)
+        result[f"theme_fanout_ms_{count}"] = (time.perf_counter() - start) * 1e3
+        _close_windows(windows)
+    return result
+
+
+@benchmark
+def bench_instrumentation(notes=10, calls=20_000):
+    """性能监视关闭与开启时事件处理入口的开销，以及每次汇总的耗时"""
+    import instrumentation
+    import sticky_note
+    from PySide6.QtCore import QPointF
+    from PySide6.QtGui import QMouseEvent
+    windows = [sticky_note.create_window() for _ in range(notes)]
+    for window in windows:
+        window.show()
+    QApplication.processEvents()
+    event = QMouseEvent(QEvent.Type.MouseMove, QPointF(10, 10), QPointF(10, 10),
+                        Qt.MouseButton.NoButton, Qt.MouseButton.NoButton, Qt.KeyboardModifier.NoModifier)
+
+    def handler_us():
+        handler = windows[0].window_event_handler
+        start = time.perf_counter()
+        for _ in range(calls):
+            handler.mouse_move_event(event)
+        return (time.perf_counter() - start) / calls * 1e6
+
+    result = {"handler_us": handler_us()}
+    with tempfile.TemporaryDirectory() as directory:
+        profiler = instrumentation.set_enabled(True, windows, show_overlay=False,
+                                               trace_path=os.path.join(directory, "trace.jsonl"))
+        result["probed_handler_us"] = handler_us()
+        start = time.perf_counter()
+        profiler.summarize()
+        result["summary_ms"] = (time.perf_counter() - start) * 1e3
+        instrumentation.set_enabled(False)
+    result["disabled_handler_us"] = handler_us()
+    _close_windows(windows)
+    return result
+
+
+def _rss_mb():
+    """当前进程的常驻内存(MB)；不支持 /proc 的系统返回 None"""
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")) / 1024
+    except (OSError, StopIteration):
+        return None
+
+
+@benchmark
+def bench_create_window(notes=50):
+    """创建并显示便签窗口的延迟、每个便签应用样式表的次数，以及每个便签占用的内存"""
+    import sticky_note
+    from style_cache import polish_stats, reset_polish_stats
+    QApplication.processEvents()
+    rss = _rss_mb()
+    reset_polish_stats()
+    start = time.perf_counter()
+    windows = []
+    for _ in range(notes):
+        window = sticky_note.create_window()
+        window.show()
+        windows.append(window)
+    QApplication.processEvents()
+    elapsed = time.perf_counter() - start
+    result = {"create_window_ms": elapsed / notes * 1e3,
+              "style_polishes_per_note": polish_stats["count"] / notes}
+    if rss is not None:
+        result["rss_per_note_kb"] = (_rss_mb() - rss) * 1024 / notes
+    _close_windows(windows)
+    return result
+
+
+@benchmark
+def bench_style(notes=20, rounds=100):
+    """StyleSheetManager.update_style 的耗时与重新 polish 次数（两种配色交替）"""
+    import sticky_note
+    from PySide6.QtGui import QColor
+    from style_cache import polish_stats, reset_polish_stats
+    windows = [sticky_note.create_window() for _ in range(notes)]
+    for window in windows:
+        window.show()
+    QApplication.processEvents()
+    colors = [(QColor("#fff8dc"), QColor("#333333")), (QColor("#2d2d2d"), QColor("#f0f0f0"))]
+
+    reset_polish_stats()
+    start = time.perf_counter()
+    for i in range(rounds):
+        for window in windows:
+            window.text_edit.style_manager.update_style(*colors[i % 2])
+        QApplication.processEvents()
+    elapsed = time.perf_counter() - start
+    result = {"update_style_us": elapsed / (rounds * notes) * 1e6,
+              "polish_ms": polish_stats["seconds"] * 1e3,
+              "style_polishes": polish_stats["count"]}
+    _close_windows(windows)
+    return result
+
+
+@benchmark
+def bench_context_menu(opens=10000):
+    """
+    右键菜单从触发到显示的耗时（首次创建与之后复用），
+    以及反复右键后 QObject 数量是否保持不变
+    """
+    import sticky_note
+    from PySide6.QtCore import QObject, QPoint
+    from PySide6.QtGui import QContextMenuEvent
+    from event_handlers import WindowContextMenu, TextContextMenu
+    window = sticky_note.create_window()
+    window.show()
+    QApplication.processEvents()
+    result = {}
+
+    def close_popup():
+        popup = QApplication.activePopupWidget()
+        if popup is not None:
+            popup.close()
+
+    def open_window_menu():
+        event = QContextMenuEvent(QContextMenuEvent.Reason.Mouse, QPoint(20, 20), window.mapToGlobal(QPoint(20, 20)))
+        window.window_event_handler.context_menu_event(event)
+
+    def open_text_menu():
+        window.text_event_handler.extend_text_edit_context_menu(QPoint(20, 20))
+
+    def object_count():
+        QApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+        return (len(window.findChildren(QObject)) + len(QApplication.allWidgets())
+                + len(WindowContextMenu.instance().findChildren(QObject))
+                + len(TextContextMenu.instance().findChildren(QObject)))
+
+    def popup_ms(open_menu):
+        start = time.perf_counter()
+        open_menu()
+        QApplication.processEvents()
+        elapsed = time.perf_counter() - start
+        close_popup()
+        return elapsed * 1e3
+
+    # 第一次右键时创建菜单
+    result["window_menu_first_ms"] = popup_ms(open_window_menu)
+    result["text_menu_first_ms"] = popup_ms(open_text_menu)
+    QApplication.processEvents()
+
+    objects = object_count()
+    for name, open_menu in (("window", open_window_menu), ("text", open_text_menu)):
+        elapsed = sorted(popup_ms(open_menu) for _ in range(opens // 2))
+        result[f"{name}_menu_ms"] = elapsed[len(elapsed) // 2]
+        result[f"{name}_menu_max_ms"] = elapsed[-1]
+    leaked = object_count() - objects
+    result["leaked_objects"] = leaked
+    _close_windows([window])
+    if leaked:
+        raise AssertionError(f"{opens} 次右键后多出 {leaked} 个 QObject")
+    return result
+
+
+@benchmark
+def bench_focus_switch(notes=10, switches=200):
+    """在便签之间切换焦点：样式表重新应用的次数与耗时"""
+    import sticky_note
+    from style_cache import polish_stats, reset_polish_stats
+    reset_polish_stats()
+    windows = [sticky_note.create_window() for _ in range(notes)]
+    for window in windows:
+        window.show()
+    QApplication.processEvents()
+    created = dict(polish_stats)
+
+    reset_polish_stats()
+    start = time.perf_counter()
+    for i in range(switches):
+        # 模拟 ActivationChange：上一个便签失去焦点，下一个获得焦点
+        windows[i % notes].hide_scrollbars(True)
+        windows[(i + 1) % notes].hide_scrollbars(False)
+        QApplication.processEvents()
+    elapsed = time.perf_counter() - start
+    result = {
+        "polishes_per_window": created["count"] / notes,
+        "switch_us": elapsed / switches * 1e6,
+        "switch_polishes": polish_stats["count"],
+        "switch_polish_ms": polish_stats["seconds"] * 1e3,
+    }
+    _close_windows(windows)
+    return result
+
+
+def _log_text(size):
+    line = "2024-01-01 12:00:00 INFO 构建日志 build step finished in 123 ms\n"
+    return (line * (size // len(line) + 1))[:size]
+
+
+def _max_event_loop_stall(run):
+    """
+    在事件循环中执行 run(done)，run 完成时调用 done()。
+    用 1ms 心跳定时器测量期间事件循环的最大停顿。
+    """
+    from PySide6.QtCore import QEventLoop, QTimer
+    loop = QEventLoop()
+    last = [time.perf_counter()]
+    stall = [0.0]
+
+    def beat():
+        now = time.perf_counter()
+        stall[0] = max(stall[0], now - last[0])
+        last[0] = now
+
+    heartbeat = QTimer()
+    heartbeat.setInterval(1)
+    heartbeat.timeout.connect(beat)
+    heartbeat.start()
+    start = time.perf_counter()
+    QTimer.singleShot(0, lambda: run(loop.quit))
+    loop.exec()
+    heartbeat.stop()
+    beat()
+    return stall[0], time.perf_counter() - start
+
+
+@benchmark
+def bench_paste(sizes_mb=(1, 10, 50), oneshot_max_mb=10):
+    """粘贴大段纯文本时事件循环的最大停顿：分块粘贴与一次性粘贴对比"""
+    import sticky_note
+    result = {}
+    for size_mb in sizes_mb:
+        QApplication.clipboard().setText(_log_text(size_mb * 1024 * 1024))
+        modes = [True, False] if size_mb <= oneshot_max_mb else [True]
+        for chunked in modes:
+            window = sticky_note.create_window()
+            window.show()
+            QApplication.processEvents()
+            text_edit = window.text_edit
+
+            def run(done):
+                text_edit.paste_plain_text(chunked=chunked)
+                if text_edit.chunked_edit is None:
+                    done()
+                else:
+                    _on_chunked_edit_done(text_edit, done)
+
+            stall, elapsed = _max_event_loop_stall(run)
+            mode = "chunked" if chunked else "oneshot"
+            result[f"{mode}_{size_mb}mb_max_stall_ms"] = stall * 1e3
+            result[f"{mode}_{size_mb}mb_total_ms"] = elapsed * 1e3
+            _close_windows([window])
+    return result
+
+
+def _on_chunked_edit_done(text_edit, done):
+    text_edit.chunked_edit.on_finished = lambda: (text_edit._on_chunked_edit_finished(), done())
+
+
+def _web_page_html(paragraphs=200, images=3):
+    """模拟从网页复制的内容：外层文档、样式表、脚本、大量行内样式，以及内嵌的大图（其中一张重复出现）"""
+    import base64
+    from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+    from PySide6.QtGui import QImage, QPainter, QLinearGradient, QColor
+    embedded = []
+    for i in range(images):
+        image = QImage(2400, 1600, QImage.Format.Format_RGB32)
+        gradient = QLinearGradient(0, 0, 2400, 1600)
+        gradient.setColorAt(0, QColor.fromHsv(i * 100 % 360, 160, 220))
+        gradient.setColorAt(1, QColor.fromHsv((i * 100 + 180) % 360, 200, 120))
+        painter = QPainter(image)
+        painter.fillRect(image.rect(), gradient)
+        painter.end()
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+        image.save(buffer, "PNG")
+        embedded.append(base64.b64encode(data.data()).decode())
+    css = "".join(f".c{i} {{ color: #{i:06x}; margin: {i % 9}px; font-family: Arial; }}\n" for i in range(2000))
+    body = []
+    for i in range(paragraphs):
+        style = f"font-size:{12 + i % 6}px;color:#{i * 997 % 0xffffff:06x};line-height:1.6;font-family:Georgia"
+        body.append(f'<div class="c{i} row" id="r{i}" data-track="{i}" style="{style}"><p style="margin:0 0 8px">'
+                    f'<span style="font-weight:bold;background:#eee">第 {i} 段</span> 网页正文 text '
+                    f'<a href="https://example.com/{i}" target="_blank" rel="noopener">链接</a></p></div>')
+        if i % (paragraphs // (images + 1)) == 0:
+            body.append(f'<img src="data:image/png;base64,{embedded[i % images]}" class="hero" loading="lazy">')
+    return (f"<html><head><meta charset='utf-8'><style>{css}</style><script>var a = 1 < 2;</script></head>"
+            f"<body class='page'><!--StartFragment-->{''.join(body)}<!--EndFragment--></body></html>")
+
+
+def _paste_html_in_process(mode, paragraphs, images):
+    """在独立进程中测量一种粘贴方式，前一种方式释放的内存不会被后一种复用而显得更小"""
+    from PySide6.QtCore import QMimeData
+    from PySide6.QtWidgets import QTextEdit
+    from text_editor import CustomTextEdit
+    import paste_sanitizer  # noqa: F401  粘贴时才导入的模块只加载一次，不计入粘贴的内存
+    app = QApplication.instance() or QApplication([])  # noqa: F841
+    mime = QMimeData()
+    mime.setHtml(_web_page_html(paragraphs, images))
+    result = {}
+    editor = CustomTextEdit()
+    editor.resize(500, 400)
+    editor.show()
+    QApplication.processEvents()
+    rss = _rss_mb()
+    start = time.perf_counter()
+    if mode == "sanitized":
+        editor.insertFromMimeData(mime)
+    else:
+        QTextEdit.insertFromMimeData(editor, mime)
+    result[f"{mode}_paste_ms"] = (time.perf_counter() - start) * 1e3
+    # 排版并绘制，此时才会加载图片
+    start = time.perf_counter()
+    editor.document().documentLayout().documentSize()
+    editor.viewport().repaint()
+    editor.verticalScrollBar().setValue(editor.verticalScrollBar().maximum())
+    editor.viewport().repaint()
+    result[f"{mode}_layout_ms"] = (time.perf_counter() - start) * 1e3
+    start = time.perf_counter()
+    saved = editor.toHtml()
+    result[f"{mode}_to_html_ms"] = (time.perf_counter() - start) * 1e3
+    result[f"{mode}_saved_kb"] = len(saved) // 1024
+    if rss is not None:
+        result[f"{mode}_rss_mb"] = _rss_mb() - rss
+    start = time.perf_counter()
+    editor.convert_to_plain_text(chunked=False)
+    result[f"{mode}_convert_ms"] = (time.perf_counter() - start) * 1e3
+    return result
+
+
+@benchmark
+def bench_paste_html(paragraphs=200, images=3):
+    """
+    粘贴网页内容：清理 HTML 并转存图片与直接粘贴的耗时、文档大小和内存对比。
+    清理后的内存增长超过直接粘贴视为失败
+    """
+    from PySide6.QtCore import QMimeData
+    mime = QMimeData()
+    mime.setHtml(_web_page_html(paragraphs, images))
+    result = {"html_kb": len(mime.html()) // 1024}
+    for mode in ("sanitized", "legacy"):
+        code = (f"import benchmark, json; "
+                f"print(json.dumps(benchmark._paste_html_in_process({mode!r}, {paragraphs}, {images})))")
+        output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout
+        result.update(json.loads(output.splitlines()[-1]))
+    sanitized, legacy = result.get("sanitized_rss_mb"), result.get("legacy_rss_mb")
+    if sanitized is not None and sanitized > legacy:
+        raise AssertionError(f"清理后粘贴的内存增长 {sanitized:.1f} MB 超过直接粘贴的 {legacy:.1f} MB")
+    _check_image_sweep()
+    return result
+
+
+def _check_image_sweep():
+    """清理只删除没有被引用、且在清理开始之前写入的图片；再次粘贴的已有图片保留"""
+    from PySide6.QtGui import QImage
+    from image_store import ImageStore
+    store = ImageStore(tempfile.mkdtemp(prefix="flashnote-images-"))
+    names = []
+    for color in (Qt.GlobalColor.red, Qt.GlobalColor.blue, Qt.GlobalColor.green):
+        image = QImage(16, 16, QImage.Format.Format_RGB32)
+        image.fill(color)
+        names.append((image, store.put_image(image)[0]))
+    (_, kept_name), (pasted, pasted_name), (_, removed_name) = names
+    # 三张图片都是之前运行中写入的
+    before = time.time()
+    for _, name in names:
+        os.utime(os.path.join(store.directory, name), (before - 60, before - 60))
+    # 清理开始之后再次粘贴已有的图片
+    store.put_image(pasted)
+    removed = store.sweep([f'<img src="{store.url(kept_name)}" />'], before)
+    exists = [os.path.exists(os.path.join(store.directory, name)) for name in (kept_name, pasted_name, removed_name)]
+    if removed != 1 or exists != [True, True, False]:
+        raise AssertionError(f"清理图片的结果不正确: 删除 {removed} 个，保留 {exists}")
+
+
+# 有上限的撤销历史在反复大段粘贴后允许的内存增长(MB)
+UNDO_RSS_LIMIT_MB = 200
+# 分批清除格式时事件循环的最大停顿超过一次性处理耗时的该比例视为失败
+CONVERT_STALL_FRACTION = 0.5
+
+
+@benchmark
+def bench_undo(pastes=20, size_mb=5):
+    """
+    反复粘贴大段文本再全部删除后的内存增长：有上限的撤销历史与 Qt 默认的无限撤销栈对比。
+    有上限时内存增长超过 UNDO_RSS_LIMIT_MB 视为失败
+    """
+    from PySide6.QtGui import QTextCursor
+    from text_editor import CustomTextEdit
+    result = {}
+    # 先测有上限的情况，释放的内存只可能让后测的无上限情况显得更小
+    for mode in ("bounded", "unbounded"):
+        editor = CustomTextEdit()
+        editor.chunked_paste_threshold = None
+        if mode == "unbounded":
+            editor.undo_history.max_steps = editor.undo_history.max_bytes = None
+        rss = _rss_mb()
+        start = time.perf_counter()
+        for i in range(pastes):
+            # 每次粘贴不同的内容，避免被共享
+            QApplication.clipboard().setText(f"{i}\n" + _log_text(size_mb * 1024 * 1024))
+            editor.paste_plain_text()
+            QApplication.processEvents()
+            cursor = editor.textCursor()
+            cursor.select(QTextCursor.SelectionType.Document)
+            cursor.removeSelectedText()
+            QApplication.processEvents()
+        result[f"{mode}_ms"] = (time.perf_counter() - start) * 1e3
+        result[f"{mode}_undo_steps"] = editor.undo_history.steps
+        result[f"{mode}_undo_mb"] = editor.undo_history.bytes / 1024 / 1024
+        if rss is not None:
+            result[f"{mode}_rss_mb"] = _rss_mb() - rss
+        editor.deleteLater()
+        QApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+    growth = result.get("bounded_rss_mb")
+    if growth is not None and growth > UNDO_RSS_LIMIT_MB:
+        raise AssertionError(f"撤销历史有上限时内存仍增长了 {growth:.0f} MB")
+    return result
+
+
+def _fill_rich_text(text_edit, blocks):
+    """生成每段都带有字符格式和段落格式的文档"""
+    from PySide6.QtGui import QTextCursor, QTextCharFormat, QTextBlockFormat, QColor
+    text_edit.setPlainText("\n".join(f"第 {i} 行 rich text" for i in range(blocks)))
+    char_format = QTextCharFormat()
+    char_format.setFontWeight(700)
+    char_format.setForeground(QColor("#c0392b"))
+    block_format = QTextBlockFormat()
+    block_format.setLeftMargin(12)
+    cursor = QTextCursor(text_edit.document())
+    cursor.select(QTextCursor.SelectionType.Document)
+    cursor.setCharFormat(char_format)
+    cursor.setBlockFormat(block_format)
+
+
+@benchmark
+def bench_convert(block_counts=(10_000, 100_000, 1_000_000), sync_max_blocks=100_000):
+    """
+    清除格式与清空内容：一次性处理、分批处理的耗时与最大停顿。
+    分批处理的最大停顿超过一次性处理耗时的 CONVERT_STALL_FRACTION 视为失败
+    """
+    import sticky_note
+    result = {}
+    window = sticky_note.create_window()
+    window.show()
+    # 新便签的首次索引等启动工作不计入停顿
+    QApplication.processEvents()
+    text_edit = window.text_edit
+    for blocks in block_counts:
+        if blocks <= sync_max_blocks:
+            _fill_rich_text(text_edit, blocks)
+            start = time.perf_counter()
+            text_edit.convert_to_plain_text(chunked=False)
+            result[f"sync_{blocks}_ms"] = (time.perf_counter() - start) * 1e3
+
+        _fill_rich_text(text_edit, blocks)
+
+        def run(done):
+            text_edit.convert_to_plain_text(chunked=True)
+            _on_chunked_edit_done(text_edit, done)
+
+        stall, elapsed = _max_event_loop_stall(run)
+        result[f"chunked_{blocks}_max_stall_ms"] = stall * 1e3
+        result[f"chunked_{blocks}_total_ms"] = elapsed * 1e3
+        sync_ms = result.get(f"sync_{blocks}_ms")
+        if sync_ms is not None and stall * 1e3 > sync_ms * CONVERT_STALL_FRACTION:
+            raise AssertionError(f"分批清除 {blocks} 段格式时停顿了 {stall * 1e3:.0f} ms，一次性处理为 {sync_ms:.0f} ms")
+
+        _fill_rich_text(text_edit, blocks)
+        start = time.perf_counter()
+        text_edit.clear_all()
+        result[f"clear_all_{blocks}_ms"] = (time.perf_counter() - start) * 1e3
+    _close_windows([window])
+    return result
+
+
+@benchmark
+def bench_engines(lines=200_000, keystrokes=200, scrolls=100):
+    """富文本与纯文本编辑引擎的打开、输入、滚动耗时"""
+    from text_editor import CustomTextEdit, PlainTextEdit
+    text = _log_text(lines * 60)
+    result = {}
+    for name, editor_class in (("rich", CustomTextEdit), ("plain", PlainTextEdit)):
+        editor = editor_class()
+        editor.resize(500, 400)
+        start = time.perf_counter()
+        editor.setPlainText(text)
+        editor.show()
+        QApplication.processEvents()
+        result[f"{name}_open_ms"] = (time.perf_counter() - start) * 1e3
+
+        cursor = editor.textCursor()
+        cursor.setPosition(len(text) // 2)
+        editor.setTextCursor(cursor)
+        start = time.perf_counter()
+        for _ in range(keystrokes):
+            editor.insertPlainText("x")
+            QApplication.processEvents()
+        result[f"{name}_type_us"] = (time.perf_counter() - start) / keystrokes * 1e6
+
+        scroll_bar = editor.verticalScrollBar()
+        start = time.perf_counter()
+        for i in range(scrolls):
+            scroll_bar.setValue(scroll_bar.maximum() * i // scrolls)
+            editor.viewport().repaint()
+        result[f"{name}_scroll_us"] = (time.perf_counter() - start) / scrolls * 1e6
+        editor.close()
+        editor.deleteLater()
+    QApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+    return result
+
+
+def _checklist_text(lines):
+    rows = []
+    for i in range(lines):
+        if i % 10 == 0:
+            rows.append(f"## 第 {i} 组")
+        elif i % 7 == 0:
+            rows.append(f"- [x] 已完成 {i} 见 https://example.com/{i}")
+        elif i % 3 == 0:
+            rows.append(f"- [ ] 待办 {i} 运行 `make test`")
+        else:
+            rows.append(f"普通文字 {i}")
+    return "\n".join(rows)
+
+
+@benchmark
+def bench_markdown(line_counts=(1_000, 100_000), keystrokes=200):
+    """
+    Markdown/待办模式：在文档中间一行输入时每次按键的高亮耗时与重新高亮的段落数，
+    长文档与短文档的单次按键开销应当相同；以及首次高亮整个文档、切换待办项与删除几行的耗时，
+    删除后的待办数量应当与逐段统计的结果相同，重建文档缓冲区后高亮与待办数量应当不变
+    """
+    from PySide6.QtGui import QTextCursor
+    from markdown_mode import MarkdownHighlighter, CHECKLIST_ITEM
+    from text_editor import PlainTextEdit
+
+    stats = {"blocks": 0, "seconds": 0.0}
+    original = MarkdownHighlighter.highlightBlock
+
+    def timed_highlight(self, text):
+        start = time.perf_counter()
+        original(self, text)
+        stats["seconds"] += time.perf_counter() - start
+        stats["blocks"] += 1
+
+    result = {}
+    MarkdownHighlighter.highlightBlock = timed_highlight
+    try:
+        for lines in line_counts:
+            editor = PlainTextEdit()
+            editor.setPlainText(_checklist_text(lines))
+            start = time.perf_counter()
+            editor.set_markdown_mode(True)
+            QApplication.processEvents()
+            result[f"initial_highlight_ms_{lines}"] = (time.perf_counter() - start) * 1e3
+            highlighter = editor.markdown.highlighter
+
+            block = editor.document().findBlockByNumber(lines // 2)
+            cursor = QTextCursor(block)
+            cursor.movePosition(QTextCursor.MoveOperation.EndOfBlock)
+            stats["blocks"], stats["seconds"] = 0, 0.0
+            start = time.perf_counter()
+            for _ in range(keystrokes):
+                cursor.insertText("x")
+            elapsed = time.perf_counter() - start
+            result[f"highlight_us_{lines}"] = stats["seconds"] / keystrokes * 1e6
+            result[f"keystroke_us_{lines}"] = elapsed / keystrokes * 1e6
+            result[f"blocks_per_keystroke_{lines}"] = stats["blocks"] / keystrokes
+
+            # 点击切换中间一行的待办项
+            item = editor.document().findBlockByNumber(lines // 2 + 1)
+            while not item.text().startswith("- ["):
+                item = item.next()
+            done = highlighter.done
+            stats["blocks"] = 0
+            start = time.perf_counter()
+            editor.markdown.toggle_checkbox(item)
+            QApplication.processEvents()
+            result[f"toggle_us_{lines}"] = (time.perf_counter() - start) * 1e6
+            result[f"toggle_blocks_{lines}"] = stats["blocks"]
+            if abs(highlighter.done - done) != 1:
+                raise AssertionError(f"切换待办项后完成数量 {done} -> {highlighter.done}")
+
+            # 删除中间的几行，其中的待办项应从总数中减去
+            cursor = QTextCursor(editor.document().findBlockByNumber(lines // 2))
+            cursor.movePosition(QTextCursor.MoveOperation.NextBlock, QTextCursor.MoveMode.KeepAnchor, 20)
+            removed, block = 0, editor.document().findBlock(cursor.selectionStart())
+            while block.position() < cursor.selectionEnd():
+                removed += block.userState() > 0 and bool(block.userState() & CHECKLIST_ITEM)
+                block = block.next()
+            total = highlighter.total
+            stats["seconds"] = 0.0
+            cursor.removeSelectedText()
+            # 高亮在删除时同步进行，之后的事件处理中是数量的更新与通知
+            start = time.perf_counter()
+            QApplication.processEvents()
+            result[f"delete_us_{lines}"] = (stats["seconds"] + time.perf_counter() - start) * 1e6
+            if highlighter.total != total - removed:
+                raise AssertionError(f"删除 {removed} 个待办项后总数 {total} -> {highlighter.total}")
+
+            # 清空撤销栈并重建文档缓冲区后，高亮格式与待办数量不变
+            def highlighted():
+                block, count = editor.document().begin(), 0
+                while block.isValid():
+                    count += bool(block.layout().formats())
+                    block = block.next()
+                return count, highlighter.done, highlighter.total
+            before = highlighted()
+            editor.undo_history.trim(compact_bytes=0)
+            QApplication.processEvents()
+            if highlighted() != before:
+                raise AssertionError(f"重建文档后高亮的段落数与待办数量 {before} -> {highlighted()}")
+            editor.deleteLater()
+            QApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+    finally:
+        MarkdownHighlighter.highlightBlock = original
+
+    small, large = (result[f"highlight_us_{lines}"] for lines in (min(line_counts), max(line_counts)))
+    if result[f"blocks_per_keystroke_{max(line_counts)}"] > 1 or large > small * 3 + NOISE_FLOOR["us"]:
+        raise AssertionError(f"单次按键的高亮开销随文档长度增长：{small:.1f} us -> {large:.1f} us")
+    small, large = (result[f"delete_us_{lines}"] for lines in (min(line_counts), max(line_counts)))
+    if large > small * 3 + NOISE_FLOOR["us"]:
+        raise AssertionError(f"删除几行的开销随文档长度增长：{small:.1f} us -> {large:.1f} us")
+    return result
+
+
+@benchmark
+def bench_clipboard(entries=10_000, large_every=100, large_kb=200, copies=200):
+    """
+    剪贴板历史：记录 entries 条(每 large_every 条中有一条 large_kb 的长文字)后占用的内存、
+    写入磁盘的条数，记录一条与过滤全部记录的耗时；重复复制不增加条数。
+    内容占用超出内存预算视为失败，只有短记录时也是如此
+    """
+    import base64
+    import random
+    import tracemalloc
+    from clipboard_history import ClipboardHistory
+    rng = random.Random(1)
+    # 长文字用随机内容，压缩后仍有约 3/4 大小，超出内存预算的部分写入磁盘
+    large_texts = {i: base64.b64encode(rng.randbytes(large_kb * 768)).decode()
+                   for i in range(0, entries, large_every)}
+
+    def texts():
+        for i in range(entries):
+            yield large_texts[i] if i in large_texts else f"剪贴板记录 {i} " + "片段" * (i % 40)
+
+    def fill():
+        history = ClipboardHistory(directory=tempfile.mkdtemp(prefix="flashnote-clipboard-"))
+        for text in texts():
+            history.add(text)
+        return history
+
+    start = time.perf_counter()
+    history = fill()
+    add_us = (time.perf_counter() - start) / entries * 1e6
+    history.clear_disk()
+
+    tracemalloc.start()
+    history = fill()
+    memory_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+    tracemalloc.stop()
+
+    if history.bytes > history.memory_budget:
+        raise AssertionError(f"剪贴板历史占用 {history.bytes} 字节，超出预算 {history.memory_budget}")
+    short_only = ClipboardHistory(directory=tempfile.mkdtemp(prefix="flashnote-clipboard-"), memory_budget=64 * 1024)
+    for i in range(entries):
+        short_only.add(f"短记录 {i} " + "片段" * (i % 400))
+    if short_only.bytes > short_only.memory_budget:
+        raise AssertionError(f"只有短记录时占用 {short_only.bytes} 字节，超出预算 {short_only.memory_budget}")
+    if not short_only.search(limit=1)[0].preview.startswith(f"短记录 {entries - 1} "):
+        raise AssertionError("超出预算时删除了最新的短记录")
+    if history.text(history.search()[-1]) != large_texts[0]:
+        raise AssertionError("写入磁盘的记录还原后与原文不同")
+    count = len(history)
+    for text in itertools.islice(texts(), 0, entries, 10):
+        history.add(text)
+    if len(history) != count:
+        raise AssertionError("重复复制的内容没有去重")
+
+    start = time.perf_counter()
+    matches = history.search("片段 99")
+    search_ms = (time.perf_counter() - start) * 1e3
+
+    # 通过系统剪贴板复制，包含读取剪贴板与 dataChanged 信号的开销
+    history.listen(QApplication.clipboard())
+    start = time.perf_counter()
+    for i in range(copies):
+        QApplication.clipboard().setText(f"复制 {i}")
+        QApplication.processEvents()
+    copy_us = (time.perf_counter() - start) / copies * 1e6
+    QApplication.clipboard().dataChanged.disconnect(history._on_clipboard_changed)
+    if history.search(limit=1)[0].preview != f"复制 {copies - 1}":
+        raise AssertionError("没有记录通过系统剪贴板复制的内容")
+    spilled = history.spilled
+    history.clear_disk()
+    return {"entries": count, "memory_mb": memory_mb, "resident_kb": history.bytes / 1024, "spilled": spilled,
+            "add_us": add_us, "search_ms": search_ms, "search_hits": len(matches), "copy_us": copy_us}
+
+
+@benchmark
+def bench_history(size_mb=1, versions=300, reads=50):
+    """
+    版本历史：1 MB 的便签记录数百个版本(每次改几行)后占用的磁盘空间、记录一个版本的耗时(后台线程)，
+    以及从磁盘还原任意版本的耗时
+    """
+    import random
+    from version_history import NoteHistory
+    rng = random.Random(1)
+    lines = [f"{i} {line}" for i, line in enumerate(_log_text(size_mb * 1024 * 1024).splitlines(keepends=True))]
+    path = os.path.join(tempfile.mkdtemp(prefix="flashnote-history-"), "note.history")
+    history = NoteHistory(path)
+    samples = set(rng.sample(range(versions), min(reads, versions)))
+    expected = {}
+    raw_bytes = 0
+    record_seconds = []
+    for version in range(versions):
+        for _ in range(3):
+            lines[rng.randrange(len(lines))] = f"第 {version} 次改动 {rng.random()}\n"
+        if version % 10 == 0:
+            lines.insert(rng.randrange(len(lines)), f"新增一行 {version}\n")
+        content = "".join(lines)
+        raw_bytes += len(content.encode("utf-8"))
+        start = time.perf_counter()
+        history.record(content, "text")
+        record_seconds.append(time.perf_counter() - start)
+        if version in samples:
+            expected[version] = content
+
+    start = time.perf_counter()
+    history = NoteHistory(path)
+    load_ms = (time.perf_counter() - start) * 1e3
+    reconstruct = []
+    for version, content in expected.items():
+        start = time.perf_counter()
+        restored = history.version(version)
+        reconstruct.append(time.perf_counter() - start)
+        if restored != content:
+            raise AssertionError(f"还原的第 {version} 个版本与记录时不同")
+    reconstruct.sort()
+    _check_history_cleanup()
+    return {"versions": versions, "raw_mb": raw_bytes / 1024 / 1024, "storage_kb": history.disk_size() / 1024,
+            "record_ms": sum(record_seconds) / len(record_seconds) * 1e3, "load_ms": load_ms,
+            "reconstruct_ms": reconstruct[len(reconstruct) // 2] * 1e3, "reconstruct_max_ms": reconstruct[-1] * 1e3}
+
+
+def _check_history_cleanup(notes=20):
+    """只有最近记录的几个便签在内存中保留最新版本；删除便签时删除其历史文件"""
+    from version_history import VersionHistory, LATEST_CACHE_SIZE
+    histories = VersionHistory(tempfile.mkdtemp(prefix="flashnote-history-"))
+    for i in range(notes):
+        histories.snapshot(f"note-{i}", f"便签 {i} 的内容\n" * 100, "text", force=True)
+    histories.wait()
+    cached = sum(history._latest is not None for history in histories._histories.values())
+    if cached > LATEST_CACHE_SIZE:
+        raise AssertionError(f"{cached} 个便签在内存中保留了最新版本")
+    path = histories.history("note-0").path
+    histories.snapshot("note-0", "最后的内容", "text", force=True)
+    histories.delete("note-0")
+    histories.wait()
+    if os.path.exists(path) or "note-0" in histories._histories:
+        raise AssertionError("删除便签后历史文件仍然存在")
+    if histories.history("note-1").version(0) != "便签 1 的内容\n" * 100:
+        raise AssertionError("释放内存中的最新版本后还原的内容不正确")
+
+
+@benchmark
+def bench_zoom(size_mb=5, steps=20):
+    """连续 20 次缩放：逐步应用字体与合并后应用的排版次数和耗时"""
+    from text_editor import CustomTextEdit
+    editor = CustomTextEdit()
+    editor.resize(500, 400)
+    editor.setPlainText(_log_text(size_mb * 1024 * 1024))
+    editor.show()
+    QApplication.processEvents()
+
+    # 每次设置字体都会让整个文档重新排版
+    relayouts = [0]
+    set_font = editor.setFont
+
+    def counting_set_font(font):
+        relayouts[0] += 1
+        set_font(font)
+
+    editor.setFont = counting_set_font
+    result = {}
+    for mode in ("immediate", "coalesced"):
+        relayouts[0] = 0
+        start = time.perf_counter()
+        for _ in range(steps):
+            editor.increase_font_size()
+            if mode == "immediate":
+                editor.set_font_size()
+            # 模拟滚轮事件之间的事件循环
+            QApplication.processEvents()
+        while editor._zoom_timer.isActive():
+            QApplication.processEvents()
+        result[f"{mode}_relayouts"] = relayouts[0]
+        result[f"{mode}_ms"] = (time.perf_counter() - start) * 1e3
+        editor.current_font_size = 12
+        editor.set_font_size()
+    editor.close()
+    editor.deleteLater()
+    return result
+
+
+class _RecreationCounter:
+    """统计原生窗口的创建次数：重建时窗口 id 会先清空再重新分配"""
+
+    def __init__(self, windows):
+        from PySide6.QtCore import QObject
+
+        counter = self
+
+        class Filter(QObject):
+            def eventFilter(self, obj, event):
+                if event.type() == QEvent.Type.WinIdChange and obj.internalWinId():
+                    counter.created += 1
+                return False
+
+        self.created = 0
+        self.filter = Filter()
+        for window in windows:
+            window.installEventFilter(self.filter)
+
+
+@benchmark
+def bench_pin(windows=20, toggles=200):
+    """创建便签窗口、切换置顶与批量置顶的耗时，以及原生窗口重建次数"""
+    import sticky_note
+    from ui_components import set_stays_on_top
+    start = time.perf_counter()
+    created = [sticky_note.create_window() for _ in range(windows)]
+    create_ms = (time.perf_counter() - start) / windows * 1e3
+    for window in created:
+        window.show()
+    QApplication.processEvents()
+    counter = _RecreationCounter(created)
+
+    window = created[0]
+    start = time.perf_counter()
+    for _ in range(toggles):
+        window.toggle_pin()
+        QApplication.processEvents()
+    toggle_us = (time.perf_counter() - start) / toggles * 1e6
+
+    start = time.perf_counter()
+    sticky_note.set_all_pinned(True)
+    sticky_note.set_all_pinned(False)
+    QApplication.processEvents()
+    pin_all_ms = (time.perf_counter() - start) / 2 * 1e3
+    recreations = counter.created
+
+    # 对照：旧实现 setWindowFlags + show() 会重建原生窗口
+    start = time.perf_counter()
+    for on_top in (True, False) * (toggles // 2):
+        flags = window.windowFlags()
+        window.setWindowFlags(flags | Qt.WindowType.WindowStaysOnTopHint if on_top
+                              else flags & ~Qt.WindowType.WindowStaysOnTopHint)
+        window.show()
+        QApplication.processEvents()
+    legacy_us = (time.perf_counter() - start) / toggles * 1e6
+    legacy_recreations = counter.created - recreations
+    set_stays_on_top(window, False)
+
+    _close_windows(created)
+    return {"create_window_ms": create_ms, "toggle_pin_us": toggle_us,
+            "pin_all_ms": pin_all_ms, "recreations": recreations,
+            "legacy_toggle_us": legacy_us, "legacy_recreations": legacy_recreations}
+
+
+def _note_corpus(notes, note_bytes, seed=11):
+    """生成以中文为主、夹杂英文单词的便签文本，词频近似齐夫分布"""
+    import itertools
+    import random
+    rng = random.Random(seed)
+    chars = [chr(0x4E00 + i) for i in range(2500)]
+    words = ["".join(rng.choices(chars, k=rng.choice((1, 2, 2, 3)))) for _ in range(5000)]
+    words += ["sticky", "note", "build", "release", "meeting", "TODO", "python", "deadline"]
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    rng.shuffle(weights)
+    cum_weights = list(itertools.accumulate(weights))
+    texts = []
+    for _ in range(notes):
+        parts, size = [], 0
+        while size < note_bytes:
+            sentence = "".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(6, 16))) + rng.choice("，。！？\n")
+            parts.append(sentence)
+            size += len(sentence.encode("utf-8"))
+        texts.append("".join(parts))
+    return texts
+
+
+@benchmark
+def bench_search(notes=1000, total_mb=50, queries=200, large_mb=5):
+    """1000 篇便签 / 50MB 文本的索引建立、查询与逐字输入的增量更新耗时，以及大便签中每次输入的索引开销"""
+    import random
+    from PySide6.QtGui import QTextCursor, QTextDocument
+    from search_dialog import MAX_RESULTS
+    from search_index import SearchIndex
+
+    texts = _note_corpus(notes, total_mb * 1024 * 1024 // notes)
+    documents = []
+    for text in texts:
+        document = QTextDocument()
+        document.documentLayout()  # 没有排版对象的文档不会发出 contentsChange
+        document.setPlainText(text)
+        documents.append(document)
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    for number, document in enumerate(documents):
+        index.attach(str(number), document)
+    index.flush()
+    build_s = time.perf_counter() - start
+    tokens = len(index.postings)
+
+    # 从正文中截取 1~4 个字作为查询词，另加英文、多关键词与不存在的词
+    rng = random.Random(3)
+    terms = []
+    for _ in range(queries):
+        text = rng.choice(texts)
+        offset = rng.randrange(len(text) - 4)
+        terms.append(text[offset:offset + rng.randint(1, 4)].strip() or "note")
+    terms += ["python", "Build 会议", "deadline 一丁", "不存在的词语xyz"]
+    # 搜索弹窗只显示前 MAX_RESULTS 条结果；同时测量返回全部结果的耗时
+    timings, full_timings, hits = [], [], 0
+    for term in terms:
+        start = time.perf_counter()
+        index.search(term, limit=MAX_RESULTS)
+        timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        hits += len(index.search(term))
+        full_timings.append(time.perf_counter() - start)
+    timings.sort()
+    full_timings.sort()
+
+    # 在一篇便签中间逐字输入，测量每次增量更新的开销
+    cursor = QTextCursor(documents[0])
+    cursor.setPosition(documents[0].characterCount() // 2)
+    start = time.perf_counter()
+    for char in "增量更新索引 incremental " * 10:
+        cursor.insertText(char)
+    keystroke_us = (time.perf_counter() - start) / 230 * 1e6
+
+    # 大便签中逐字输入：有索引与没有索引的耗时之差即为增量更新的开销，不应随便签大小增长
+    large = QTextDocument()
+    large.documentLayout()
+    large.setPlainText(_note_corpus(1, large_mb * 1024 * 1024, seed=12)[0])
+    index.attach("large", large)
+    index.flush()
+    large_us = {}
+    for indexed in (True, False):
+        if not indexed:
+            index.detach("large")
+        cursor = QTextCursor(large)
+        cursor.setPosition(large.characterCount() // 2)
+        start = time.perf_counter()
+        for char in "增量更新索引 incremental " * 10:
+            cursor.insertText(char)
+        large_us[indexed] = (time.perf_counter() - start) / 230 * 1e6
+
+    for number in range(notes):
+        index.detach(str(number))
+    return {"notes": notes, "text_mb": sum(len(t.encode("utf-8")) for t in texts) / 1024 / 1024,
+            "build_s": build_s, "tokens": tokens,
+            "query_p50_ms": timings[len(timings) // 2] * 1e3, "query_max_ms": timings[-1] * 1e3,
+            "full_query_p50_ms": full_timings[len(full_timings) // 2] * 1e3,
+            "full_query_max_ms": full_timings[-1] * 1e3, "avg_hits": hits / len(terms), "keystroke_us": keystroke_us,
+            f"large_{large_mb}mb_index_us_per_keystroke": max(0.0, large_us[True] - large_us[False])}
+
+
+class _MoveCounter:
+    """统计窗口收到的移动事件数"""
+
+    def __init__(self, window):
+        from PySide6.QtCore import QObject
+
+        counter = self
+
+        class Filter(QObject):
+            def eventFilter(self, obj, event):
+                if event.type() == QEvent.Type.Move:
+                    counter.moves += 1
+                return False
+
+        self.moves = 0
+        self.filter = Filter()
+        window.installEventFilter(self.filter)
+
+
+@benchmark
+def bench_drag(windows=50, events=10_000, polling_hz=1000):
+    """
+    回放拖动：以 polling_hz 的频率向便签发送 events 个鼠标移动事件，
+    统计实际移动窗口的次数与 CPU 时间；legacy 为每个事件都移动一次的旧实现
+    """
+    import sticky_note
+    from PySide6.QtCore import QPoint, QPointF
+    from PySide6.QtGui import QMouseEvent
+
+    created = [sticky_note.create_window() for _ in range(windows)]
+    for number, window in enumerate(created):
+        window.move(number % 10 * 420, number // 10 * 320)
+        window.show()
+    QApplication.processEvents()
+    window = created[0]
+    handler = window.window_event_handler
+    counter = _MoveCounter(window)
+
+    def mouse_event(event_type, position, buttons):
+        return QMouseEvent(event_type, QPointF(10, 10), QPointF(10, 10), QPointF(position),
+                           Qt.MouseButton.LeftButton, buttons, Qt.KeyboardModifier.NoModifier)
+
+    def positions():
+        # 在屏幕上画圈，经过其他便签的边缘
+        import math
+        for step in range(events):
+            angle = step / events * 4 * math.pi
+            yield QPoint(int(900 + 600 * math.cos(angle)), int(500 + 300 * math.sin(angle)))
+
+    def replay(move):
+        interval = 1 / polling_hz
+        cpu = time.process_time()
+        next_event = time.perf_counter()
+        for position in positions():
+            move(position)
+            QApplication.processEvents()
+            next_event += interval
+            delay = next_event - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return time.process_time() - cpu
+
+    # 模拟按下底栏开始拖动
+    window.bottom_bar.underMouse = lambda: True
+    start = window.pos() + QPoint(50, window.height() - 20)
+    handler.mouse_press_event(mouse_event(QEvent.Type.MouseButtonPress, start, Qt.MouseButton.LeftButton))
+    cpu = replay(lambda position: handler.mouse_move_event(
+        mouse_event(QEvent.Type.MouseMove, position, Qt.MouseButton.LeftButton)))
+    handler.mouse_release_event(mouse_event(QEvent.Type.MouseButtonRelease, start, Qt.MouseButton.NoButton))
+    moves = counter.moves
+
+    # 对照：每个移动事件都直接移动窗口；以及只创建事件、不处理时回放本身的开销
+    counter.moves = 0
+    offset = start - window.pos()
+    legacy_cpu = replay(lambda position: window.move(position - offset))
+    legacy_moves = counter.moves
+    replay_cpu = replay(lambda position: mouse_event(QEvent.Type.MouseMove, position, Qt.MouseButton.LeftButton))
+
+    _close_windows(created)
+    return {"events": events, "moves": moves, "cpu_ms": cpu * 1e3,
+            "legacy_moves": legacy_moves, "legacy_cpu_ms": legacy_cpu * 1e3, "replay_cpu_ms": replay_cpu * 1e3}
+
+
+# 在新进程中恢复便签：等待 SessionRestorer 创建完全部可见便签，再逐个显示 argv[1] 个隐藏的便签，
+# 输出 JSON：首个便签与全部恢复的耗时(秒)、恢复后的常驻内存(KB)、窗口数与显示隐藏便签的总耗时(秒)
+_RESTORE_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+import sticky_note
+app = QApplication(sys.argv)
+sticky_note.restore_windows()
+app.processEvents()
+first = time.perf_counter() - start
+while sticky_note._restoring():
+    app.processEvents()
+restored = time.perf_counter() - start
+with open("/proc/self/status") as f:
+    rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+windows, hidden = len(sticky_note.open_windows), len(sticky_note.hidden_notes)
+note_ids = sticky_note.hidden_notes.note_ids()[:int(sys.argv[1])]
+show_start = time.perf_counter()
+shown = 0
+for note_id in note_ids:
+    window = sticky_note.show_window(note_id)
+    app.processEvents()
+    shown += window is not None and window.isVisible() and note_id not in sticky_note.hidden_notes
+print(json.dumps({"first": first, "restored": restored, "rss": rss, "windows": windows, "hidden": hidden,
+                  "shown": shown, "show": time.perf_counter() - show_start}))
+"""
+
+
+@benchmark
+def bench_hidden_notes(counts=(10, 100, 1000), size=2_000, shows=20):
+    """
+    恢复 N 个便签的启动耗时与内存：eager 为所有便签可见，由 SessionRestorer 在空闲时逐个创建窗口；
+    lazy 为只有一个可见、其余隐藏(登记为紧凑记录)。
+    first_ms 为第一个便签显示的时间，ms 为全部可见便签恢复完的时间，rss 在恢复完时测量；
+    lazy 另外逐个显示 shows 个隐藏的便签，show_ms 为每个从记录重建窗口并显示的平均耗时。需要 Linux 的 /proc
+    """
+    from note_store import NoteStore
+    html = _sample_html(size)
+    results = {}
+    for count in counts:
+        for mode in ("eager", "lazy"):
+            directory = tempfile.mkdtemp(prefix="flashnote-store-")
+            store = NoteStore(directory)
+            for i in range(count):
+                store.put({"id": f"note-{i}", "html": html, "geometry": [i % 50 * 10, i % 50 * 10, 400, 300],
+                           "hidden": mode == "lazy" and i > 0})
+            store.compact()
+            show = min(shows, count - 1) if mode == "lazy" else 0
+            output = subprocess.run([sys.executable, "-c", _RESTORE_SCRIPT, str(show)], check=True,
+                                    capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                    env={**os.environ, "FLASHNOTE_DATA_DIR": directory}).stdout
+            run = json.loads(output.splitlines()[-1])
+            expected = (count, 0) if mode == "eager" else (1, count - 1)
+            if (run["windows"], run["hidden"]) != expected or run["shown"] != show:
+                raise AssertionError(f"{mode} {count}: 恢复后有 {run['windows']} 个窗口、{run['hidden']} 个隐藏便签，"
+                                     f"显示了 {run['shown']}/{show} 个隐藏便签")
+            results[f"{mode}_{count}_first_ms"] = run["first"] * 1e3
+            results[f"{mode}_{count}_ms"] = run["restored"] * 1e3
+            results[f"{mode}_{count}_rss_mb"] = run["rss"] / 1024
+            if show:
+                results[f"{mode}_{count}_show_ms"] = run["show"] * 1e3 / show
+    _check_append_to_hidden()
+    return results
+
+
+def _check_append_to_hidden():
+    """
+    隐藏便签释放为记录后与存储共用同一份内容；
+    向隐藏的便签追加文字(包括已释放为记录的)后，便签在存储中仍是隐藏的
+    """
+    import sticky_note
+    from note_registry import MAX_LIVE_HIDDEN
+    from note_store import get_note_store
+    visible = sticky_note.create_window()
+    visible.show()
+    windows = [sticky_note.create_window() for _ in range(MAX_LIVE_HIDDEN + 4)]
+    note_ids = [window.note_id for window in windows]
+    for window in windows:
+        window.show()
+        sticky_note._hide_window(window)
+    QApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+    store = get_note_store()
+    store.wait()
+    if sticky_note.hidden_notes.records[note_ids[0]].text() is not store.notes[note_ids[0]]["html"]:
+        raise AssertionError("隐藏便签的记录另外保存了一份内容")
+    for note_id in (note_ids[0], note_ids[-1]):
+        sticky_note.append_to_note(note_id, "追加")
+    store.wait()
+    for note_id in (note_ids[0], note_ids[-1]):
+        if not store.notes[note_id]["hidden"] or note_id not in sticky_note.hidden_notes:
+            raise AssertionError("向隐藏的便签追加文字后，便签不再隐藏")
+    _close_windows([sticky_note._take_hidden(note_id) for note_id in note_ids] + [visible])
+
+
+@benchmark
+def bench_launch(warm_runs=5):
+    """
+    冷启动与已有实例时再次启动的耗时。
+    冷启动时由应用自身报告各阶段耗时，直到第一个便签完成首次绘制
+    """
+    from instance_client import send_command
+    from instrumentation import STARTUP_ENV
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+    start = time.perf_counter()
+    instance = subprocess.Popen([sys.executable, main_py], env={**os.environ, STARTUP_ENV: "1"},
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        # 实例开始响应命令即视为启动完成
+        while not send_command({"command": "show"}):
+            if instance.poll() is not None:
+                raise RuntimeError("FlashNote 实例启动失败")
+            time.sleep(0.005)
+        cold = time.perf_counter() - start
+        phases = json.loads(instance.stdout.readline())
+
+        warm = []
+        for _ in range(warm_runs):
+            t = time.perf_counter()
+            subprocess.run([sys.executable, main_py], check=True)
+            warm.append(time.perf_counter() - t)
+    finally:
+        instance.terminate()
+        instance.wait()
+    return {"cold_ms": cold * 1e3, **{f"startup_{name}": value for name, value in phases.items()},
+            "warm_ms": min(warm) * 1e3, "warm_process_overhead_ms": _python_startup() * 1e3}
+
+
+@benchmark
+def bench_automation(notes=20, ops=500):
+    """
+    自动化接口的吞吐量：对运行中的离屏实例逐个调用与一次批量调用同样的 ops 个操作(改文字、追加、配色、移动、置顶)。
+    relayouts 为实例实际执行的文档写入、尺寸与字号变化次数，两种方式的最终状态必须相同
+    """
+    from automation_client import AutomationClient
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    server_name = f"flashnote-bench-{os.getpid()}"
+    env = {**os.environ, "FLASHNOTE_AUTOMATION": "1", "FLASHNOTE_SERVER_NAME": server_name,
+           "FLASHNOTE_AUTOMATION_NAME": f"{server_name}-automation",
+           "FLASHNOTE_DATA_DIR": tempfile.mkdtemp(prefix="flashnote-automation-")}
+    instance = subprocess.Popen([sys.executable, main_py], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        client = None
+        while client is None:
+            if instance.poll() is not None:
+                raise RuntimeError("FlashNote 实例启动失败")
+            try:
+                client = AutomationClient(f"{server_name}-automation")
+            except OSError:
+                time.sleep(0.02)
+        note_ids = [result["id"] for result in client.batch([("create", {"text": f"便签 {i}"}) for i in range(notes)])]
+        colors = ("#fff5b1", "#d7f5dd", "#dbe9ff")
+        calls = []
+        for i in range(ops):
+            note = note_ids[i % notes]
+            calls.append([("set_text", {"note": note, "text": f"第 {i} 版"}),
+                          ("append_text", {"note": note, "text": f"追加 {i}"}),
+                          ("set_style", {"note": note, "bg_color": colors[i % len(colors)]}),
+                          ("move", {"note": note, "x": (7 * i) % 400, "y": (5 * i) % 300, "width": 300 + i % 3 * 20}),
+                          ("pin", {"note": note, "pinned": i // notes % 2 == 0})][i % 5])
+        reset = [call for note in note_ids for call in (
+            ("set_text", {"note": note, "text": ""}), ("move", {"note": note, "x": 0, "y": 0, "width": 280}),
+            ("pin", {"note": note, "pinned": False}), ("set_style", {"note": note, "bg_color": "#ffffff"}))]
+
+        def relayouts(stats):
+            return stats["text_writes"] + stats["resizes"] + stats["font_changes"]
+
+        result, states = {}, {}
+        for mode in ("single", "batched"):
+            client.batch(reset)
+            before = client.call("stats")
+            start = time.perf_counter()
+            if mode == "single":
+                for method, params in calls:
+                    client.call(method, **params)
+            else:
+                errors = [r for r in client.batch(calls) if isinstance(r, Exception)]
+                if errors:
+                    raise errors[0]
+            elapsed = time.perf_counter() - start
+            after = client.call("stats")
+            result[f"{mode}_ops_per_sec"] = ops / elapsed
+            result[f"{mode}_relayouts"] = relayouts(after) - relayouts(before)
+            result[f"{mode}_pin_changes"] = after["pin_changes"] - before["pin_changes"]
+            states[mode] = client.batch([("get", {"note": note}) for note in note_ids])
+        if states["single"] != states["batched"]:
+            raise AssertionError("批量调用后的便签状态与逐个调用不同")
+        client.close()
+    finally:
+        instance.terminate()
+        instance.wait()
+    _check_automation_failures(server_name)
+    return {"notes": notes, "ops": ops, **result}
+
+
+def _check_automation_failures(server_name):
+    """批量请求中某个便签的修改应用失败时，只有修改了它的请求回复错误，其他便签照常修改"""
+    import sticky_note
+    from automation_server import AutomationServer, INVALID_PARAMS, SERVER_ERROR
+    from theme_dispatcher import ThemeDispatcher
+
+    def fail(text):
+        raise RuntimeError("写入失败")
+
+    server = AutomationServer(f"{server_name}-check")
+    broken, good = sticky_note.create_window(), sticky_note.create_window()
+    broken.text_edit.append_text = fail
+    requests = [{"jsonrpc": "2.0", "id": i, "method": "append_text", "params": {"note": window.note_id, "text": "追加"}}
+                for i, window in enumerate((broken, good, broken))]
+    requests.append({"jsonrpc": "2.0", "id": 3, "method": "set_text", "params": {"note": good.note_id, "text": 1}})
+    responses = server.handle_line(json.dumps(requests))
+    codes = [response["error"]["code"] if "error" in response else None for response in responses]
+    if codes != [SERVER_ERROR, None, SERVER_ERROR, INVALID_PARAMS] or good.text_edit.toPlainText() != "追加":
+        raise AssertionError(f"修改应用失败时的回复不正确: {responses}")
+
+    # 无效参数在创建便签之前被拒绝，不会留下创建了一半的便签
+    editors, windows = len(ThemeDispatcher.instance().text_edits), len(sticky_note.open_windows)
+    invalid = [{"text": 123}, {"html": 5}, {"geometry": "abc"}, {"geometry": [1, 2]}, {"geometry": [0, 0, "a", 1]}]
+    requests = [{"jsonrpc": "2.0", "id": i, "method": "create", "params": params} for i, params in enumerate(invalid)]
+    requests.append({"jsonrpc": "2.0", "id": len(invalid), "method": "move", "params": {"note": good.note_id, "x": "1"}})
+    responses = server.handle_line(json.dumps(requests))
+    if (any(response.get("error", {}).get("code") != INVALID_PARAMS for response in responses)
+            or len(ThemeDispatcher.instance().text_edits) != editors or len(sticky_note.open_windows) != windows):
+        raise AssertionError(f"无效参数的回复不正确或留下了便签: {responses}")
+    server.server.close()
+    _close_windows([broken, good])
+
+
+@benchmark
+def bench_cli(notes=100, runs=5):
+    """
+    命令行模式各命令的耗时（没有运行中的实例，直接读写存储）。
+    同时用 -X importtime 检查命令行路径上没有导入任何 PySide6 模块
+    """
+    from note_store import NoteStore
+    cli_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")
+    directory = tempfile.mkdtemp(prefix="flashnote-cli-")
+    store = NoteStore(directory)
+    for i in range(notes):
+        store.put({"id": f"{i:032x}", "text": f"便签 {i}\n" + _log_text(2000)})
+    env = {**os.environ, "FLASHNOTE_DATA_DIR": directory, "FLASHNOTE_SERVER_NAME": f"flashnote-bench-{os.getpid()}"}
+    commands = {"add": ["add", "构建完成"], "append": ["append", "1", "追加一行"], "list": ["list"],
+                "cat": ["cat", "1"], "search": ["search", "build", "便签"]}
+
+    result = {}
+    for name, args in commands.items():
+        profile = subprocess.run([sys.executable, "-X", "importtime", cli_py, *args], env=env,
+                                 capture_output=True, text=True, check=True).stderr
+        modules = [line.rsplit("|", 1)[-1].strip() for line in profile.splitlines() if line.startswith("import time:")]
+        qt_modules = [module for module in modules if module.startswith("PySide6")]
+        if qt_modules:
+            raise AssertionError(f"命令行 {name} 导入了 {', '.join(qt_modules)}")
+        elapsed = []
+        for _ in range(runs):
+            t = time.perf_counter()
+            subprocess.run([sys.executable, cli_py, *args], env=env, stdout=subprocess.DEVNULL, check=True)
+            elapsed.append(time.perf_counter() - t)
+        result[f"{name}_ms"] = min(elapsed) * 1e3
+    result["python_startup_ms"] = min(_python_startup() for _ in range(runs)) * 1e3
+    return result
+
+
+def _python_startup():
+    """仅启动解释器的耗时，作为再次启动的下限参考"""
+    t = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.perf_counter() - t
+
+
+def _close_windows(windows):
+    for window in windows:
+        window.close()
+        window.release()
+    QApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+    QApplication.processEvents()
+
+
+# --quick 时使用的较小数据规模
+QUICK_PARAMS = {
+    "store_save": {"rounds": 5},
+    "restore": {"notes": 10},
+    "session": {"notes": 50},
+    "typing": {"keystrokes": 200},
+    "event_overhead": {"note_counts": (1, 10), "events": 5_000},
+    "create_window": {"notes": 20},
+    "context_menu": {"opens": 1_000},
+    "instrumentation": {"calls": 5_000},
+    "paste": {"sizes_mb": (1,)},
+    "paste_html": {"paragraphs": 50, "images": 2},
+    "undo": {"pastes": 8, "size_mb": 5},
+    "convert": {"block_counts": (10_000,)},
+    "engines": {"lines": 20_000},
+    "zoom": {"size_mb": 1},
+    "history": {"versions": 60, "reads": 20},
+    "clipboard": {"entries": 2_000, "copies": 50},
+    "markdown": {"line_counts": (1_000, 20_000), "keystrokes": 100},
+    "search": {"notes": 100, "total_mb": 5},
+    "drag": {"events": 2_000},
+    "hidden_notes": {"counts": (10, 100)},
+    "launch": {"warm_runs": 2},
+    "cli": {"runs": 2},
+    "automation": {"ops": 200},
+}
+# 只作为参数或对照的指标，不参与基线比较
+INFO_METRICS = {"notes", "events", "saves", "tokens", "avg_hits", "text_mb", "html_kb", "raw_mb"}
+REFERENCE_PREFIXES = ("legacy_", "replay_")
+# 低于这些差值的变化视为噪声
+NOISE_FLOOR = {"ms": 1.0, "us": 20.0, "s": 0.05, "mb": 2.0, "kb": 64.0}
+# 计数类指标，越少越好
+COUNT_WORDS = {"relayouts", "recreations", "polishes", "moves", "leaked"}
+
+
+def metric_direction(name):
+    """指标越小越好返回 1，越大越好返回 -1，不比较的返回 0"""
+    if name in INFO_METRICS or name.startswith(REFERENCE_PREFIXES):
+        return 0
+    words = name.split("_")
+    if "per" in words and "sec" in words:
+        return -1
+    if COUNT_WORDS.intersection(words) or NOISE_FLOOR.keys() & set(words):
+        return 1
+    return 0
+
+
+def compare_results(baseline, current, tolerance):
+    """与基线比较，返回 [(基准名, 指标, 基线值, 当前值)] 形式的退化列表"""
+    regressions = []
+    for name, metrics in current.items():
+        for key, value in metrics.items():
+            old = baseline.get(name, {}).get(key)
+            direction = metric_direction(key)
+            if old is None or value is None or not direction:
+                continue
+            floor = max((NOISE_FLOOR[word] for word in key.split("_") if word in NOISE_FLOOR), default=0)
+            worse = (value - old) * direction
+            if worse > floor and worse > abs(old) * tolerance:
+                regressions.append((name, key, old, value))
+    return regressions
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="FlashNote 性能基准测试")
+    parser.add_argument("names", nargs="*", metavar="NAME", help=f"要运行的基准，默认全部: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--quick", action="store_true", help="使用较小的数据规模，适合快速回归检查")
+    parser.add_argument("--json", metavar="PATH", help="把结果写入 JSON 文件")
+    parser.add_argument("--baseline", metavar="PATH", help="与保存的 JSON 结果比较")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的退化比例，默认 0.25")
+    args = parser.parse_args(argv[1:])
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"未知的基准: {', '.join(unknown)}")
+
+    from PySide6.QtCore import qVersion
+    app = QApplication.instance() or QApplication(argv[:1])
+    results = {}
+    for name in args.names or list(BENCHMARKS):
+        result = BENCHMARKS[name](**(QUICK_PARAMS.get(name, {}) if args.quick else {}))
+        results[name] = result
+        metrics = ", ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                            for k, v in result.items())
+        print(f"{name}: {metrics}", flush=True)
+
+    report = {"platform": app.platformName(), "qt": qVersion(), "python": platform.python_version(),
+              "quick": args.quick, "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("quick") != args.quick or baseline.get("platform") != report["platform"]:
+            print("警告: 基线的数据规模或平台与本次运行不同，比较结果仅供参考")
+        regressions = compare_results(baseline.get("results", {}), results, args.tolerance)
+        for name, key, old, value in regressions:
+            print(f"退化 {name}.{key}: {old:.2f} -> {value:.2f}")
+        if regressions:
+            return 1
+        print("与基线相比没有超出允许范围的退化")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
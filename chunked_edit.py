@@ -0,0 +1,191 @@
+# chunked_edit.py
+import time
+
+from PySide6.QtCore import QObject, QTimer, QSizeF
+from PySide6.QtGui import QTextCharFormat, QTextBlockFormat, QTextCursor
+from PySide6.QtWidgets import QProgressDialog
+
+# 超过该字符数的粘贴自动分块进行
+CHUNKED_PASTE_THRESHOLD = 256 * 1024
+# 超过该段落数的文档分批清除格式
+CHUNKED_FORMAT_THRESHOLD = 5000
+# 每块粘贴的字符数
+CHUNK_SIZE = 32 * 1024
+# 第一批清除格式的段落数，之后按实际耗时调整，范围为 MIN_BLOCKS_PER_STEP 到 MAX_BLOCKS_PER_STEP
+BLOCKS_PER_STEP = 64
+MIN_BLOCKS_PER_STEP = 8
+MAX_BLOCKS_PER_STEP = 8192
+# 每次事件循环最多用于编辑的时间(秒)，保证界面能及时响应
+TIME_BUDGET = 0.010
+# 编辑超过该时间(毫秒)才显示进度框
+PROGRESS_DELAY_MS = 300
+
+
+class ChunkedEdit(QObject):
+    """
+    在多次事件循环中分批编辑文档，期间界面保持响应。
+    所有批次合并为一个撤销步骤，取消时撤销已完成的部分。
+    子类实现 _has_more / _apply_next / _progress。
+    """
+
+    LABEL = "正在处理..."
+    TITLE = ""
+
+    def __init__(self, text_edit, on_finished=None):
+        super().__init__(text_edit)
+        self.text_edit = text_edit
+        self.on_finished = on_finished
+        self.cursor = text_edit.textCursor()
+        self.was_read_only = text_edit.isReadOnly()
+        self.started = False
+        # 正常完成 (未被取消)
+        self.completed = False
+
+        self.progress = QProgressDialog(self.LABEL, "取消", 0, 100, text_edit)
+        self.progress.setWindowTitle(self.TITLE)
+        self.progress.setMinimumDuration(PROGRESS_DELAY_MS)
+        self.progress.setAutoReset(False)
+        self.progress.canceled.connect(self.cancel)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self._run_batch)
+
+    def start(self):
+        # 编辑期间禁止输入，避免用户输入穿插在批次之间
+        self.text_edit.setReadOnly(True)
+        self.progress.setValue(0)
+        self.timer.start()
+
+    def _has_more(self):
+        raise NotImplementedError
+
+    def _apply_next(self):
+        """用 self.cursor 完成一小批编辑"""
+        raise NotImplementedError
+
+    def _progress(self):
+        """当前进度 0-100"""
+        raise NotImplementedError
+
+    def _run_batch(self):
+        deadline = time.perf_counter() + TIME_BUDGET
+        while self._has_more() and time.perf_counter() < deadline:
+            if not self.started:
+                self.cursor.beginEditBlock()
+                self.started = True
+            else:
+                # 与上一批合并成同一个撤销步骤
+                self.cursor.joinPreviousEditBlock()
+            self._apply_next()
+            self.cursor.endEditBlock()
+
+        if self._has_more():
+            self.progress.setValue(self._progress())
+        else:
+            self.completed = True
+            self._finish()
+
+    def cancel(self):
+        """取消并撤销已完成的部分"""
+        if not self.timer.isActive():
+            return
+        self.timer.stop()
+        if self.started:
+            # 在收尾之前撤销，分批清除格式时撤销也不会触发排版
+            self.text_edit.document().undo()
+        self._finish()
+
+    def _finish(self):
+        self.timer.stop()
+        self.progress.canceled.disconnect(self.cancel)
+        self.progress.close()
+        self.text_edit.setReadOnly(self.was_read_only)
+        self.deleteLater()
+        if self.on_finished is not None:
+            self.on_finished()
+
+
+class ChunkedPaste(ChunkedEdit):
+    """分块插入大段纯文本"""
+
+    LABEL = "正在粘贴..."
+    TITLE = "粘贴纯文本"
+
+    def __init__(self, text_edit, text, on_finished=None):
+        super().__init__(text_edit, on_finished)
+        self.text = text
+        self.position = 0
+
+    def _has_more(self):
+        return self.position < len(self.text)
+
+    def _apply_next(self):
+        end = min(self.position + CHUNK_SIZE, len(self.text))
+        if end < len(self.text):
+            # 尽量在换行处切分，避免把 \r\n 拆开
+            newline = self.text.rfind("\n", self.position, end)
+            if newline > self.position:
+                end = newline + 1
+        self.cursor.insertText(self.text[self.position:end])
+        self.position = end
+
+    def _progress(self):
+        return self.position * 100 // len(self.text)
+
+    def _finish(self):
+        self.text_edit.setTextCursor(self.cursor)
+        self.text = ""
+        super()._finish()
+
+
+class ChunkedPlainTextConversion(ChunkedEdit):
+    """
+    逐批清除段落的字符格式和段落格式。
+    文档排版在每次修改后都会重新计算修改点之后的所有段落，
+    因此处理期间暂时清空页面尺寸让排版跳过，结束后再恢复并由 Qt 在空闲时增量排版。
+    """
+
+    LABEL = "正在清除格式..."
+    TITLE = "转换为纯文本"
+
+    def __init__(self, text_edit, on_finished=None):
+        super().__init__(text_edit, on_finished)
+        self.document = text_edit.document()
+        self.block_number = 0
+        self.block_count = self.document.blockCount()
+        self.blocks_per_step = BLOCKS_PER_STEP
+
+    def _has_more(self):
+        return self.block_number < self.block_count
+
+    def _apply_next(self):
+        started = time.perf_counter()
+        last = min(self.block_number + self.blocks_per_step, self.block_count) - 1
+        first_block = self.document.findBlockByNumber(self.block_number)
+        last_block = self.document.findBlockByNumber(last)
+        self.cursor.setPosition(first_block.position())
+        self.cursor.setPosition(last_block.position() + last_block.length() - 1,
+                                QTextCursor.MoveMode.KeepAnchor)
+        self.cursor.setCharFormat(QTextCharFormat())
+        self.cursor.setBlockFormat(QTextBlockFormat())
+        self.block_number = last + 1
+        # 段落长度和格式各不相同，按本批耗时调整下一批的大小，使一批约占时间预算的四分之一；
+        # 每次最多翻倍，避免一批估计过大造成停顿
+        elapsed = max(time.perf_counter() - started, 1e-6)
+        target = int(self.blocks_per_step * TIME_BUDGET / 4 / elapsed)
+        self.blocks_per_step = max(MIN_BLOCKS_PER_STEP, min(target, self.blocks_per_step * 2, MAX_BLOCKS_PER_STEP))
+
+    def start(self):
+        self.page_size = self.document.pageSize()
+        self.document.setPageSize(QSizeF())
+        super().start()
+
+    def _progress(self):
+        return self.block_number * 100 // self.block_count
+
+    def _finish(self):
+        # 处理期间窗口尺寸变化时 Qt 已经设置了新的页面尺寸
+        if self.document.pageSize() == QSizeF():
+            self.document.setPageSize(self.page_size)
+        super()._finish()
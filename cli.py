@@ -0,0 +1,133 @@
+# cli.py
+# 命令行模式：不启动界面即可新建、追加、列出和搜索便签。
+# 只依赖标准库和不导入 Qt 的模块，启动开销与 instance_client 相同量级；
+# 有实例在运行时通过本地套接字交给实例处理，否则直接读写便签存储
+import os
+import sys
+
+from instance_client import request
+from note_store import NoteStore, state_text, append_text
+
+USAGE = """用法: flashnote <命令> [参数]
+
+  add [文本]            新建便签，省略文本时从标准输入读取；输出便签 id
+  append <便签> [文本]  在便签末尾追加一段，省略文本时从标准输入读取
+  list [--all]          列出便签，--all 同时列出已关闭(归档)的便签
+  cat <便签>            输出便签的纯文本
+  search <关键词>...    搜索包含全部关键词的便签(不区分大小写)
+
+<便签> 可以是 list 中的序号、便签 id 或 id 的前几位"""
+
+COMMANDS = ("add", "append", "list", "cat", "search")
+# list 与 search 中标题和摘要的长度
+TITLE_LENGTH = 30
+SNIPPET_WIDTH = 60
+
+
+class CliError(Exception):
+    pass
+
+
+def _read_text(args):
+    text = " ".join(args) if args else sys.stdin.read()
+    return text[:-1] if text.endswith("\n") else text
+
+
+def _send(command):
+    """交给运行中的实例处理；没有实例时返回 False"""
+    reply = request({**command, "wait": True})
+    if reply is None:
+        return False
+    if reply.strip() != b"ok":
+        raise CliError("运行中的实例处理命令失败")
+    return True
+
+
+def _load_store():
+    # 实例运行时先让它把尚未保存的修改写入存储
+    _send({"command": "sync"})
+    return NoteStore()
+
+
+def _visible_notes(store, include_archived=False):
+    return [state for state in store.notes.values() if include_archived or not state.get("archived")]
+
+
+def _resolve(store, key):
+    """按序号、完整 id 或唯一的 id 前缀查找便签"""
+    notes = _visible_notes(store)
+    if key.isdigit() and 1 <= int(key) <= len(notes):
+        return notes[int(key) - 1]
+    if key in store.notes:
+        return store.notes[key]
+    matches = [state for note_id, state in store.notes.items() if note_id.startswith(key)]
+    if len(matches) == 1:
+        return matches[0]
+    raise CliError(f"找不到便签: {key}" if not matches else f"便签 id 前缀不唯一: {key}")
+
+
+def _title(text):
+    return text.split("\n", 1)[0][:TITLE_LENGTH]
+
+
+def cmd_add(args):
+    text = _read_text(args)
+    # 与 uuid.uuid4().hex 相同格式的随机 id，导入 uuid 模块本身就要十几毫秒
+    note_id = os.urandom(16).hex()
+    if not _send({"command": "add", "id": note_id, "text": text}):
+        NoteStore().put({"id": note_id, "text": text})
+    print(note_id)
+
+
+def cmd_append(args):
+    if not args:
+        raise CliError("append 需要指定便签")
+    store = _load_store()
+    note_id = _resolve(store, args[0])["id"]
+    text = _read_text(args[1:])
+    if not _send({"command": "append", "note": note_id, "text": text}):
+        store.put(append_text(dict(store.notes[note_id]), text))
+
+
+def cmd_list(args):
+    store = _load_store()
+    for index, state in enumerate(_visible_notes(store, "--all" in args), start=1):
+        flags = "已关闭" if state.get("archived") else "隐藏" if state.get("hidden") else ""
+        print(f"{index:>3}  {state['id'][:8]}  {flags:<4}  {_title(state_text(state))}")
+
+
+def cmd_cat(args):
+    if not args:
+        raise CliError("cat 需要指定便签")
+    text = state_text(_resolve(_load_store(), args[0]))
+    sys.stdout.write(text if text.endswith("\n") or not text else text + "\n")
+
+
+def cmd_search(args):
+    terms = [term.lower() for term in args]
+    if not terms:
+        raise CliError("search 需要关键词")
+    store = _load_store()
+    for index, state in enumerate(_visible_notes(store), start=1):
+        text = state_text(state)
+        lowered = text.lower()
+        if all(term in lowered for term in terms):
+            start = max(0, lowered.find(terms[0]) - SNIPPET_WIDTH // 4)
+            snippet = text[start:start + SNIPPET_WIDTH].replace("\n", " ")
+            print(f"{index:>3}  {state['id'][:8]}  {_title(text)}: {snippet}")
+
+
+def main(args):
+    if not args or args[0] not in COMMANDS:
+        print(USAGE, file=sys.stderr)
+        return 2
+    try:
+        globals()[f"cmd_{args[0]}"](args[1:])
+    except CliError as e:
+        print(f"flashnote: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
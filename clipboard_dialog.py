@@ -0,0 +1,93 @@
+# clipboard_dialog.py
+import time
+
+from PySide6.QtCore import Qt, QEvent
+from PySide6.QtWidgets import QDialog, QVBoxLayout, QLineEdit, QListWidget, QListWidgetItem
+
+from clipboard_history import ClipboardHistory
+
+# 最多显示的记录数量
+MAX_RESULTS = 200
+# 在输入框中按这些键时转给列表，不用离开输入框就能选择
+LIST_KEYS = (Qt.Key.Key_Up, Qt.Key.Key_Down, Qt.Key.Key_PageUp, Qt.Key.Key_PageDown)
+
+
+class ClipboardDialog(QDialog):
+    """
+    剪贴板历史选择器。输入即过滤，上下键选择，回车或双击把所选记录以纯文本粘贴到打开它的便签
+    """
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """全局只有一个选择器"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        super().__init__()
+        self.history = ClipboardHistory.instance()
+        self.target = None
+        self.setWindowTitle("剪贴板历史")
+        self.setWindowFlags(Qt.WindowType.Tool | Qt.WindowType.WindowStaysOnTopHint)
+        self.resize(360, 300)
+
+        layout = QVBoxLayout(self)
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText("过滤剪贴板历史，多个关键词用空格分隔")
+        self.query_edit.textChanged.connect(self.refresh)
+        self.query_edit.returnPressed.connect(self.paste_current)
+        self.query_edit.installEventFilter(self)
+        layout.addWidget(self.query_edit)
+
+        self.result_list = QListWidget()
+        self.result_list.itemActivated.connect(self.paste_item)
+        layout.addWidget(self.result_list)
+
+    def popup(self, note):
+        """为便签打开选择器，粘贴到该便签"""
+        self.target = note
+        self.query_edit.clear()
+        self.refresh()
+        self.show()
+        self.raise_()
+        self.activateWindow()
+        self.query_edit.setFocus()
+
+    def eventFilter(self, watched, event):
+        if watched is self.query_edit and event.type() == QEvent.Type.KeyPress and event.key() in LIST_KEYS:
+            self.result_list.keyPressEvent(event)
+            return True
+        return False
+
+    def refresh(self):
+        """重新过滤并显示记录"""
+        self.result_list.clear()
+        for entry in self.history.search(self.query_edit.text(), limit=MAX_RESULTS):
+            stamp = time.strftime("%H:%M", time.localtime(entry.time))
+            item = QListWidgetItem(f"{stamp}  {entry.preview}")
+            item.setToolTip(f"{entry.length} 字")
+            item.setData(Qt.ItemDataRole.UserRole, entry)
+            self.result_list.addItem(item)
+        if self.result_list.count():
+            self.result_list.setCurrentRow(0)
+
+    def paste_current(self):
+        item = self.result_list.currentItem()
+        if item is not None:
+            self.paste_item(item)
+
+    def paste_item(self, item):
+        """把记录粘贴到目标便签的光标处，并移到历史最前"""
+        entry = item.data(Qt.ItemDataRole.UserRole)
+        text = self.history.text(entry)
+        note = self.target
+        self.hide()
+        if text is None or note is None:
+            return
+        self.history.touch(entry)
+        note.activateWindow()
+        note.text_edit.setFocus()
+        note.text_edit.paste_plain_text(text=text)
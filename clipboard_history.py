@@ -0,0 +1,219 @@
+# clipboard_history.py
+import hashlib
+import os
+import sys
+import time
+import zlib
+from collections import OrderedDict
+
+from PySide6.QtCore import QObject
+from PySide6.QtWidgets import QApplication
+
+from note_store import default_data_dir
+
+# 最多保留的条数，超出时删除最早的
+MAX_ENTRIES = 10_000
+# 超过该字符数的条目压缩保存
+COMPRESS_THRESHOLD = 1024
+# 内存中条目内容的预算(字节)，超出时把最早的压缩条目写入磁盘，没有可写入的压缩条目时删除最早的短条目
+MEMORY_BUDGET = 4 * 1024 * 1024
+# 超过该字符数的剪贴板内容不记录
+MAX_TEXT_LENGTH = 16 * 1024 * 1024
+# 列表中显示、以及压缩条目搜索时使用的摘要长度
+PREVIEW_LENGTH = 80
+CLIPBOARD_DIR_NAME = "clipboard"
+# 密码管理器复制密码时附带的标记，此类内容不记录
+SECRET_HINT = "x-kde-passwordManagerHint"
+
+
+def _encode(text):
+    # 剪贴板中可能有落单的代理字符
+    return text.encode("utf-8", "surrogatepass")
+
+
+class ClipboardEntry:
+    """一条剪贴板记录：短文字直接保存，长文字压缩保存在内存或磁盘中"""
+
+    __slots__ = ("digest", "text", "data", "path", "preview", "length", "time")
+
+    def __init__(self, digest, text):
+        self.digest = digest
+        self.text = None
+        self.data = None
+        self.path = None
+        self.preview = " ".join(text[:PREVIEW_LENGTH * 2].split())[:PREVIEW_LENGTH]
+        self.length = len(text)
+        self.time = time.time()
+        if len(text) > COMPRESS_THRESHOLD:
+            self.data = zlib.compress(_encode(text), 1)
+        else:
+            self.text = text
+
+    def size(self):
+        """在内存中占用的内容大小(字节)"""
+        if self.text is not None:
+            return sys.getsizeof(self.text)
+        return len(self.data) if self.data is not None else 0
+
+
+class ClipboardHistory(QObject):
+    """
+    应用级的剪贴板历史，整个应用只监听一次剪贴板变化。
+    按内容哈希去重，重复复制只把已有记录移到最前；条数超过 max_entries 时删除最早的记录，
+    条目内容在内存中的总大小超过 memory_budget 时，把最早的压缩条目写入磁盘；
+    短条目不写入磁盘，压缩条目都已写入磁盘后仍超出预算时删除最早的短条目。
+    磁盘上的记录只在本次运行中有效，启动和退出时删除
+    """
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """获取全局唯一的剪贴板历史，并开始监听系统剪贴板"""
+        if cls._instance is None:
+            app = QApplication.instance()
+            cls._instance = cls(app)
+            cls._instance.listen(app.clipboard())
+            app.aboutToQuit.connect(cls._instance.clear_disk)
+        return cls._instance
+
+    def __init__(self, parent=None, directory=None, max_entries=MAX_ENTRIES, memory_budget=MEMORY_BUDGET):
+        super().__init__(parent)
+        self.directory = directory or os.path.join(default_data_dir(), CLIPBOARD_DIR_NAME)
+        self.max_entries = max_entries
+        self.memory_budget = memory_budget
+        # 摘要 -> 记录，最新的在后
+        self.entries = OrderedDict()
+        # 内容仍在内存中的压缩记录，最早的在前，超出预算时从这里写入磁盘
+        self._compressed = OrderedDict()
+        # 短记录，最早的在前，压缩记录都已写入磁盘后仍超出预算时从这里删除
+        self._short = OrderedDict()
+        self.bytes = 0
+        self.spilled = 0
+        self._clipboard = None
+        self.clear_disk()
+
+    def listen(self, clipboard):
+        self._clipboard = clipboard
+        clipboard.dataChanged.connect(self._on_clipboard_changed)
+
+    def _on_clipboard_changed(self):
+        mime = self._clipboard.mimeData()
+        if mime is None or not mime.hasText():
+            return
+        if mime.hasFormat(SECRET_HINT) and bytes(mime.data(SECRET_HINT)) == b"secret":
+            return
+        self.add(mime.text())
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, text):
+        """记录一段文字；已有相同内容时移到最前。返回对应的记录，不记录时返回 None"""
+        if not text or len(text) > MAX_TEXT_LENGTH or text.isspace():
+            return None
+        digest = hashlib.blake2b(_encode(text), digest_size=16).digest()
+        entry = self.entries.get(digest)
+        if entry is not None:
+            self.touch(entry)
+            return entry
+        entry = ClipboardEntry(digest, text)
+        self.entries[digest] = entry
+        self.bytes += entry.size()
+        if entry.data is not None:
+            self._compressed[digest] = entry
+        else:
+            self._short[digest] = entry
+        while len(self.entries) > self.max_entries:
+            self._drop(self.entries.popitem(last=False)[1])
+        while self.bytes > self.memory_budget:
+            if self._compressed:
+                self._spill(self._compressed.popitem(last=False)[1])
+            elif len(self._short) > 1:
+                # 保留刚记录的条目
+                self._drop(self.entries.pop(next(iter(self._short))))
+            else:
+                break
+        return entry
+
+    def touch(self, entry):
+        """把记录移到最前（再次复制或从历史中粘贴时）"""
+        entry.time = time.time()
+        self.entries.move_to_end(entry.digest)
+        if entry.digest in self._compressed:
+            self._compressed.move_to_end(entry.digest)
+        elif entry.digest in self._short:
+            self._short.move_to_end(entry.digest)
+
+    def _drop(self, entry):
+        self.bytes -= entry.size()
+        self._compressed.pop(entry.digest, None)
+        self._short.pop(entry.digest, None)
+        if entry.path is not None:
+            self.spilled -= 1
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _spill(self, entry):
+        path = os.path.join(self.directory, entry.digest.hex() + ".z")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(entry.data)
+        except OSError:
+            # 写不进磁盘时只能丢弃内容，保留摘要
+            path = None
+        self.bytes -= entry.size()
+        entry.data = None
+        entry.path = path
+        if path is not None:
+            self.spilled += 1
+
+    def text(self, entry):
+        """记录的完整文字；磁盘上的内容丢失时返回 None"""
+        if entry.text is not None:
+            return entry.text
+        data = entry.data
+        if data is None:
+            if entry.path is None:
+                return None
+            try:
+                with open(entry.path, "rb") as f:
+                    data = f.read()
+            except OSError:
+                return None
+        return zlib.decompress(data).decode("utf-8", "surrogatepass")
+
+    def search(self, query="", limit=None):
+        """
+        按时间倒序返回包含全部关键词的记录(不区分大小写)。
+        短记录搜索全文，压缩的长记录只搜索摘要
+        """
+        terms = query.lower().split()
+        results = []
+        for entry in reversed(self.entries.values()):
+            if terms:
+                haystack = (entry.text if entry.text is not None else entry.preview).lower()
+                if not all(term in haystack for term in terms):
+                    continue
+            results.append(entry)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def clear_disk(self):
+        """删除写入磁盘的记录"""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".z"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+        for entry in self.entries.values():
+            if entry.path is not None:
+                entry.path = None
+        self.spilled = 0
@@ -1,41 +1,97 @@
 # event_handlers.py
-from PySide6.QtCore import Qt, QPoint, QEvent
+import os
+import time
+
+from PySide6.QtCore import Qt, QEvent, QTimer
+from PySide6.QtGui import QGuiApplication, QKeySequence
 from PySide6.QtWidgets import QMenu
 
+from instrumentation import get_profiler
+from layout_manager import get_layout_store
+from snap_index import SnapIndex
+
+# 无法获取屏幕刷新率时，拖动窗口的最小间隔(毫秒)
+DRAG_FRAME_MS = 16
+# 设置为 1 时总是使用系统原生的窗口拖动
+SYSTEM_MOVE_ENV = "FLASHNOTE_SYSTEM_MOVE"
+
+
+def use_system_move():
+    """Wayland 下程序不能自行移动窗口，只能交给系统；其他平台可通过环境变量开启"""
+    return QGuiApplication.platformName() == "wayland" or os.environ.get(SYSTEM_MOVE_ENV) == "1"
+
 
 class WindowEventHandler:
     def __init__(self, parent):
         super().__init__()
         self.parent = parent
+        # 拖动时光标相对窗口左上角的偏移（不在拖动时为 None），以及最新的光标位置
+        self.drag_offset = None
+        self.drag_cursor = None
+        self.drag_pending = False
+        self.snap_index = None
+        self.system_move = False
+        # 高回报率鼠标每帧会产生多次移动事件，合并为每帧移动一次窗口
+        self._drag_timer = QTimer(parent)
+        self._drag_timer.setSingleShot(True)
+        self._drag_timer.timeout.connect(self.apply_drag)
 
-    def event_filter(self,_obj,event):
-        """
-        监听系统主题变化事件
-        """
-        if event.type() == QEvent.Type.ApplicationPaletteChange:
-            # 当系统主题发生变化时，更新应用主题
-            if self.parent.text_edit.user_theme_preference is None:
-                self.parent.text_edit.set_system_theme_mode()
-            return True
-        return False
     def mouse_press_event(self, event):
+        self.system_move = False
         if event.button() == Qt.MouseButton.LeftButton:
             # 只有在底部拖动栏区域点击时才允许拖动
             if self.parent.bottom_bar.underMouse():
-                self.parent.old_pos = event.globalPosition().toPoint()
+                window = self.parent.windowHandle()
+                if use_system_move() and window is not None and window.startSystemMove():
+                    # 由系统负责移动窗口，位置变化时保存
+                    self.system_move = True
+                    self.drag_offset = None
+                    return
+                self.drag_offset = event.globalPosition().toPoint() - self.parent.pos()
+                self.drag_cursor = None
+                # 其他便签的位置在拖动过程中不会变化，只在开始时建立一次索引
+                self.snap_index = SnapIndex(self.parent.snap_targets())
+                screen = self.parent.screen()
+                refresh_rate = screen.refreshRate() if screen is not None else 0
+                self._drag_timer.setInterval(int(1000 / refresh_rate) if refresh_rate > 0 else DRAG_FRAME_MS)
             else:
-                self.parent.old_pos = None  # 在其他区域点击不记录位置
+                self.drag_offset = None  # 在其他区域点击不记录位置
         # 调用父类事件处理
 
 
     def mouse_move_event(self, event):
-        if self.parent.old_pos is not None and event.buttons() & Qt.MouseButton.LeftButton:
-            delta = QPoint(event.globalPosition().toPoint() - self.parent.old_pos)
-            self.parent.move(self.parent.x() + delta.x(), self.parent.y() + delta.y())
-            self.parent.old_pos = event.globalPosition().toPoint()
+        if self.drag_offset is not None and event.buttons() & Qt.MouseButton.LeftButton:
+            # 只记录最新的光标位置，由定时器每帧移动一次窗口
+            self.drag_cursor = event.globalPosition()
+            if not self.drag_pending:
+                self.drag_pending = True
+                self._drag_timer.start()
+
+    def apply_drag(self):
+        """把窗口移动到最新的光标位置，并吸附到附近便签的边缘"""
+        self.drag_pending = False
+        if self.drag_cursor is None:
+            return
+        target = self.drag_cursor.toPoint() - self.drag_offset
+        self.drag_cursor = None
+        x, y = self.snap_index.snap(target.x(), target.y(), self.parent.width(), self.parent.height())
+        if x != self.parent.x() or y != self.parent.y():
+            self.parent.move(x, y)
 
     def mouse_release_event(self, _event):
-        self.parent.old_pos = None
+        if self.drag_offset is not None:
+            # 松开前的最后一次移动立即生效
+            self._drag_timer.stop()
+            self.apply_drag()
+            self.snap_index = None
+            # 拖动结束后保存位置
+            self.parent.schedule_save()
+        self.drag_offset = None
+
+    def move_event(self, _event):
+        # 系统拖动时收不到鼠标移动事件，位置变化后保存
+        if self.system_move:
+            self.parent.schedule_save()
 
     def wheel_event(self, event):
         """
@@ -64,60 +120,35 @@ class WindowEventHandler:
             elif event.key() == Qt.Key.Key_T:
                 self.parent.toggle_pin()
                 return
+            elif event.key() == Qt.Key.Key_F:
+                self.parent.show_search()
+                return
             elif event.modifiers() & Qt.KeyboardModifier.ShiftModifier and event.key() == Qt.Key.Key_V:
                 self.parent.paste_plain_text()
                 return
             elif event.modifiers() & Qt.KeyboardModifier.ShiftModifier and event.key() == Qt.Key.Key_C:
                 self.parent.copy_plain_text()
                 return
+            elif event.modifiers() & Qt.KeyboardModifier.ShiftModifier and event.key() == Qt.Key.Key_H:
+                self.parent.show_clipboard_history()
+                return
 
 
-    def resize_event(self, _event):
+    def resize_event(self, event):
         # 调整 QSizeGrip 的位置
         self.parent.grip.move(self.parent.width() - self.parent.grip.width(),
                              self.parent.height() - self.parent.grip.height())
+        # 首次显示时的尺寸事件不需要保存
+        if event.oldSize().isValid():
+            self.parent.schedule_save()
 
 
     def context_menu_event(self, event):
         """
         处理右键点击事件，显示上下文菜单。
+        所有便签共用同一个预先创建的菜单，不再每次右键都重新创建
         """
-        menu = QMenu(self.parent)
-
-
-
-        # 添加背景颜色选项
-        background_menu = menu.addMenu("背景")
-        change_bg_action = background_menu.addAction("选择背景颜色")
-        change_bg_action.triggered.connect(self.parent.change_background_color)
-
-        # 添加深色模式和浅色模式选项
-        dark_mode_action = background_menu.addAction("深色模式")
-        dark_mode_action.triggered.connect(self.parent.text_edit.set_dark_mode)
-
-        light_mode_action = background_menu.addAction("浅色模式")
-        light_mode_action.triggered.connect(self.parent.text_edit.set_light_mode)
-
-        # 在浅色模式选项后添加系统主题选项
-        system_theme_action = background_menu.addAction("跟随系统主题")
-        system_theme_action.triggered.connect(self.parent.text_edit.set_system_theme_mode)
-
-
-        font_menu = menu.addMenu("字体")
-        change_font_color_action = font_menu.addAction("选择字体颜色")
-        change_font_color_action.triggered.connect(self.parent.change_font_color)
-
-        # 添加更改字体选项
-        change_font_action = font_menu.addAction("选择字体")
-        change_font_action.triggered.connect(self.parent.change_font)
-
-        # 添加新建便签选项
-        new_note_action = menu.addAction("新建便签")
-        new_note_action.triggered.connect(self.parent.create_new_note)
-
-        close_action = menu.addAction("关闭窗口")
-        close_action.triggered.connect(self.parent.close_and_update_count)
-        menu.popup(event.globalPos())
+        WindowContextMenu.instance().popup_for(self.parent, event.globalPos())
 
     def change_event(self, event):
         """
@@ -140,40 +171,216 @@ class WindowEventHandler:
 class TextEditEventHandler:
     def __init__(self, parent):
         self.parent = parent
-        # 连接文本编辑区域的上下文菜单信号
-        self.parent.text_edit.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.parent.text_edit.customContextMenuRequested.connect(self.extend_text_edit_context_menu)
+        self.attach(self.parent.text_edit)
+
+    def attach(self, text_edit):
+        """连接文本编辑区域的上下文菜单信号，切换编辑引擎后需要重新连接"""
+        text_edit.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        text_edit.customContextMenuRequested.connect(self.extend_text_edit_context_menu)
 
     def extend_text_edit_context_menu(self, position):
         """
-        扩展现有的文本编辑区域右键菜单，添加自定义选项
+        显示文本编辑区域的右键菜单：标准编辑操作加上自定义选项，所有便签共用同一个菜单
         """
-        # 创建标准上下文菜单
-        menu = self.parent.text_edit.createStandardContextMenu()
+        TextContextMenu.instance().popup_for(self.parent, self.parent.text_edit.mapToGlobal(position))
+
+
+class WindowContextMenu(QMenu):
+    """
+    所有便签共用的窗口右键菜单，整个应用只创建一次。
+    弹出时记录目标便签，菜单项触发时再作用于该便签；每次弹出只更新勾选和可见状态
+    """
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """获取全局唯一的窗口菜单"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        super().__init__()
+        self.target = None
+
+        # 添加背景颜色选项
+        background_menu = self.addMenu("背景")
+        background_menu.addAction("选择背景颜色").triggered.connect(self._on_target("change_background_color"))
+
+        # 添加深色模式和浅色模式选项
+        background_menu.addAction("深色模式").triggered.connect(self._on_text_edit("set_dark_mode"))
+        background_menu.addAction("浅色模式").triggered.connect(self._on_text_edit("set_light_mode"))
+
+        # 在浅色模式选项后添加系统主题选项
+        background_menu.addAction("跟随系统主题").triggered.connect(self._on_text_edit("set_system_theme_mode"))
+
+        font_menu = self.addMenu("字体")
+        font_menu.addAction("选择字体颜色").triggered.connect(self._on_target("change_font_color"))
+
+        # 添加更改字体选项
+        font_menu.addAction("选择字体").triggered.connect(self._on_target("change_font"))
+
+        # Markdown/待办模式：高亮标题、待办项、代码和链接，点击 [ ] 切换完成状态
+        self.markdown_action = self.addAction("待办清单(Markdown)模式")
+        self.markdown_action.setCheckable(True)
+        self.markdown_action.triggered.connect(self._on_target("toggle_markdown_mode"))
+
+        # 历史版本：查看差异并恢复到较早的版本
+        self.addAction("历史版本...").triggered.connect(self._on_target("show_history"))
+
+        # 搜索所有便签
+        search_action = self.addAction("搜索便签")
+        search_action.setShortcut("Ctrl+F")
+        search_action.triggered.connect(self._on_target("show_search"))
+
+        # 批量置顶/取消置顶所有便签
+        pin_menu = self.addMenu("置顶")
+        pin_menu.addAction("全部置顶").triggered.connect(self._on_target("pin_all_notes"))
+        pin_menu.addAction("全部取消置顶").triggered.connect(self._on_target("unpin_all_notes"))
+
+        # 命名布局：保存所有便签的位置，一步切换；布局列表变化时才重建
+        self.layout_menu = self.addMenu("布局")
+        self._layout_names = None
+
+        # 添加新建便签选项
+        self.addAction("新建便签").triggered.connect(self._on_target("create_new_note"))
+        self.addAction("隐藏便签").triggered.connect(self._on_target("hide_note"))
+        self.addAction("关闭窗口").triggered.connect(self._on_target("close_and_update_count"))
+
+        # 按住 Shift 右键时才显示的性能监视开关
+        self.profile_separator = self.addSeparator()
+        self.profile_action = self.addAction("性能监视")
+        self.profile_action.setCheckable(True)
+        self.profile_action.triggered.connect(self._on_target("toggle_instrumentation"))
+
+    def _on_target(self, name):
+        return lambda: getattr(self.target, name)()
+
+    def _on_text_edit(self, name):
+        # 切换编辑引擎后编辑控件会更换，触发时再取
+        return lambda: getattr(self.target.text_edit, name)()
+
+    def _update_layout_menu(self, names):
+        if names == self._layout_names:
+            return
+        self._layout_names = names
+        self.layout_menu.clear()
+        self.layout_menu.addAction("保存当前布局...").triggered.connect(self._on_target("save_layout"))
+        if not names:
+            return
+        self.layout_menu.addSeparator()
+        for name in names:
+            self.layout_menu.addAction(f"切换到 {name}").triggered.connect(
+                lambda _checked=False, name=name: self.target.switch_layout(name))
+        delete_menu = self.layout_menu.addMenu("删除布局")
+        for name in names:
+            delete_menu.addAction(name).triggered.connect(
+                lambda _checked=False, name=name: self.target.delete_layout(name))
+
+    def popup_for(self, window, position):
+        self.target = window
+        self.markdown_action.setChecked(window.text_edit.markdown is not None)
+        self._update_layout_menu(get_layout_store().names())
+        show_profile = bool(QGuiApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier)
+        self.profile_separator.setVisible(show_profile)
+        self.profile_action.setVisible(show_profile)
+        self.profile_action.setChecked(get_profiler() is not None)
+        self.popup(position)
+
+
+class TextContextMenu(QMenu):
+    """
+    所有便签共用的文本区右键菜单。
+    代替每次右键都重新创建的 createStandardContextMenu，标准编辑操作的可用状态在弹出时按目标便签更新
+    """
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """获取全局唯一的文本区菜单"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        super().__init__()
+        self.target = None
+        # 上次填入"恢复较早的内容"子菜单的记录，未变化时不重建
+        self._spilled = []
+
+        # 标准编辑操作
+        self.undo_action = self._add_action("撤销", self._on_text_edit("undo"), QKeySequence.StandardKey.Undo)
+        self.redo_action = self._add_action("重做", self._on_text_edit("redo"), QKeySequence.StandardKey.Redo)
+        self.addSeparator()
+        self.cut_action = self._add_action("剪切", self._on_text_edit("cut"), QKeySequence.StandardKey.Cut)
+        self.copy_action = self._add_action("复制", self._on_text_edit("copy"), QKeySequence.StandardKey.Copy)
+        self.paste_action = self._add_action("粘贴", self._on_text_edit("paste"), QKeySequence.StandardKey.Paste)
+        self.delete_action = self._add_action("删除", self._delete_selection)
+        self.addSeparator()
+        self.select_all_action = self._add_action("全选", self._on_text_edit("selectAll"),
+                                                  QKeySequence.StandardKey.SelectAll)
 
         # 添加分隔符
-        menu.addSeparator()
+        self.addSeparator()
 
         # 添加自定义选项
-        paste_plain_action = menu.addAction("粘贴为纯文本")
-        paste_plain_action.setShortcut("Ctrl+Shift+V")
-        paste_plain_action.triggered.connect(self.parent.text_edit.paste_plain_text)
-
-        # 添加复制为纯文本选项
-        copy_plain_action = menu.addAction("复制为纯文本")
-        copy_plain_action.setShortcut("Ctrl+Shift+C")
-        copy_plain_action.triggered.connect(self.parent.text_edit.copy_plain_text)
-        # 检查是否有选中的文本，如果没有则禁用复制为纯文本选项
-        has_selection = self.parent.text_edit.textCursor().hasSelection()
-        copy_plain_action.setEnabled(has_selection)
+        self._add_action("粘贴为纯文本", self._on_text_edit("paste_plain_text"), "Ctrl+Shift+V")
+        self.copy_plain_action = self._add_action("复制为纯文本", self._on_text_edit("copy_plain_text"), "Ctrl+Shift+C")
+        # 从剪贴板历史中选择粘贴
+        self._add_action("剪贴板历史...", lambda: self.target.show_clipboard_history(), "Ctrl+Shift+H")
 
         # 添加转换为纯文本选项
-        convert_plain_action = menu.addAction("转换为纯文本(清除格式)")
-        convert_plain_action.triggered.connect(self.parent.text_edit.convert_to_plain_text)
+        self._add_action("转换为纯文本(清除格式)", self._on_text_edit("convert_to_plain_text"))
 
         # 添加清空内容与格式选项
-        clear_action = menu.addAction("清空内容")
-        clear_action.triggered.connect(self.parent.text_edit.clear_all)
-
-        # 显示菜单
-        menu.exec(self.parent.text_edit.mapToGlobal(position))
+        self._add_action("清空内容", self._on_text_edit("clear_all"))
+
+        # 撤销历史被清空后，仍可恢复大段编辑之前写入磁盘的内容
+        self.restore_menu = self.addMenu("恢复较早的内容")
+
+    def _add_action(self, text, slot, shortcut=None):
+        action = self.addAction(text)
+        if shortcut is not None:
+            action.setShortcut(QKeySequence(shortcut))
+        action.triggered.connect(slot)
+        return action
+
+    def _on_text_edit(self, name):
+        # 切换编辑引擎后编辑控件会更换，触发时再取
+        return lambda: getattr(self.target.text_edit, name)()
+
+    def _delete_selection(self):
+        self.target.text_edit.textCursor().removeSelectedText()
+
+    def _restore(self, path):
+        self.target.text_edit.undo_history.restore(path)
+
+    def popup_for(self, window, position):
+        self.target = window
+        text_edit = window.text_edit
+        writable = not text_edit.isReadOnly()
+        has_selection = text_edit.textCursor().hasSelection()
+        document = text_edit.document()
+        self.undo_action.setEnabled(writable and document.isUndoAvailable())
+        self.redo_action.setEnabled(writable and document.isRedoAvailable())
+        self.cut_action.setEnabled(writable and has_selection)
+        self.copy_action.setEnabled(has_selection)
+        self.paste_action.setEnabled(writable and text_edit.canPaste())
+        self.delete_action.setEnabled(writable and has_selection)
+        self.select_all_action.setEnabled(not document.isEmpty())
+        # 检查是否有选中的文本，如果没有则禁用复制为纯文本选项
+        self.copy_plain_action.setEnabled(has_selection)
+        self._update_restore_menu(text_edit.undo_history.spilled())
+        self.popup(position)
+
+    def _update_restore_menu(self, spilled):
+        if spilled != self._spilled:
+            self._spilled = spilled
+            # clear() 会删除子菜单拥有的动作
+            self.restore_menu.clear()
+            for stamp, path in spilled:
+                action = self.restore_menu.addAction(time.strftime("%m-%d %H:%M:%S", time.localtime(stamp)))
+                action.triggered.connect(lambda _checked=False, path=path: self._restore(path))
+        self.restore_menu.menuAction().setVisible(bool(spilled))
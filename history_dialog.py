@@ -0,0 +1,121 @@
+# history_dialog.py
+import difflib
+import html
+import itertools
+import time
+
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import (QDialog, QHBoxLayout, QVBoxLayout, QListWidget, QListWidgetItem, QTextBrowser,
+                               QPushButton, QCheckBox)
+
+from note_store import state_text
+from version_history import get_version_history, diff_work, MAX_DIFF_WORK
+
+# 差异视图最多显示的行数与每处改动前后的上下文行数
+MAX_DIFF_LINES = 2000
+DIFF_CONTEXT = 2
+ADDED_COLOR = "#d7f5dd"
+REMOVED_COLOR = "#fbdcdc"
+HUNK_COLOR = "#888888"
+
+
+class HistoryDialog(QDialog):
+    """
+    便签的历史版本。左侧按时间列出版本，右侧显示所选版本与当前内容的差异或版本全文；
+    可以恢复到所选版本，恢复本身可以撤销，恢复前的内容也会记录为一个版本
+    """
+
+    def __init__(self, note):
+        super().__init__(note)
+        self.note = note
+        self.history = get_version_history().history(note.note_id)
+        self.setWindowTitle("历史版本")
+        self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        self.resize(760, 480)
+
+        layout = QHBoxLayout(self)
+        self.version_list = QListWidget()
+        self.version_list.setFixedWidth(220)
+        self.version_list.currentItemChanged.connect(self.show_version)
+        layout.addWidget(self.version_list)
+
+        right = QVBoxLayout()
+        self.diff_check = QCheckBox("只显示与当前内容的差异")
+        self.diff_check.setChecked(True)
+        self.diff_check.toggled.connect(lambda _checked: self.show_version(self.version_list.currentItem()))
+        right.addWidget(self.diff_check)
+        self.view = QTextBrowser()
+        right.addWidget(self.view)
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        self.restore_button = QPushButton("恢复此版本")
+        self.restore_button.clicked.connect(self.restore_selected)
+        buttons.addWidget(self.restore_button)
+        close_button = QPushButton("关闭")
+        close_button.clicked.connect(self.close)
+        buttons.addWidget(close_button)
+        right.addLayout(buttons)
+        layout.addLayout(right)
+
+        self.refresh()
+
+    def refresh(self):
+        """按时间倒序列出所有版本"""
+        self.version_list.clear()
+        for index in reversed(range(len(self.history))):
+            entry = self.history.entries[index]
+            stamp = time.strftime("%m-%d %H:%M:%S", time.localtime(entry["t"]))
+            item = QListWidgetItem(f"{stamp}  {entry['chars']} 字")
+            item.setData(Qt.ItemDataRole.UserRole, index)
+            self.version_list.addItem(item)
+        self.restore_button.setEnabled(self.version_list.count() > 0)
+        if self.version_list.count():
+            self.version_list.setCurrentRow(0)
+        else:
+            self.view.setPlainText("还没有历史版本：编辑后每隔一段时间、以及清空或清除格式之前会自动记录")
+
+    def _version_text(self, index):
+        content = self.history.version(index)
+        if self.history.entries[index]["kind"] == "html":
+            return state_text({"html": content})
+        return content
+
+    def show_version(self, item, _previous=None):
+        if item is None:
+            return
+        text = self._version_text(item.data(Qt.ItemDataRole.UserRole))
+        if not self.diff_check.isChecked():
+            self.view.setPlainText(text)
+            return
+        old_lines = text.splitlines()
+        new_lines = self.note.text_edit.toPlainText().splitlines()
+        # difflib 是平方级的，改动部分过大时在界面线程中逐行比较会卡住，改为显示全文
+        if diff_work(old_lines, new_lines) > MAX_DIFF_WORK:
+            self.view.setPlainText("与当前内容差异过大，不逐行比较。以下为所选版本全文：\n\n" + text)
+            return
+        diff = difflib.unified_diff(old_lines, new_lines, "所选版本", "当前内容", n=DIFF_CONTEXT, lineterm="")
+        rows = []
+        for line in itertools.islice(diff, MAX_DIFF_LINES):
+            if line.startswith(("+++", "---")):
+                continue
+            color = {"+": ADDED_COLOR, "-": REMOVED_COLOR}.get(line[:1])
+            if color is not None:
+                rows.append(f'<span style="background-color: {color};">{html.escape(line)}</span>')
+            elif line.startswith("@@"):
+                rows.append(f'<span style="color: {HUNK_COLOR};">{html.escape(line)}</span>')
+            else:
+                rows.append(html.escape(line))
+        if rows:
+            self.view.setHtml("<pre>" + "\n".join(rows) + "</pre>")
+        else:
+            self.view.setPlainText("与当前内容相同")
+
+    def restore_selected(self):
+        item = self.version_list.currentItem()
+        if item is None:
+            return
+        index = item.data(Qt.ItemDataRole.UserRole)
+        content = self.history.version(index)
+        self.note.record_saved_version()
+        self.note.text_edit.replace_content(content, html=self.history.entries[index]["kind"] == "html")
+        self.close()
@@ -0,0 +1,206 @@
+# image_store.py
+import hashlib
+import itertools
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, Qt, QThreadPool, QTimer
+from PySide6.QtGui import QImageReader
+
+from note_store import default_data_dir
+
+# 便签中引用图片的 URL 协议，例如 flashnote-image:<sha256>.png
+IMAGE_SCHEME = "flashnote-image"
+IMAGE_DIR_NAME = "images"
+# 图片最长边超过该像素数时按缩小后的尺寸显示和解码；需要重新编码的图片缩小后保存
+MAX_IMAGE_SIDE = 1600
+# 缩小后非透明图片以 JPEG 保存的质量
+JPEG_QUALITY = 85
+# 解码后的图片在内存中缓存的总大小(字节)。文档自身会缓存已加载的图片，
+# 这里只为重新打开的便签保留最近用过的小图，大图不缓存
+IMAGE_CACHE_BYTES = 8 * 1024 * 1024
+# 按原格式保存的图片类型及其扩展名
+IMAGE_EXTENSIONS = {"png": "png", "jpeg": "jpg", "jpg": "jpg", "gif": "gif", "webp": "webp", "bmp": "bmp"}
+# 启动后多久在后台删除不再被引用的图片(毫秒)
+SWEEP_DELAY_MS = 10_000
+_NAME_PATTERN = re.compile(r"[0-9a-f]{64}\.(?:png|jpg|gif|webp|bmp)")
+_REFERENCE_PATTERN = re.compile(IMAGE_SCHEME + r":([0-9a-f]{64}\.(?:png|jpg|gif|webp|bmp))")
+
+
+def _encode(image, image_format, quality=-1):
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, image_format, quality)
+    return data.data()
+
+
+def _fit(size):
+    """最长边不超过 MAX_IMAGE_SIDE 的尺寸"""
+    if max(size.width(), size.height()) > MAX_IMAGE_SIDE:
+        size = size.scaled(MAX_IMAGE_SIDE, MAX_IMAGE_SIDE, Qt.AspectRatioMode.KeepAspectRatio)
+    return size
+
+
+class ImageStore:
+    """
+    按内容寻址的图片存储：文件名为图片数据的 SHA-256，相同的图片只保存一份，
+    所有便签共用。便签文档中只保存 flashnote-image: 引用，显示时再按需加载。
+    不再被引用的图片由 sweep 在后台删除
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(default_data_dir(), IMAGE_DIR_NAME)
+        os.makedirs(self.directory, exist_ok=True)
+        # 原始数据的哈希 -> 保存的文件名，重复粘贴同一张图片时无需再次解码
+        self._names = {}
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        # 写入与清理互斥，清理不会删除刚刚再次粘贴的图片
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def url(self, name):
+        return f"{IMAGE_SCHEME}:{name}"
+
+    def put_data(self, data, image_type=None):
+        """
+        保存编码后的图片数据，返回 (文件名, 显示宽度, 显示高度)；无法解码时返回 None。
+        支持的格式原样保存，粘贴时不解码(解码大图的内存在释放后仍会留在进程中)，
+        过大的图片在显示时再按缩小后的尺寸解码；其他格式解码后重新编码
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        known = self._names.get(digest)
+        if known is not None:
+            return known
+        # 只读取图片头中的尺寸
+        buffer = QBuffer()
+        buffer.setData(data)
+        reader = QImageReader(buffer)
+        size = reader.size()
+        extension = IMAGE_EXTENSIONS.get((image_type or "").lower())
+        if size.isValid() and extension is not None:
+            shown = _fit(size)
+            stored = self._write(data, extension, shown.width(), shown.height())
+        else:
+            if size.isValid():
+                reader.setScaledSize(_fit(size))
+            image = reader.read()
+            if image.isNull():
+                return None
+            stored = self.put_image(image)
+        self._names[digest] = stored
+        return stored
+
+    def put_image(self, image):
+        """保存 QImage（例如剪贴板中的截图），返回 (文件名, 宽, 高)"""
+        if max(image.width(), image.height()) > MAX_IMAGE_SIDE:
+            image = image.scaled(MAX_IMAGE_SIDE, MAX_IMAGE_SIDE, Qt.AspectRatioMode.KeepAspectRatio,
+                                 Qt.TransformationMode.SmoothTransformation)
+        if image.hasAlphaChannel():
+            data, extension = _encode(image, "PNG"), "png"
+        else:
+            data, extension = _encode(image, "JPG", JPEG_QUALITY), "jpg"
+        return self._write(data, extension, image.width(), image.height())
+
+    def _write(self, data, extension, width, height):
+        name = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if os.path.exists(path):
+                # 更新修改时间，本次运行中用到的图片不会被清理
+                os.utime(path)
+            else:
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+        return name, width, height
+
+    def sweep(self, texts, before):
+        """
+        删除 texts(便签 HTML、历史版本等)中都没有引用、且修改时间早于 before 的图片，返回删除的数量。
+        读取 texts 出错时抛出异常，不删除任何图片
+        """
+        keep = set()
+        for text in texts:
+            keep.update(_REFERENCE_PATTERN.findall(text))
+        removed = 0
+        for name in os.listdir(self.directory):
+            if not _NAME_PATTERN.fullmatch(name) or name in keep:
+                continue
+            path = os.path.join(self.directory, name)
+            with self._lock:
+                try:
+                    if os.stat(path).st_mtime < before:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def sweep_async(self, texts, before):
+        """在后台线程中进行 sweep"""
+        if self._pool is None:
+            self._pool = QThreadPool()
+            self._pool.setMaxThreadCount(1)
+        self._pool.start(lambda: self._sweep_logged(texts, before))
+
+    def _sweep_logged(self, texts, before):
+        try:
+            self.sweep(texts, before)
+        except Exception as e:
+            print(f"清理不再使用的图片时出错: {e}")
+
+    def image(self, name):
+        """
+        按文件名加载图片，过大的图片按缩小后的尺寸解码；最近使用的图片保留在内存中。
+        不存在时返回 None
+        """
+        image = self._cache.get(name)
+        if image is not None:
+            self._cache.move_to_end(name)
+            return image
+        if not _NAME_PATTERN.fullmatch(name):
+            return None
+        reader = QImageReader(os.path.join(self.directory, name))
+        size = reader.size()
+        if size.isValid():
+            reader.setScaledSize(_fit(size))
+        image = reader.read()
+        if image.isNull():
+            return None
+        if image.sizeInBytes() <= IMAGE_CACHE_BYTES:
+            self._cache[name] = image
+            self._cache_bytes += image.sizeInBytes()
+            while self._cache_bytes > IMAGE_CACHE_BYTES:
+                self._cache_bytes -= self._cache.popitem(last=False)[1].sizeInBytes()
+        return image
+
+
+_image_store = None
+
+
+def get_image_store():
+    """获取全局图片存储"""
+    global _image_store
+    if _image_store is None:
+        _image_store = ImageStore()
+    return _image_store
+
+
+def sweep_unused_images(states):
+    """
+    启动后在后台删除不再被引用的图片：states(启动时存储中的全部便签，包括归档的)、
+    历史版本与撤销历史的磁盘记录中都没有引用的图片。本次运行中写入或再次粘贴的图片不会被删除
+    """
+    from undo_history import spilled_texts
+    from version_history import get_version_history, record_texts
+    store = get_image_store()
+    before = time.time()
+    htmls = [state.get("html", "") for state in states]
+    texts = itertools.chain(htmls, record_texts(get_version_history().directory), spilled_texts())
+    QTimer.singleShot(SWEEP_DELAY_MS, lambda: store.sweep_async(texts, before))
@@ -0,0 +1,89 @@
+# instance_client.py
+# 只依赖标准库，第二次启动时无需加载 PySide6 即可把命令转发给已运行的实例
+# 这里的每个导入都会计入再次启动的耗时，避免 tempfile、getpass 等较重的模块
+import json
+import os
+import socket
+
+
+def _user_name():
+    name = os.environ.get("USER") or os.environ.get("USERNAME")
+    if not name:
+        import getpass
+        name = getpass.getuser()
+    return name
+
+
+# 每个用户一个实例，可通过环境变量指定名称
+SERVER_NAME = os.environ.get("FLASHNOTE_SERVER_NAME") or f"FlashNote-{_user_name()}"
+TIMEOUT_SECONDS = 2
+
+# 支持的命令: 新建便签 / 显示全部 / 聚焦第 N 个便签 / 切换命名布局
+COMMAND_NEW = "new"
+COMMAND_SHOW_ALL = "show"
+COMMAND_FOCUS = "focus"
+COMMAND_LAYOUT = "layout"
+
+
+def server_address(server_name=SERVER_NAME):
+    """
+    获取本地服务地址，与 QLocalServer 的命名规则一致:
+    Windows 上是命名管道名，其他平台是临时目录下的套接字文件
+    (与 QDir.tempPath() 相同的规则)
+    """
+    if os.name == "nt":
+        return server_name
+    return os.path.join(os.environ.get("TMPDIR") or "/tmp", server_name)
+
+
+def parse_command(args):
+    """
+    解析命令行参数:
+        main.py             新建便签
+        main.py --show-all  显示所有便签
+        main.py --focus N   聚焦第 N 个便签 (从 1 开始，也可以是便签 id)
+        main.py --layout 名称  切换到命名布局
+    """
+    if "--show-all" in args:
+        return {"command": COMMAND_SHOW_ALL}
+    if "--focus" in args:
+        index = args.index("--focus")
+        if index + 1 < len(args):
+            return {"command": COMMAND_FOCUS, "note": args[index + 1]}
+    if "--layout" in args:
+        index = args.index("--layout")
+        if index + 1 < len(args):
+            return {"command": COMMAND_LAYOUT, "name": args[index + 1]}
+    return {"command": COMMAND_NEW}
+
+
+def send_command(command, server_name=SERVER_NAME):
+    """
+    把命令转发给已运行的实例，成功返回 True。
+    没有实例在运行时立即返回 False。
+    """
+    reply = request(command, server_name)
+    return reply is not None and reply.strip() == b"ok"
+
+
+def request(command, server_name=SERVER_NAME):
+    """
+    发送命令并返回实例的回复 (b"ok\n" 或 b"error\n")；没有实例在运行时返回 None。
+    命令中 "wait" 为 True 时，实例处理完成后才回复
+    """
+    data = json.dumps(command).encode("utf-8") + b"\n"
+    address = server_address(server_name)
+    try:
+        if os.name == "nt":
+            with open(r"\\.\pipe\\" + address, "r+b", buffering=0) as pipe:
+                pipe.write(data)
+                return pipe.readline()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(TIMEOUT_SECONDS)
+            sock.connect(address)
+            sock.sendall(data)
+            with sock.makefile("rb") as f:
+                return f.readline()
+    except OSError:
+        # 没有实例、残留的套接字文件或超时
+        return None
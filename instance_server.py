@@ -0,0 +1,73 @@
+# instance_server.py
+import json
+
+from PySide6.QtCore import QObject
+from PySide6.QtNetwork import QLocalServer, QLocalSocket
+
+from instance_client import SERVER_NAME, TIMEOUT_SECONDS, server_address
+
+
+def listen(server, address):
+    """
+    开始监听。地址被占用时先尝试连接：只有连接被拒绝(上次进程崩溃残留的套接字文件)才清理后重试，
+    正在运行但暂时繁忙的实例的套接字不会被删除
+    """
+    if server.listen(address):
+        return True
+    probe = QLocalSocket()
+    probe.connectToServer(address)
+    if probe.waitForConnected(TIMEOUT_SECONDS * 1000):
+        probe.disconnectFromServer()
+        return False
+    if probe.error() != QLocalSocket.LocalSocketError.ConnectionRefusedError:
+        return False
+    QLocalServer.removeServer(address)
+    return server.listen(address)
+
+
+class InstanceServer(QObject):
+    """监听后续启动转发过来的命令，在主线程中调用 handler(command)；只允许当前用户连接"""
+
+    def __init__(self, handler, server_name=SERVER_NAME, parent=None):
+        super().__init__(parent)
+        self.handler = handler
+        self.server = QLocalServer(self)
+        self.server.setSocketOptions(QLocalServer.SocketOption.UserAccessOption)
+        self.server.newConnection.connect(self._on_new_connection)
+        if not listen(self.server, server_address(server_name)):
+            print(f"无法监听实例命令: {self.server.errorString()}")
+
+    def _on_new_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            socket.readyRead.connect(lambda s=socket: self._on_ready_read(s))
+            socket.disconnected.connect(socket.deleteLater)
+
+    def _on_ready_read(self, socket):
+        while socket.canReadLine():
+            line = socket.readLine().data()
+            try:
+                command = json.loads(line)
+            except ValueError:
+                command = None
+            if not isinstance(command, dict):
+                socket.write(b"error\n")
+                socket.flush()
+                continue
+            if command.get("wait"):
+                # 命令行模式需要确认命令已完成（例如已写入存储）
+                socket.write(b"ok\n" if self._handle(command) else b"error\n")
+                socket.flush()
+                continue
+            # 先回复再处理，让发起方尽快退出
+            socket.write(b"ok\n")
+            socket.flush()
+            self._handle(command)
+
+    def _handle(self, command):
+        try:
+            self.handler(command)
+        except Exception as e:
+            print(f"处理实例命令时出错: {e}")
+            return False
+        return True
@@ -0,0 +1,328 @@
+# instrumentation.py
+import functools
+import os
+import time
+
+from PySide6.QtCore import Qt, QObject, QEvent, QTimer
+from PySide6.QtGui import QFont, QGuiApplication
+from PySide6.QtWidgets import QLabel
+
+from note_store import default_data_dir
+
+# 设置为 1 时启动即开启性能监视
+TRACE_ENV = "FLASHNOTE_TRACE"
+# 设置为 1 时第一个便签完成首次绘制后，向标准输出打印启动各阶段的耗时(JSON)
+STARTUP_ENV = "FLASHNOTE_STARTUP_REPORT"
+TRACE_NAME = "trace.jsonl"
+# 跟踪文件超过该大小时轮换，最多保留 TRACE_BACKUPS 个旧文件
+TRACE_MAX_BYTES = 2 * 1024 * 1024
+TRACE_BACKUPS = 3
+# 心跳定时器间隔(毫秒)，实际触发时间与预期的差值即为事件循环延迟
+HEARTBEAT_MS = 50
+# 汇总统计、刷新浮层和写入跟踪文件的间隔(毫秒)
+SUMMARY_MS = 1000
+# 超过一帧的单次调用或事件循环延迟会单独记录
+SLOW_MS = 16.0
+
+# 需要计时的入口：(模块, 类名, 方法名)
+PROBES = (
+    ("event_handlers", "WindowEventHandler", (
+        "mouse_press_event", "mouse_move_event", "apply_drag", "mouse_release_event", "move_event",
+        "wheel_event", "key_press_event", "resize_event", "context_menu_event", "change_event")),
+    ("event_handlers", "TextEditEventHandler", ("extend_text_edit_context_menu",)),
+    ("text_editor", "StyleSheetManager", ("update_style",)),
+)
+
+
+def enabled_by_env():
+    return os.environ.get(TRACE_ENV) == "1"
+
+
+class _NoteProbe(QObject):
+    """统计一个便签的重新布局与重绘次数，随窗口一起销毁"""
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.relayouts = 0
+        self.repaints = 0
+        self.viewport = None
+        self.document = None
+        window.installEventFilter(self)
+
+    def attach(self, text_edit):
+        """切换编辑引擎后编辑控件和文档都会更换，需要重新挂接"""
+        viewport = text_edit.viewport()
+        if viewport is not self.viewport:
+            self.viewport = viewport
+            viewport.installEventFilter(self)
+        document = text_edit.document()
+        if document is not self.document:
+            self.document = document
+            document.documentLayout().documentSizeChanged.connect(self._on_text_layout)
+
+    def _on_text_layout(self, _size):
+        self.relayouts += 1
+
+    def eventFilter(self, _watched, event):
+        event_type = event.type()
+        if event_type == QEvent.Type.Paint:
+            self.repaints += 1
+        elif event_type == QEvent.Type.LayoutRequest:
+            self.relayouts += 1
+        return False
+
+    def take_counts(self):
+        counts = self.relayouts, self.repaints
+        self.relayouts = self.repaints = 0
+        return counts
+
+
+class Profiler:
+    """
+    性能监视：为事件处理入口和样式更新包装计时探针，用心跳定时器测量事件循环延迟，
+    统计每个便签的重新布局、重绘次数与撤销历史占用的内存，
+    每秒刷新浮层并写入轮换的 JSONL 跟踪文件。
+    探针只在开启时替换类上的方法，关闭后原样恢复，关闭状态没有任何额外开销
+    """
+
+    def __init__(self, trace_path=None, show_overlay=True):
+        self.calls = {}  # 探针名 -> [次数, 总耗时, 最大耗时](秒)
+        self.lags = []
+        self.slow = []
+        self.last_summary = None
+        self.probes = {}  # note_id -> _NoteProbe
+        self._originals = []
+
+        # logging.handlers 会连带导入 socket、pickle 等模块，只在开启时导入
+        import logging.handlers
+        self.trace_path = trace_path or os.path.join(default_data_dir(), TRACE_NAME)
+        os.makedirs(os.path.dirname(self.trace_path), exist_ok=True)
+        self._trace = logging.getLogger("flashnote.trace")
+        self._trace.propagate = False
+        self._trace.setLevel(logging.INFO)
+        self._handler = logging.handlers.RotatingFileHandler(
+            self.trace_path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS, encoding="utf-8")
+        self._trace.addHandler(self._handler)
+
+        self.overlay = None
+        if show_overlay:
+            self.overlay = QLabel()
+            self.overlay.setWindowFlags(Qt.WindowType.Tool | Qt.WindowType.FramelessWindowHint
+                                        | Qt.WindowType.WindowStaysOnTopHint
+                                        | Qt.WindowType.WindowTransparentForInput)
+            self.overlay.setFont(QFont("monospace", 9))
+            self.overlay.setStyleSheet("background-color: rgba(0, 0, 0, 180); color: #e0e0e0; padding: 6px;")
+
+        self._heartbeat = QTimer()
+        self._heartbeat.setTimerType(Qt.TimerType.PreciseTimer)
+        self._heartbeat.setInterval(HEARTBEAT_MS)
+        self._heartbeat.timeout.connect(self._on_heartbeat)
+        self._summary_timer = QTimer()
+        self._summary_timer.setInterval(SUMMARY_MS)
+        self._summary_timer.timeout.connect(self.summarize)
+
+    def start(self):
+        self._install_probes()
+        self._last_beat = time.perf_counter()
+        self._heartbeat.start()
+        self._summary_timer.start()
+        if self.overlay is not None:
+            self.overlay.setText("性能监视已开启")
+            self.overlay.adjustSize()
+            self._place_overlay()
+            self.overlay.show()
+
+    def stop(self):
+        self._heartbeat.stop()
+        self._summary_timer.stop()
+        self._remove_probes()
+        for probe in list(self.probes.values()):
+            probe.deleteLater()
+        self.probes.clear()
+        if self.overlay is not None:
+            self.overlay.deleteLater()
+            self.overlay = None
+        self._trace.removeHandler(self._handler)
+        self._handler.close()
+
+    def _install_probes(self):
+        import importlib
+        for module_name, class_name, names in PROBES:
+            cls = getattr(importlib.import_module(module_name), class_name)
+            for name in names:
+                original = cls.__dict__[name]
+                self._originals.append((cls, name, original))
+                setattr(cls, name, self._wrap(f"{class_name}.{name}", original))
+
+    def _remove_probes(self):
+        # 注意：开启前已连接到信号的绑定方法（如拖动定时器）仍是原方法，不会被计时
+        for cls, name, original in self._originals:
+            setattr(cls, name, original)
+        self._originals.clear()
+
+    def _wrap(self, probe_name, func):
+        record = self.record
+
+        @functools.wraps(func)
+        def probe(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(probe_name, time.perf_counter() - start)
+        return probe
+
+    def record(self, name, seconds):
+        stats = self.calls.get(name)
+        if stats is None:
+            self.calls[name] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+        if seconds * 1e3 > SLOW_MS:
+            self.slow.append({"type": "slow", "probe": name, "ms": round(seconds * 1e3, 2)})
+
+    def watch(self, window):
+        """开始统计便签的重新布局与重绘，编辑引擎切换后再次调用即可"""
+        probe = self.probes.get(window.note_id)
+        if probe is None or probe.window is not window:
+            probe = self.probes[window.note_id] = _NoteProbe(window)
+            note_id = window.note_id
+            probe.destroyed.connect(lambda: self._forget(note_id, probe))
+        probe.attach(window.text_edit)
+
+    def _forget(self, note_id, probe):
+        if self.probes.get(note_id) is probe:
+            del self.probes[note_id]
+
+    def _on_heartbeat(self):
+        now = time.perf_counter()
+        lag = max(0.0, now - self._last_beat - HEARTBEAT_MS / 1000)
+        self._last_beat = now
+        self.lags.append(lag)
+        if lag * 1e3 > SLOW_MS:
+            self.slow.append({"type": "lag", "ms": round(lag * 1e3, 2)})
+
+    def summarize(self):
+        """汇总上一个周期的数据，刷新浮层并写入跟踪文件"""
+        lags = sorted(self.lags)
+        self.lags = []
+        notes = {}
+        for note_id, probe in self.probes.items():
+            relayouts, repaints = probe.take_counts()
+            undo_kb = probe.window.text_edit.undo_history.bytes // 1024
+            if relayouts or repaints or undo_kb:
+                notes[note_id] = {"relayouts": relayouts, "repaints": repaints, "undo_kb": undo_kb}
+        summary = {
+            "type": "summary",
+            "lag_ms": {"p95": round(lags[int(len(lags) * 0.95)] * 1e3, 2) if lags else 0.0,
+                       "max": round(lags[-1] * 1e3, 2) if lags else 0.0},
+            "probes": {name: {"count": count, "total_ms": round(total * 1e3, 3), "max_ms": round(worst * 1e3, 3)}
+                       for name, (count, total, worst) in self.calls.items()},
+            "notes": notes,
+        }
+        self.calls = {}
+        slow, self.slow = self.slow, []
+        self.last_summary = summary
+
+        now = time.time()
+        for entry in slow:
+            self._write(now, entry)
+        # 空闲时不写汇总，避免跟踪文件被无意义的记录填满
+        active = any(counts["relayouts"] or counts["repaints"] for counts in notes.values())
+        if summary["probes"] or active or summary["lag_ms"]["max"] > SLOW_MS:
+            self._write(now, summary)
+        if self.overlay is not None:
+            self.overlay.setText(self._overlay_text(summary))
+            self.overlay.adjustSize()
+            self._place_overlay()
+
+    def log(self, entry):
+        """写入一条额外的跟踪记录"""
+        self._write(time.time(), entry)
+
+    def _write(self, timestamp, entry):
+        import json
+        self._trace.info(json.dumps({"t": round(timestamp, 3), **entry}, ensure_ascii=False))
+
+    def _overlay_text(self, summary):
+        lines = [f"事件循环延迟 p95 {summary['lag_ms']['p95']:.1f} ms  最大 {summary['lag_ms']['max']:.1f} ms"]
+        busiest = sorted(summary["probes"].items(), key=lambda item: item[1]["total_ms"], reverse=True)
+        for name, stats in busiest[:5]:
+            lines.append(f"{name:<45} {stats['count']:>5} 次 {stats['total_ms']:>8.2f} ms  最大 {stats['max_ms']:.2f}")
+        for note_id, counts in sorted(summary["notes"].items(), key=lambda item: -item[1]["repaints"])[:5]:
+            probe = self.probes.get(note_id)
+            title = probe.document.firstBlock().text()[:12] if probe is not None and probe.document else ""
+            lines.append(f"便签 {note_id[:6]} {title:<12} 布局 {counts['relayouts']:>4}  重绘 {counts['repaints']:>4}"
+                         f"  撤销 {counts['undo_kb']:>6} KB")
+        return "\n".join(lines)
+
+    def _place_overlay(self):
+        screen = QGuiApplication.primaryScreen()
+        if screen is not None:
+            area = screen.availableGeometry()
+            self.overlay.move(area.right() - self.overlay.width() - 8, area.top() + 8)
+
+
+class StartupTimer(QObject):
+    """
+    启动计时：从 main.py 开始执行算起，记录各阶段完成的时间，
+    第一个便签完成首次绘制后汇总，写入跟踪文件并按需打印
+    """
+
+    def __init__(self, started):
+        super().__init__()
+        self.started = started
+        self.phases = {}
+        self._viewport = None
+
+    def mark(self, phase):
+        self.phases[f"{phase}_ms"] = round((time.perf_counter() - self.started) * 1e3, 2)
+
+    def watch(self, window):
+        """等待该便签的首次绘制"""
+        self._viewport = window.text_edit.viewport()
+        self._viewport.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if watched is self._viewport and event.type() == QEvent.Type.Paint:
+            watched.removeEventFilter(self)
+            self._viewport = None
+            # 绘制完成后再计时
+            QTimer.singleShot(0, self, self._on_first_paint)
+        return False
+
+    def _on_first_paint(self):
+        self.mark("first_paint")
+        profiler = get_profiler()
+        if profiler is not None:
+            profiler.log({"type": "startup", **self.phases})
+        if os.environ.get(STARTUP_ENV) == "1":
+            import json
+            print(json.dumps(self.phases), flush=True)
+
+
+_profiler = None
+
+
+def get_profiler():
+    """开启时返回全局的性能监视器，关闭时返回 None"""
+    return _profiler
+
+
+def set_enabled(enabled, windows=(), **options):
+    """开启或关闭性能监视；windows 为已经打开的便签"""
+    global _profiler
+    if enabled and _profiler is None:
+        _profiler = Profiler(**options)
+        _profiler.start()
+        for window in windows:
+            _profiler.watch(window)
+    elif not enabled and _profiler is not None:
+        _profiler.summarize()
+        _profiler.stop()
+        _profiler = None
+    return _profiler
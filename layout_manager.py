@@ -0,0 +1,178 @@
+# layout_manager.py
+import json
+import os
+import time
+from collections import OrderedDict
+
+from PySide6.QtCore import QObject, QRect, QTimer
+from PySide6.QtGui import QGuiApplication
+
+from note_store import default_data_dir, _atomic_write
+
+LAYOUTS_NAME = "layouts.json"
+# 每次空闲时最多用于创建便签的时间(毫秒)，至少创建一个
+RESTORE_SLICE_MS = 8
+# 窗口在屏幕内露出的宽和高都不足该像素数时，移回屏幕
+MIN_VISIBLE = 40
+
+
+def available_geometries():
+    """当前各屏幕的可用区域，第一个为主屏幕"""
+    primary = QGuiApplication.primaryScreen()
+    screens = sorted(QGuiApplication.screens(), key=lambda screen: screen is not primary)
+    return [screen.availableGeometry() for screen in screens]
+
+
+def _overlap(rect, screen):
+    overlap = rect.intersected(screen)
+    return (overlap.width(), overlap.height()) if not overlap.isEmpty() else (0, 0)
+
+
+def is_on_screen(geometry, screens):
+    """[x, y, 宽, 高] 在某个屏幕内露出足够大的部分"""
+    rect = QRect(*geometry)
+    return any(min(_overlap(rect, screen)) >= MIN_VISIBLE for screen in screens)
+
+
+def clamp_geometry(geometry, screens=None):
+    """
+    把 [x, y, 宽, 高] 限制在屏幕内。显示器变化后露出部分不足 MIN_VISIBLE 时，
+    移到重叠最多的屏幕(没有重叠时为主屏幕)内，超过屏幕大小时缩小
+    """
+    screens = available_geometries() if screens is None else screens
+    if not screens or is_on_screen(geometry, screens):
+        return list(geometry)
+    rect = QRect(*geometry)
+    screen = max(screens, key=lambda s: _overlap(rect, s)[0] * _overlap(rect, s)[1])
+    if _overlap(rect, screen) == (0, 0):
+        screen = screens[0]
+    width = min(rect.width(), screen.width())
+    height = min(rect.height(), screen.height())
+    x = min(max(rect.x(), screen.left()), screen.left() + screen.width() - width)
+    y = min(max(rect.y(), screen.top()), screen.top() + screen.height() - height)
+    return [x, y, width, height]
+
+
+def restore_priority(state, screens):
+    """恢复顺序：置顶的便签最先，其次是在屏幕内的，最后是需要移回屏幕的"""
+    if state.get("is_pinned"):
+        return 0
+    geometry = state.get("geometry")
+    return 1 if not geometry or is_on_screen(geometry, screens) else 2
+
+
+class SessionRestorer(QObject):
+    """
+    分批恢复便签窗口。按优先级排序后立即创建并显示第一个便签，
+    其余在事件循环空闲时创建，每次最多占用 RESTORE_SLICE_MS 毫秒，恢复期间仍能响应输入。
+    恢复前把位置限制在当前屏幕内。不保留创建的窗口，由 create_window 负责登记
+    """
+
+    def __init__(self, create_window, on_finished=None, parent=None):
+        super().__init__(parent)
+        self.create_window = create_window
+        self.on_finished = on_finished
+        # note_id -> 尚未创建窗口的便签状态，按恢复顺序排列
+        self.pending = OrderedDict()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._restore_slice)
+
+    def start(self, states):
+        """开始恢复，返回立即显示的第一个便签；没有便签时返回 None"""
+        screens = available_geometries()
+        for state in sorted(states, key=lambda state: restore_priority(state, screens)):
+            if state.get("geometry"):
+                state = {**state, "geometry": clamp_geometry(state["geometry"], screens)}
+            self.pending[state["id"]] = state
+        first = self._restore_next() if self.pending else None
+        self._continue()
+        return first
+
+    def __contains__(self, note_id):
+        return note_id in self.pending
+
+    def _restore_next(self):
+        return self._create(self.pending.popitem(last=False)[1])
+
+    def _create(self, state):
+        window = self.create_window(state)
+        window.show()
+        return window
+
+    def _restore_slice(self):
+        deadline = time.perf_counter() + RESTORE_SLICE_MS / 1000
+        while self.pending:
+            self._restore_next()
+            if time.perf_counter() >= deadline:
+                break
+        self._continue()
+
+    def _continue(self):
+        if self.pending:
+            self._timer.start()
+        elif self.on_finished is not None:
+            self.on_finished()
+            self.on_finished = None
+
+    def restore_now(self, note_id):
+        """立即创建尚未恢复的便签，返回窗口；不在等待恢复的便签中时返回 None"""
+        state = self.pending.pop(note_id, None)
+        if state is None:
+            return None
+        window = self._create(state)
+        self._continue()
+        return window
+
+    def finish(self):
+        """立即创建所有尚未恢复的便签"""
+        self._timer.stop()
+        while self.pending:
+            self._restore_next()
+        self._continue()
+
+
+class LayoutStore:
+    """
+    命名布局，如"工作"、"家里"，保存在数据目录的 layouts.json 中：
+    布局名 -> {便签 id: {"geometry": [x, y, 宽, 高], "is_pinned": 是否置顶}}，只记录可见的便签
+    """
+
+    def __init__(self, directory=None):
+        self.path = os.path.join(directory or default_data_dir(), LAYOUTS_NAME)
+        self.layouts = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.layouts = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def names(self):
+        return sorted(self.layouts)
+
+    def get(self, name):
+        return self.layouts.get(name)
+
+    def save(self, name, notes):
+        self.layouts[name] = notes
+        self._write()
+
+    def delete(self, name):
+        if self.layouts.pop(name, None) is not None:
+            self._write()
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        _atomic_write(self.path, json.dumps(self.layouts, ensure_ascii=False))
+
+
+_layout_store = None
+
+
+def get_layout_store():
+    """获取全局的命名布局存储"""
+    global _layout_store
+    if _layout_store is None:
+        _layout_store = LayoutStore()
+    return _layout_store
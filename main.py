@@ -1,13 +1,61 @@
 # main.py
-from PySide6.QtWidgets import QApplication
 import sys
-from sticky_note import create_window
+import time
+
+# 启动计时的起点
+STARTED = time.perf_counter()
+
+from instance_client import parse_command, send_command
 
 if __name__ == '__main__':
+    # 命令行模式 (add/append/list/cat/search) 不启动界面
+    if len(sys.argv) > 1 and sys.argv[1] in ("add", "append", "list", "cat", "search"):
+        from cli import main
+        sys.exit(main(sys.argv[1:]))
+
+    # 已有实例在运行时只转发命令，不再启动新的界面进程
+    command = parse_command(sys.argv[1:])
+    if send_command(command):
+        sys.exit(0)
+
+    from PySide6.QtWidgets import QApplication
+    from instance_server import InstanceServer
+    from automation_client import enabled_by_env as automation_enabled
+    from instrumentation import StartupTimer, enabled_by_env, set_enabled as set_instrumentation_enabled
+    from sticky_note import create_window, restore_windows, save_all_windows, handle_instance_command
+
+    startup = StartupTimer(STARTED)
+    startup.mark("imports")
     app = QApplication(sys.argv)
+    app.aboutToQuit.connect(save_all_windows)
+    server = InstanceServer(handle_instance_command)
+    # FLASHNOTE_AUTOMATION=1 时开启本地自动化接口(JSON-RPC)
+    automation = None
+    if automation_enabled():
+        from automation_server import AutomationServer
+        automation = AutomationServer()
+    # FLASHNOTE_TRACE=1 时开启性能监视，需在创建窗口之前
+    if enabled_by_env():
+        set_instrumentation_enabled(True)
+        app.aboutToQuit.connect(lambda: set_instrumentation_enabled(False))
+    startup.mark("app")
+
+    # 恢复上次的便签，没有则创建第一个窗口
+    notes = restore_windows() or [create_window()]
+    for note in notes:
+        note.show()
+    startup.mark("windows")
+    startup.watch(notes[0])
+    if command["command"] == "layout":
+        # 启动时指定的布局在恢复便签之后切换
+        handle_instance_command(command)
 
-    # 创建第一个窗口
-    note = create_window()
-    note.show()
+    # 整个应用只监听一次剪贴板，记录剪贴板历史
+    from clipboard_history import ClipboardHistory
+    ClipboardHistory.instance()
+    # 稍后在后台删除不再被任何便签引用的图片
+    from image_store import sweep_unused_images
+    from note_store import get_note_store
+    sweep_unused_images(list(get_note_store().notes.values()))
 
     sys.exit(app.exec())
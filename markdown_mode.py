@@ -0,0 +1,220 @@
+# markdown_mode.py
+import re
+
+from PySide6.QtCore import QObject, QEvent, Qt, QTimer
+from PySide6.QtGui import (QSyntaxHighlighter, QTextBlockUserData, QTextCharFormat, QTextCursor, QTextFormat, QColor,
+                           QFont)
+
+# 段落状态的各位：是否位于 ``` 代码块中、是否为待办项、待办项是否已完成
+IN_CODE_BLOCK = 1
+CHECKLIST_ITEM = 2
+CHECKLIST_DONE = 4
+
+_HEADING = re.compile(r"(#{1,6})\s+\S")
+_CHECKLIST = re.compile(r"(\s*[-*+]\s+)\[([ xX])\](?=\s|$)")
+_CODE_SPAN = re.compile(r"`[^`]+`")
+_LINK = re.compile(r"\[[^\]]+\]\([^)\s]+\)|https?://[^\s)>\]]+")
+# 标题级别 -> 字号放大级别 (QTextFormat.FontSizeAdjustment)，其余级别只加粗
+HEADING_SIZE_ADJUSTMENT = {1: 2, 2: 1}
+ACCENT_COLOR = "#1e88e5"
+DONE_COLOR = "#888888"
+
+_formats = None
+
+
+def _get_formats():
+    """各种标记的格式，所有便签共用"""
+    global _formats
+    if _formats is None:
+        heading = {}
+        for level in range(1, 7):
+            text_format = QTextCharFormat()
+            text_format.setFontWeight(QFont.Weight.Bold)
+            if level in HEADING_SIZE_ADJUSTMENT:
+                text_format.setProperty(QTextFormat.Property.FontSizeAdjustment, HEADING_SIZE_ADJUSTMENT[level])
+            heading[level] = text_format
+        checkbox = QTextCharFormat()
+        checkbox.setFontWeight(QFont.Weight.Bold)
+        checkbox.setForeground(QColor(ACCENT_COLOR))
+        done = QTextCharFormat()
+        done.setFontStrikeOut(True)
+        done.setForeground(QColor(DONE_COLOR))
+        code = QTextCharFormat()
+        code.setFontFamilies(["monospace"])
+        code.setFontFixedPitch(True)
+        code.setBackground(QColor(127, 127, 127, 40))
+        link = QTextCharFormat()
+        link.setForeground(QColor(ACCENT_COLOR))
+        link.setFontUnderline(True)
+        _formats = {"heading": heading, "checkbox": checkbox, "done": done, "code": code, "link": link}
+    return _formats
+
+
+class _ChecklistCounts:
+    """待办项的完成数量与总数"""
+
+    def __init__(self):
+        self.done = 0
+        self.total = 0
+        # 有未通知的变化
+        self.changed = False
+
+    def add(self, state, sign):
+        if state & CHECKLIST_ITEM:
+            self.total += sign
+            if state & CHECKLIST_DONE:
+                self.done += sign
+            self.changed = True
+
+
+class _ChecklistData(QTextBlockUserData):
+    """段落计入待办数量的状态。段落被删除时 Qt 释放段落数据，同时从数量中减去"""
+
+    def __init__(self, counts):
+        super().__init__()
+        self.counts = counts
+        self.state = 0
+
+    def __del__(self):
+        self.counts.add(self.state, -1)
+
+
+class MarkdownHighlighter(QSyntaxHighlighter):
+    """
+    Markdown 与待办清单高亮：标题、- [ ] 待办项、``` 代码块、`代码`、链接。
+    段落状态记录是否位于代码块中以及待办项是否完成；编辑时 Qt 只重新高亮被修改的段落，
+    段落状态变化时才继续高亮下一段，因此开销与被编辑的段落成正比。
+    完成数量在高亮时按段落的变化增量更新，被删除的段落在释放段落数据时减去，不需要重新统计
+    """
+
+    def __init__(self, document, on_counts_changed=None):
+        super().__init__(document)
+        self.formats = _get_formats()
+        self.counts = _ChecklistCounts()
+        self.on_counts_changed = on_counts_changed
+        self._notify_scheduled = False
+
+    @property
+    def done(self):
+        return self.counts.done
+
+    @property
+    def total(self):
+        return self.counts.total
+
+    def highlightBlock(self, text):
+        previous = self.previousBlockState()
+        in_code = previous > 0 and previous & IN_CODE_BLOCK
+        state = 0
+        if text.lstrip().startswith("```"):
+            self.setFormat(0, len(text), self.formats["code"])
+            state = 0 if in_code else IN_CODE_BLOCK
+        elif in_code:
+            self.setFormat(0, len(text), self.formats["code"])
+            state = IN_CODE_BLOCK
+        else:
+            state = self._highlight_line(text)
+        self.setCurrentBlockState(state)
+        self._update_counts(state & (CHECKLIST_ITEM | CHECKLIST_DONE))
+
+    def _highlight_line(self, text):
+        state = 0
+        if text.startswith("#"):
+            match = _HEADING.match(text)
+            if match:
+                self.setFormat(0, len(text), self.formats["heading"][len(match.group(1))])
+        else:
+            match = _CHECKLIST.match(text)
+            if match:
+                state = CHECKLIST_ITEM
+                checkbox_start = match.start(2) - 1
+                self.setFormat(checkbox_start, 3, self.formats["checkbox"])
+                if match.group(2) != " ":
+                    state |= CHECKLIST_DONE
+                    self.setFormat(match.end(), len(text) - match.end(), self.formats["done"])
+        # 大多数段落不含代码和链接，先用字符串查找过滤
+        if "`" in text:
+            for match in _CODE_SPAN.finditer(text):
+                self.setFormat(match.start(), match.end() - match.start(), self.formats["code"])
+        if "](" in text or "http" in text:
+            for match in _LINK.finditer(text):
+                self.setFormat(match.start(), match.end() - match.start(), self.formats["link"])
+        return state
+
+    def _update_counts(self, checklist):
+        data = self.currentBlockUserData()
+        if data is None and checklist:
+            # 只为待办项段落创建段落数据
+            data = _ChecklistData(self.counts)
+            self.setCurrentBlockUserData(data)
+        if data is not None and data.state != checklist:
+            self.counts.add(data.state, -1)
+            self.counts.add(checklist, 1)
+            data.state = checklist
+        # 删除段落时减去的数量也在这里通知：删除之后 Qt 总会重新高亮删除处的段落
+        if self.counts.changed:
+            self.counts.changed = False
+            self._schedule_notify()
+
+    def _schedule_notify(self):
+        # 一次编辑可能重新高亮多个段落，合并为一次通知
+        if self.on_counts_changed is not None and not self._notify_scheduled:
+            self._notify_scheduled = True
+            QTimer.singleShot(0, self, self._notify)
+
+    def _notify(self):
+        self._notify_scheduled = False
+        if self.on_counts_changed is not None:
+            self.on_counts_changed(self.done, self.total)
+
+    def detach(self):
+        """停止高亮并清除段落状态与段落数据，之后重新开启时从头统计"""
+        document = self.document()
+        self.on_counts_changed = None
+        self.setDocument(None)
+        block = document.firstBlock()
+        while block.isValid():
+            block.setUserState(-1)
+            block.setUserData(None)
+            block = block.next()
+
+
+class MarkdownMode(QObject):
+    """编辑器的 Markdown/待办模式：语法高亮，点击待办项的 [ ] 切换完成状态"""
+
+    def __init__(self, text_edit):
+        super().__init__(text_edit)
+        self.text_edit = text_edit
+        self.highlighter = MarkdownHighlighter(text_edit.document(), self._on_counts_changed)
+        text_edit.viewport().installEventFilter(self)
+
+    def _on_counts_changed(self, done, total):
+        self.text_edit.notify_checklist_changed(done, total)
+
+    def eventFilter(self, _watched, event):
+        if (event.type() == QEvent.Type.MouseButtonPress and event.button() == Qt.MouseButton.LeftButton
+                and not event.modifiers()):
+            cursor = self.text_edit.cursorForPosition(event.position().toPoint())
+            if self.toggle_checkbox(cursor.block(), cursor.positionInBlock()):
+                return True
+        return False
+
+    def toggle_checkbox(self, block, column=None):
+        """
+        切换待办项的完成状态，可以撤销；column 不为 None 时只有点在 [ ] 上才切换。
+        返回是否切换
+        """
+        match = _CHECKLIST.match(block.text())
+        if match is None or (column is not None and not match.start(2) - 1 <= column <= match.end(2) + 1):
+            return False
+        cursor = QTextCursor(block)
+        cursor.setPosition(block.position() + match.start(2))
+        cursor.setPosition(block.position() + match.end(2), QTextCursor.MoveMode.KeepAnchor)
+        cursor.insertText(" " if match.group(2) != " " else "x")
+        return True
+
+    def close(self):
+        self.text_edit.viewport().removeEventFilter(self)
+        self.highlighter.detach()
+        self.highlighter.deleteLater()
+        self.deleteLater()
@@ -0,0 +1,94 @@
+# note_registry.py
+from collections import OrderedDict
+
+from note_store import get_note_store
+from search_index import get_search_index
+
+# 最多保留多少个隐藏但仍是完整窗口的便签，再次显示时无需重建
+MAX_LIVE_HIDDEN = 8
+
+
+class NoteRecord:
+    """
+    隐藏便签的记录：直接引用存储中的便签状态，不另外保存一份内容，也不持有任何控件
+    """
+
+    __slots__ = ("note_id", "state")
+
+    def __init__(self, state):
+        self.note_id = state["id"]
+        self.state = state
+
+    def text(self):
+        """便签的 HTML，纯文本引擎的便签为纯文本"""
+        state = self.state
+        return state["text"] if "text" in state else state.get("html", "")
+
+    def plain_text(self):
+        """便签的纯文本，用于搜索索引"""
+        if "text" in self.state:
+            return self.text()
+        from PySide6.QtGui import QTextDocument
+        document = QTextDocument()
+        document.setHtml(self.text())
+        return document.toPlainText()
+
+    def to_state(self):
+        """还原为 StickyNote 可以使用的状态"""
+        return {**self.state, "hidden": True}
+
+
+class NoteRegistry:
+    """
+    隐藏便签的登记表。
+    最近隐藏的 MAX_LIVE_HIDDEN 个便签保留窗口，更早隐藏的按最近最少使用的顺序
+    释放为 NoteRecord，需要显示时再由 create_window(state) 重新创建窗口
+    """
+
+    def __init__(self, create_window, max_live_hidden=MAX_LIVE_HIDDEN):
+        self.create_window = create_window
+        self.max_live_hidden = max_live_hidden
+        self.records = {}
+        # note_id -> 隐藏的窗口，最近隐藏的在末尾
+        self.hidden_windows = OrderedDict()
+
+    def __contains__(self, note_id):
+        return note_id in self.records or note_id in self.hidden_windows
+
+    def __len__(self):
+        return len(self.records) + len(self.hidden_windows)
+
+    def add_state(self, state):
+        """登记一个隐藏的便签状态，不创建窗口"""
+        record = self.records[state["id"]] = NoteRecord(state)
+        # 隐藏的便签仍然可以搜索，内容在空闲时解析
+        get_search_index().attach_text(record.note_id, record.plain_text)
+        return record
+
+    def note_hidden(self, window):
+        """窗口被隐藏；超出上限时释放最久未使用的隐藏窗口"""
+        self.hidden_windows[window.note_id] = window
+        self.hidden_windows.move_to_end(window.note_id)
+        while len(self.hidden_windows) > self.max_live_hidden:
+            _, oldest = self.hidden_windows.popitem(last=False)
+            self._release(oldest)
+
+    def _release(self, window):
+        # 保存的状态与记录共用同一份内容
+        state = window.note_state()
+        get_note_store().put_async(state)
+        window.release()
+        self.add_state(state)
+
+    def take(self, note_id):
+        """取出隐藏的便签窗口，必要时从记录重新创建；不存在时返回 None"""
+        window = self.hidden_windows.pop(note_id, None)
+        if window is not None:
+            return window
+        record = self.records.pop(note_id, None)
+        if record is None:
+            return None
+        return self.create_window(record.to_state())
+
+    def note_ids(self):
+        return list(self.hidden_windows) + list(self.records)
@@ -0,0 +1,252 @@
+# note_store.py
+# 命令行模式 (cli.py) 也直接使用这里的存储，模块级别只导入标准库
+import json
+import os
+import threading
+import time
+
+# 数据目录，可通过环境变量覆盖
+DATA_DIR_ENV = "FLASHNOTE_DATA_DIR"
+JOURNAL_NAME = "journal.jsonl"
+SNAPSHOT_NAME = "notes.json"
+# 日志条数超过该值时压缩为快照
+COMPACT_THRESHOLD = 200
+
+
+def default_data_dir():
+    """获取便签数据目录"""
+    return os.environ.get(DATA_DIR_ENV) or os.path.join(os.path.expanduser("~"), ".flashnote")
+
+
+def _atomic_write(path, data):
+    """先写临时文件再替换，保证快照文件不会写坏"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class NoteStore:
+    """
+    便签持久化存储：追加写日志 + 定期压缩为原子快照。
+    写盘在后台线程 (QThreadPool) 中进行，同一便签的多次保存会被合并。
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_data_dir()
+        os.makedirs(self.directory, exist_ok=True)
+        self.journal_path = os.path.join(self.directory, JOURNAL_NAME)
+        self.snapshot_path = os.path.join(self.directory, SNAPSHOT_NAME)
+
+        self.notes = {}  # note_id -> 最新状态
+        self.journal_entries = 0
+
+        # _lock 只保护内存中的状态，持有时间很短；_io_lock 保证日志与快照按顺序写入。
+        # 界面线程的 put_async 只需要 _lock，不会等待后台的写盘和 fsync
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._pending = {}  # 等待后台写入的记录
+        self._flush_scheduled = False
+        # 后台写盘的单线程池，首次异步保存时才创建，保证写入顺序
+        self._pool = None
+
+        self.load()
+
+    def load(self):
+        """读取快照并重放日志，返回所有便签状态"""
+        notes = {}
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, encoding="utf-8") as f:
+                    notes = json.load(f).get("notes", {})
+            except (OSError, ValueError) as e:
+                print(f"读取便签快照时出错: {e}")
+
+        entries = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 崩溃时最后一行可能写了一半，直接忽略
+                        continue
+                    self._apply_record(notes, record)
+                    entries += 1
+
+        with self._lock:
+            self.notes = notes
+            self.journal_entries = entries
+        return list(notes.values())
+
+    @staticmethod
+    def _apply_record(notes, record):
+        if record.get("op") == "put":
+            state = record["state"]
+            notes[state["id"]] = state
+        elif record.get("op") == "del":
+            notes.pop(record["id"], None)
+
+    def put(self, state):
+        """同步保存便签状态"""
+        self._discard_pending(state["id"])
+        self._write_records([{"op": "put", "state": state}])
+
+    def delete(self, note_id):
+        """同步删除便签"""
+        self._discard_pending(note_id)
+        self._write_records([{"op": "del", "id": note_id}])
+
+    def _discard_pending(self, note_id):
+        # 丢弃尚未写入的旧记录并等后台写完，避免旧状态覆盖同步写入的结果
+        with self._lock:
+            self._pending.pop(note_id, None)
+        if self._pool is not None:
+            self._pool.waitForDone()
+
+    def put_async(self, state):
+        """在后台线程保存便签状态"""
+        with self._lock:
+            self._pending[state["id"]] = state
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        if self._pool is None:
+            from PySide6.QtCore import QThreadPool
+            self._pool = QThreadPool()
+            self._pool.setMaxThreadCount(1)
+        self._pool.start(self._flush_pending)
+
+    def _flush_pending(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            self._flush_scheduled = False
+        if pending:
+            self._write_records([{"op": "put", "state": s} for s in pending.values()])
+
+    def _write_records(self, records):
+        # 复制调用方的状态再加上更新时间，不修改调用方的字典
+        now = time.time()
+        records = [{**record, "state": {**record["state"], "updated": now}} if record["op"] == "put" else record
+                   for record in records]
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        with self._io_lock:
+            with self._lock:
+                for record in records:
+                    self._apply_record(self.notes, record)
+                self.journal_entries += len(records)
+                snapshot = self._take_snapshot_locked() if self.journal_entries >= COMPACT_THRESHOLD else None
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            if snapshot is not None:
+                self._write_snapshot(snapshot)
+
+    def compact(self):
+        """把当前状态写成快照并清空日志"""
+        with self._io_lock:
+            with self._lock:
+                snapshot = self._take_snapshot_locked()
+            self._write_snapshot(snapshot)
+
+    def _take_snapshot_locked(self):
+        # 状态字典写入后不再修改，浅拷贝即可在锁外序列化
+        self.journal_entries = 0
+        return dict(self.notes)
+
+    def _write_snapshot(self, notes):
+        _atomic_write(self.snapshot_path, json.dumps({"version": 1, "notes": notes}, ensure_ascii=False))
+        # 快照落盘后再截断日志，中途崩溃只会重复重放；两步都在 _io_lock 中，期间不会有新的日志
+        open(self.journal_path, "w").close()
+
+    def wait(self):
+        """等待后台写入完成"""
+        if self._pool is not None:
+            self._pool.waitForDone()
+        # 等待期间可能又有新的记录进入
+        self._flush_pending()
+
+
+_store = None
+
+
+def get_note_store():
+    """获取全局便签存储"""
+    global _store
+    if _store is None:
+        _store = NoteStore()
+    return _store
+
+
+def state_text(state):
+    """便签状态中的纯文本；富文本便签从 HTML 中提取，不依赖 Qt"""
+    if "text" in state:
+        return state["text"]
+    html = state.get("html", "")
+    if not html:
+        return ""
+    from html.parser import HTMLParser
+
+    class TextExtractor(HTMLParser):
+        # QTextEdit.toHtml() 中每个段落对应一个块元素，块之间是格式化用的换行
+        BLOCKS = {"p", "li", "pre", "h1", "h2", "h3", "h4", "h5", "h6", "div", "blockquote"}
+
+        def __init__(self):
+            super().__init__()
+            self.parts = []
+            self.blocks = 0
+            self.depth = 0
+            self.skip = 0
+            self.empty_block = False
+
+        def handle_starttag(self, tag, attrs):
+            if tag in ("head", "style", "script", "title"):
+                self.skip += 1
+            elif tag in self.BLOCKS:
+                if self.blocks:
+                    self.parts.append("\n")
+                self.blocks += 1
+                self.depth += 1
+                # 空段落中的 <br /> 只是占位
+                self.empty_block = "-qt-paragraph-type:empty" in (dict(attrs).get("style") or "")
+            elif tag == "br" and self.depth and not self.empty_block:
+                self.parts.append("\n")
+
+        def handle_endtag(self, tag):
+            if tag in ("head", "style", "script", "title"):
+                self.skip = max(0, self.skip - 1)
+            elif tag in self.BLOCKS:
+                self.depth = max(0, self.depth - 1)
+
+        def handle_data(self, data):
+            if self.depth and not self.skip:
+                self.parts.append(data)
+
+    extractor = TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return "".join(extractor.parts)
+
+
+def append_text(state, text):
+    """在便签状态末尾另起一段追加纯文本，用于没有打开窗口的便签"""
+    if not state_text(state):
+        state.pop("html", None)
+        state["text"] = text
+    elif "text" in state:
+        state["text"] += "\n" + text
+    else:
+        from html import escape
+        paragraphs = "".join(
+            '<p style="margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px;">'
+            f"{escape(line)}</p>" if line else
+            '<p style="-qt-paragraph-type:empty; margin-top:0px; margin-bottom:0px;"><br /></p>'
+            for line in text.split("\n"))
+        html = state["html"]
+        end = html.rfind("</body>")
+        state["html"] = html[:end] + paragraphs + html[end:] if end >= 0 else html + paragraphs
+    return state
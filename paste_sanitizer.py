@@ -0,0 +1,154 @@
+# paste_sanitizer.py
+import base64
+import binascii
+import html as html_escape
+import re
+
+from image_store import IMAGE_SCHEME, get_image_store
+
+# 整段删除的元素（连同内容）
+_DROPPED_ELEMENTS = re.compile(
+    r"<(head|style|script|noscript|template|iframe|object|svg|math)\b.*?</\1\s*>", re.S | re.I)
+_DROPPED_TAGS = re.compile(r"<!--.*?-->|<!doctype[^>]*>|<(?:meta|link|base)\b[^>]*>", re.S | re.I)
+FRAGMENT_START = "<!--StartFragment-->"
+FRAGMENT_END = "<!--EndFragment-->"
+_BODY = re.compile(r"<body\b[^>]*>(.*?)(?:</body\s*>|$)", re.S | re.I)
+_TAG = re.compile(r"<([a-zA-Z][\w:-]*)(\s[^>]*)?>")
+_ATTRIBUTE = re.compile(r"""([^\s=/>]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]+))?""")
+# 属性值中内嵌的 base64 图片
+_DATA_URL = re.compile(r"(?<=[\"'=])data:image/([\w.+-]+);base64,([A-Za-z0-9+/=\s]*)", re.I)
+
+# 除 style 外保留的属性
+KEPT_ATTRIBUTES = {
+    "a": {"href"},
+    "img": {"src", "width", "height", "alt"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan"},
+    "ol": {"start", "type"},
+}
+# 行内样式只保留粗体、斜体、下划线等语义格式，颜色、字体、尺寸跟随便签设置
+KEPT_STYLES = {"font-weight", "font-style", "text-decoration", "text-decoration-line", "vertical-align"}
+
+
+def _fragment_span(html):
+    # 内嵌图片可能有数 MB，用字符串查找定位片段比正则快得多
+    start = html.find(FRAGMENT_START)
+    end = html.find(FRAGMENT_END, start)
+    if start >= 0 and end >= 0:
+        return start + len(FRAGMENT_START), end
+    match = _BODY.search(html)
+    return match.span(1) if match else (0, len(html))
+
+
+def extract_fragment(html):
+    """只取剪贴板 HTML 中被复制的片段，丢弃完整网页的外层文档"""
+    start, end = _fragment_span(html)
+    return html[start:end]
+
+
+def _store_images(html, store, sizes):
+    """
+    把片段中内嵌的 base64 图片转存到图片存储，换成引用，并在 sizes 中记录保存后的尺寸；无法保存的换成空地址。
+    只扫描一遍原文，不复制整个片段，之后的清理都在不含图片数据的小字符串上进行
+    """
+    start, end = _fragment_span(html)
+    parts = []
+    for match in _DATA_URL.finditer(html, start, end):
+        parts.append(html[start:match.start()])
+        start = match.end()
+        try:
+            data = base64.b64decode(match.group(2), validate=False)
+        except (binascii.Error, ValueError):
+            continue
+        stored = store.put_data(data, match.group(1))
+        if stored is not None:
+            name, width, height = stored
+            sizes[name] = (width, height)
+            parts.append(store.url(name))
+    parts.append(html[start:end])
+    return "".join(parts)
+
+
+def _clean_style(value):
+    declarations = []
+    for declaration in value.split(";"):
+        name, _, declared = declaration.partition(":")
+        name = name.strip().lower()
+        if name in KEPT_STYLES and declared.strip():
+            declarations.append(f"{name}:{declared.strip()}")
+    return ";".join(declarations)
+
+
+def _image_tag(attributes, sizes):
+    """图片存储中的图片补上显示尺寸，网络图片只保留替代文字"""
+    src = attributes.get("src", "")
+    if src.startswith("file:"):
+        return attributes
+    if not src.startswith(IMAGE_SCHEME + ":"):
+        return None
+    stored = sizes.get(src[len(IMAGE_SCHEME) + 1:])
+    if stored is None:
+        # 便签之间复制的图片引用
+        return attributes
+    width, height = stored
+    # 给出显示尺寸后，排版时无需加载图片，只在绘制时才读取
+    try:
+        shown_width = int(float(attributes["width"])) if "width" in attributes else None
+    except ValueError:
+        shown_width = None
+    if shown_width is None or shown_width <= 0:
+        shown_width = width
+    attributes["width"] = str(shown_width)
+    attributes["height"] = str(max(1, round(height * shown_width / width)))
+    return attributes
+
+
+def sanitize_html(html, store=None):
+    """
+    清理粘贴的 HTML：去掉外层文档、样式表、脚本和多余的属性与行内样式，
+    内嵌图片转存到按内容寻址的图片存储中，文档里只留下引用
+    """
+    store = store or get_image_store()
+    sizes = {}
+    html = _store_images(html, store, sizes)
+    html = _DROPPED_ELEMENTS.sub("", html)
+    html = _DROPPED_TAGS.sub("", html)
+
+    def clean_tag(match):
+        tag, raw_attributes = match.group(1).lower(), match.group(2)
+        closing = ""
+        if raw_attributes and raw_attributes.endswith("/"):
+            raw_attributes, closing = raw_attributes[:-1], "/"
+        if not raw_attributes or raw_attributes.isspace():
+            return f"<{tag}{closing}>"
+        kept = KEPT_ATTRIBUTES.get(tag, ())
+        attributes = {}
+        for attribute in _ATTRIBUTE.finditer(raw_attributes):
+            name = attribute.group(1).lower()
+            value = attribute.group(2) or ""
+            if value[:1] in ("'", '"'):
+                value = value[1:-1]
+            if "&" in value:
+                value = html_escape.unescape(value)
+            if name == "style":
+                value = _clean_style(value)
+                if value:
+                    attributes[name] = value
+            elif name in kept:
+                attributes[name] = value
+        if tag == "img":
+            alt = attributes.get("alt", "")
+            attributes = _image_tag(attributes, sizes)
+            if attributes is None:
+                return html_escape.escape(alt)
+        rendered = "".join(f' {name}="{html_escape.escape(value)}"' for name, value in attributes.items())
+        return f"<{tag}{rendered}{closing}>"
+
+    return _TAG.sub(clean_tag, html)
+
+
+def image_html(image, store=None):
+    """剪贴板中只有图片（如截图）时，保存图片并返回引用它的 HTML"""
+    store = store or get_image_store()
+    name, width, height = store.put_image(image)
+    return f'<img src="{store.url(name)}" width="{width}" height="{height}">'
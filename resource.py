@@ -12,6 +12,28 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 
-# 使用 resource_path 函数获取图标路径
-ICON_PATH_DEFAULT = resource_path("resources/setTop_default.svg")
-ICON_PATH_CHECKED = resource_path("resources/setTop_checked.svg")
\ No newline at end of file
+try:
+    # 由 resources/resources.qrc 编译而来，图标直接打包在代码中，无需访问文件系统
+    import resources_rc  # noqa: F401
+    ICON_PATH_DEFAULT = ":/icons/setTop_default.svg"
+    ICON_PATH_CHECKED = ":/icons/setTop_checked.svg"
+except ImportError:
+    # 使用 resource_path 函数获取图标路径
+    ICON_PATH_DEFAULT = resource_path("resources/setTop_default.svg")
+    ICON_PATH_CHECKED = resource_path("resources/setTop_checked.svg")
+
+
+# 全局共享的图标，所有便签共用
+_icons = {}
+
+
+def get_icon(path):
+    """
+    获取共享图标，每个图标只加载一次。
+    QIcon 按需渲染，并按尺寸和设备像素比缓存渲染结果
+    """
+    icon = _icons.get(path)
+    if icon is None:
+        from PySide6.QtGui import QIcon
+        icon = _icons[path] = QIcon(path)
+    return icon
@@ -0,0 +1,125 @@
+# Resource object code (Python 3)
+# Created by: object code
+# Created by: The Resource Compiler for Qt version 6.8.2
+# WARNING! All changes made in this file will be lost!
+
+from PySide6 import QtCore
+
+qt_resource_data = b"\
+\x00\x00\x02^\
+<\
+?xml version=\x221.\
+0\x22 standalone=\x22n\
+o\x22?><!DOCTYPE sv\
+g PUBLIC \x22-//W3C\
+//DTD SVG 1.1//E\
+N\x22 \x22http://www.w\
+3.org/Graphics/S\
+VG/1.1/DTD/svg11\
+.dtd\x22><svg t=\x2217\
+56375438986\x22 cla\
+ss=\x22icon\x22 viewBo\
+x=\x220 0 1024 1024\
+\x22 version=\x221.1\x22 \
+xmlns=\x22http://ww\
+w.w3.org/2000/sv\
+g\x22 p-id=\x221544\x22 x\
+mlns:xlink=\x22http\
+://www.w3.org/19\
+99/xlink\x22 width=\
+\x22200\x22 height=\x2220\
+0\x22><path d=\x22M381\
+.298 418.828h-15\
+7.703l-37.575 38\
+.272 155.61 158.\
+377-278.212 345.\
+128 356.040-265.\
+838 154.71 157.4\
+1 38.813-39.51 2\
+.407-157.972 238\
+.838-313.29 71.6\
+85 73.013 34.695\
+-35.28-310.185-3\
+15.743-34.672 35\
+.257 77.287 79.4\
+02-311.737 240.7\
+73z\x22 p-id=\x221545\x22\
+ fill=\x22#a0a0a0\x22>\
+</path></svg>\
+\x00\x00\x02^\
+<\
+?xml version=\x221.\
+0\x22 standalone=\x22n\
+o\x22?><!DOCTYPE sv\
+g PUBLIC \x22-//W3C\
+//DTD SVG 1.1//E\
+N\x22 \x22http://www.w\
+3.org/Graphics/S\
+VG/1.1/DTD/svg11\
+.dtd\x22><svg t=\x2217\
+56375438986\x22 cla\
+ss=\x22icon\x22 viewBo\
+x=\x220 0 1024 1024\
+\x22 version=\x221.1\x22 \
+xmlns=\x22http://ww\
+w.w3.org/2000/sv\
+g\x22 p-id=\x221544\x22 x\
+mlns:xlink=\x22http\
+://www.w3.org/19\
+99/xlink\x22 width=\
+\x22200\x22 height=\x2220\
+0\x22><path d=\x22M381\
+.298 418.828h-15\
+7.703l-37.575 38\
+.272 155.61 158.\
+377-278.212 345.\
+128 356.040-265.\
+838 154.71 157.4\
+1 38.813-39.51 2\
+.407-157.972 238\
+.838-313.29 71.6\
+85 73.013 34.695\
+-35.28-310.185-3\
+15.743-34.672 35\
+.257 77.287 79.4\
+02-311.737 240.7\
+73z\x22 p-id=\x221545\x22\
+ fill=\x22#ffffff\x22>\
+</path></svg>\
+"
+
+qt_resource_name = b"\
+\x00\x05\
+\x00o\xa6S\
+\x00i\
+\x00c\x00o\x00n\x00s\
+\x00\x12\
+\x0bv\xe0'\
+\x00s\
+\x00e\x00t\x00T\x00o\x00p\x00_\x00c\x00h\x00e\x00c\x00k\x00e\x00d\x00.\x00s\x00v\
+\x00g\
+\x00\x12\
+\x02\xf0Ng\
+\x00s\
+\x00e\x00t\x00T\x00o\x00p\x00_\x00d\x00e\x00f\x00a\x00u\x00l\x00t\x00.\x00s\x00v\
+\x00g\
+"
+
+qt_resource_struct = b"\
+\x00\x00\x00\x00\x00\x02\x00\x00\x00\x01\x00\x00\x00\x01\
+\x00\x00\x00\x00\x00\x00\x00\x00\
+\x00\x00\x00\x00\x00\x02\x00\x00\x00\x02\x00\x00\x00\x02\
+\x00\x00\x00\x00\x00\x00\x00\x00\
+\x00\x00\x00:\x00\x00\x00\x00\x00\x01\x00\x00\x02b\
+\x00\x00\x01\x98\xfa~L\xf0\
+\x00\x00\x00\x10\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\
+\x00\x00\x01\x98\xfa~L\xf0\
+"
+
+def qInitResources():
+    QtCore.qRegisterResourceData(0x03, qt_resource_struct, qt_resource_name, qt_resource_data)
+
+def qCleanupResources():
+    QtCore.qUnregisterResourceData(0x03, qt_resource_struct, qt_resource_name, qt_resource_data)
+
+qInitResources()
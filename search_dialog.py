@@ -0,0 +1,94 @@
+# search_dialog.py
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QDialog, QVBoxLayout, QLineEdit, QListWidget, QListWidgetItem
+
+from search_index import get_search_index
+
+# 最多显示的搜索结果数量
+MAX_RESULTS = 100
+# 结果列表中便签标题的最大长度
+TITLE_LENGTH = 20
+
+
+class SearchDialog(QDialog):
+    """
+    搜索所有便签的弹窗。输入即搜索，回车或双击结果跳转到对应便签并高亮命中，
+    再次回车跳到下一处命中
+    """
+
+    _instance = None
+
+    @classmethod
+    def instance(cls, find_window, show_window):
+        """全局只有一个搜索弹窗"""
+        if cls._instance is None:
+            cls._instance = cls(find_window, show_window)
+        return cls._instance
+
+    def __init__(self, find_window, show_window):
+        super().__init__()
+        # find_window(note_id) 返回打开的便签窗口，没有窗口时返回 None；
+        # show_window(note_id) 显示便签（必要时创建窗口）并返回窗口
+        self.find_window = find_window
+        self.show_window = show_window
+        self.highlighted_note = None
+        self.setWindowTitle("搜索便签")
+        self.setWindowFlags(Qt.WindowType.Tool | Qt.WindowType.WindowStaysOnTopHint)
+        self.resize(360, 300)
+
+        layout = QVBoxLayout(self)
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText("搜索所有便签，多个关键词用空格分隔")
+        self.query_edit.textChanged.connect(self.refresh)
+        self.query_edit.returnPressed.connect(self.open_current)
+        layout.addWidget(self.query_edit)
+
+        self.result_list = QListWidget()
+        self.result_list.itemActivated.connect(self.open_item)
+        layout.addWidget(self.result_list)
+
+    def popup(self):
+        self.show()
+        self.raise_()
+        self.activateWindow()
+        self.query_edit.setFocus()
+        self.query_edit.selectAll()
+
+    def refresh(self):
+        """重新搜索并显示结果"""
+        index = get_search_index()
+        query = self.query_edit.text()
+        self.result_list.clear()
+        for note_id in index.search(query, limit=MAX_RESULTS):
+            item = QListWidgetItem(f"{index.title(note_id, TITLE_LENGTH)}: {index.snippet(note_id, query)}")
+            item.setData(Qt.ItemDataRole.UserRole, note_id)
+            self.result_list.addItem(item)
+        if self.result_list.count():
+            self.result_list.setCurrentRow(0)
+
+    def open_current(self):
+        item = self.result_list.currentItem()
+        if item is not None:
+            self.open_item(item)
+
+    def open_item(self, item):
+        """跳转到结果对应的便签，高亮全部命中并选中下一处"""
+        note_id = item.data(Qt.ItemDataRole.UserRole)
+        if self.highlighted_note != note_id:
+            self.clear_highlights()
+        window = self.show_window(note_id)
+        if window is None:
+            return
+        self.highlighted_note = note_id
+        window.text_edit.highlight_matches(self.query_edit.text().split())
+
+    def clear_highlights(self):
+        window = self.find_window(self.highlighted_note) if self.highlighted_note else None
+        if window is not None:
+            window.text_edit.clear_highlights()
+        self.highlighted_note = None
+
+    def hideEvent(self, event):
+        # 关闭搜索弹窗时去掉高亮
+        self.clear_highlights()
+        super().hideEvent(event)
@@ -0,0 +1,407 @@
+# search_index.py
+import re
+import time
+from collections import deque
+from operator import add
+
+from PySide6.QtCore import QTimer
+from PySide6.QtGui import QTextCursor
+
+# 文档中的段落分隔符 (QTextCursor.selectedText 返回的格式)
+PARAGRAPH_SEPARATOR = "\u2029"
+# 空白之间的连续字符（含中日韩文字和标点）组成一个词段，索引项不会跨越词段
+_RUN_PATTERN = re.compile(r"\S+")
+# 超出基本平面的字符，在 Qt 文档中占两个位置
+_ASTRAL_PATTERN = re.compile("[\U00010000-\U0010FFFF]")
+# 可能已被删除的索引项超过该数量时，停止输入 RECHECK_DELAY_MS 毫秒后在空闲时逐个确认
+_RECHECK_LIMIT = 128
+RECHECK_DELAY_MS = 1000
+# 修改便签时文本副本分块保存，每块的字数
+TEXT_CHUNK_SIZE = 4096
+# 三字组合位图的大小范围(2 的幂次)
+TRIGRAM_MIN_BITS = 12
+TRIGRAM_MAX_BITS = 23
+# 空闲时建立索引，每次最多占用事件循环的时间(秒)
+INDEX_TIME_BUDGET = 0.010
+
+
+def _split_astral(match):
+    code = ord(match.group()) - 0x10000
+    return chr(0xD800 + (code >> 10)) + chr(0xDC00 + (code & 0x3FF))
+
+
+def fold(text):
+    """
+    不区分大小写比较用的形式，每个位置与 Qt 文档中的位置一一对应：
+    小写后长度会变化的字符(如 "İ")保持原样，超出基本平面的字符拆成 UTF-16 代理对
+    """
+    folded = text.lower()
+    if len(folded) != len(text):
+        folded = "".join(lower if len(lower := char.lower()) == 1 else char for char in text)
+    if not folded.isascii():
+        folded = _ASTRAL_PATTERN.sub(_split_astral, folded)
+    return folded
+
+
+def _display(text):
+    """把 fold 拆开的代理对合并回来，用于显示"""
+    return text.encode("utf-16-le", "surrogatepass").decode("utf-16-le", "replace")
+
+
+def tokenize(text):
+    """
+    切分索引项：每个词段产生单字和相邻二字组合。
+    中文没有空格分词，二元切分无需词典即可支持任意子串查询
+    """
+    tokens = set()
+    for run in _RUN_PATTERN.findall(text):
+        tokens.update(run)
+        tokens.update(map(add, run, run[1:]))
+    return tokens
+
+
+def query_tokens(term):
+    """查询词对应的索引项：单字直接查，多字取全部二字组合"""
+    tokens = set()
+    for run in _RUN_PATTERN.findall(term):
+        if len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(map(add, run, run[1:]))
+    return tokens
+
+
+def trigram_hashes(text):
+    """三字组合的哈希值，用于在校验前快速排除候选便签"""
+    hashes = set()
+    for run in _RUN_PATTERN.findall(text):
+        hashes.update(map(hash, map(add, map(add, run, run[1:]), run[2:])))
+    return hashes
+
+
+class _TrigramFilter:
+    """
+    便签中出现过的三字组合的位图（单哈希布隆过滤器）。
+    只增不减，删除文字后最多多出误判，命中仍会做完整校验
+    """
+
+    __slots__ = ("bits", "mask")
+
+    def __init__(self, text_length):
+        # 每个字约 8 位，误判率约 10%
+        size = 1 << max(TRIGRAM_MIN_BITS, min(TRIGRAM_MAX_BITS, (text_length * 8).bit_length()))
+        self.bits = bytearray(size >> 3)
+        self.mask = size - 1
+
+    def add(self, hashes):
+        bits, mask = self.bits, self.mask
+        for value in hashes:
+            value &= mask
+            bits[value >> 3] |= 1 << (value & 7)
+
+    def may_contain(self, hashes):
+        bits, mask = self.bits, self.mask
+        for value in hashes:
+            value &= mask
+            if not bits[value >> 3] >> (value & 7) & 1:
+                return False
+        return True
+
+
+class _NoteText:
+    """
+    便签文本的 fold 副本。查询校验时使用完整的字符串；逐字修改时转为分块保存，
+    每次修改只复制所在的块，不会复制整篇文本
+    """
+
+    __slots__ = ("_text", "_chunks", "length")
+
+    def __init__(self, text):
+        self._text = text
+        self._chunks = None
+        self.length = len(text)
+
+    def full(self):
+        if self._text is None:
+            self._text = "".join(self._chunks)
+            self._chunks = None
+        return self._text
+
+    def _locate(self, position):
+        """position 所在的块序号与块内偏移"""
+        last = len(self._chunks) - 1
+        for number, chunk in enumerate(self._chunks):
+            if position < len(chunk) or number == last:
+                return number, position
+            position -= len(chunk)
+
+    def slice(self, start, end):
+        if self._chunks is None:
+            return self._text[start:end]
+        number, offset = self._locate(start)
+        parts, remaining = [], end - start
+        while remaining > 0 and number < len(self._chunks):
+            part = self._chunks[number][offset:offset + remaining]
+            parts.append(part)
+            remaining -= len(part)
+            number, offset = number + 1, 0
+        return "".join(parts)
+
+    def replace(self, position, removed, inserted):
+        if self._chunks is None:
+            text = self._text
+            self._chunks = [text[i:i + TEXT_CHUNK_SIZE] for i in range(0, len(text), TEXT_CHUNK_SIZE)] or [""]
+            self._text = None
+        chunks = self._chunks
+        first, offset = self._locate(position)
+        last, end = first, offset + removed
+        while end > len(chunks[last]) and last + 1 < len(chunks):
+            end -= len(chunks[last])
+            last += 1
+        text = chunks[first][:offset] + inserted + chunks[last][end:]
+        # 块变得过长时(例如粘贴)重新切分，空块直接移除
+        if len(text) > 2 * TEXT_CHUNK_SIZE:
+            pieces = [text[i:i + TEXT_CHUNK_SIZE] for i in range(0, len(text), TEXT_CHUNK_SIZE)]
+        else:
+            pieces = [text] if text else []
+        chunks[first:last + 1] = pieces
+        if not chunks:
+            chunks.append("")
+        self.length += len(inserted) - removed
+
+
+class _IndexedNote:
+    """索引中的一篇便签：保存 fold 后的文本副本，用于增量更新与结果校验"""
+
+    __slots__ = ("note_id", "document", "load_text", "text", "trigrams", "stale", "slot")
+
+    def __init__(self, note_id, document, load_text=None):
+        self.note_id = note_id
+        # 隐藏的便签没有文档，建立索引时由 load_text() 提供纯文本
+        self.document = document
+        self.load_text = load_text
+        # None 表示尚未建立索引
+        self.text = None
+        self.trigrams = None
+        # 修改中消失的索引项，可能还出现在便签的其他位置，查询或空闲时再确认
+        self.stale = set()
+        self.slot = None
+
+
+class SearchIndex:
+    """
+    所有打开便签的内存倒排索引（索引项 -> 便签 id 集合）。
+    新便签在空闲时分批建立索引；之后通过 QTextDocument.contentsChange(position, removed, added)
+    增量更新，只重新切分修改位置附近的文字，不会重新扫描整篇文档
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.notes = {}
+        self._pending = deque()
+        self._index_timer = QTimer()
+        self._index_timer.setSingleShot(True)
+        self._index_timer.setInterval(0)
+        self._index_timer.timeout.connect(self._index_pending)
+        # 可能已被删除的索引项较多、需要在空闲时确认的便签
+        self._stale_notes = set()
+        self._recheck_timer = QTimer()
+        self._recheck_timer.setSingleShot(True)
+        self._recheck_timer.timeout.connect(self._recheck_stale)
+
+    def attach(self, note_id, document):
+        """开始索引便签的文档；切换编辑引擎后再次调用即可替换为新文档"""
+        self.detach(note_id)
+        note = self.notes[note_id] = _IndexedNote(note_id, document)
+        note.slot = lambda position, removed, added: self._on_contents_change(note, position, removed, added)
+        document.contentsChange.connect(note.slot)
+        self._pending.append(note)
+        self._index_timer.start()
+
+    def attach_text(self, note_id, load_text):
+        """索引没有打开窗口的便签，内容不会再变化"""
+        self.detach(note_id)
+        note = self.notes[note_id] = _IndexedNote(note_id, None, load_text)
+        self._pending.append(note)
+        self._index_timer.start()
+
+    def detach(self, note_id):
+        """停止索引便签，并移除它的全部索引项"""
+        note = self.notes.pop(note_id, None)
+        if note is None:
+            return
+        if note.document is not None:
+            note.document.contentsChange.disconnect(note.slot)
+        self._stale_notes.discard(note)
+        if note.text is not None:
+            self._discard(note, tokenize(note.text.full()) | note.stale)
+
+    def flush(self):
+        """立即为所有等待中的便签建立索引"""
+        while self._pending:
+            self._index_note(self._pending.popleft())
+
+    def _index_pending(self):
+        deadline = time.perf_counter() + INDEX_TIME_BUDGET
+        while self._pending and time.perf_counter() < deadline:
+            self._index_note(self._pending.popleft())
+        if self._pending:
+            self._index_timer.start()
+
+    def _index_note(self, note):
+        if self.notes.get(note.note_id) is not note:
+            # 已经移除或被新文档替换
+            return
+        if note.document is None:
+            text = fold(note.load_text().replace("\n", PARAGRAPH_SEPARATOR))
+        else:
+            cursor = QTextCursor(note.document)
+            cursor.select(QTextCursor.SelectionType.Document)
+            text = fold(cursor.selectedText())
+        note.text = _NoteText(text)
+        self._add_postings(note, tokenize(text))
+        note.trigrams = _TrigramFilter(len(text))
+        note.trigrams.add(trigram_hashes(text))
+
+    def _on_contents_change(self, note, position, removed, added):
+        text = note.text
+        if text is None:
+            # 建立索引时会读取完整内容
+            return
+        # 整篇替换时 Qt 报告的数量会包含文档末尾隐含的段落符，需要截断
+        removed = min(removed, text.length - position)
+        end = min(position + added, note.document.characterCount() - 1)
+        cursor = QTextCursor(note.document)
+        cursor.setPosition(position)
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        inserted = fold(cursor.selectedText())
+        if removed == len(inserted) and text.slice(position, position + removed) == inserted:
+            # 只修改了格式(清除格式等)，Qt 同样报告为删除并插入
+            return
+
+        # 索引项最长两个字、三字组合最长三个字，只有跨越修改边界的会变化，前后各多取两个字即可
+        start = max(0, position - 2)
+        old_tokens = tokenize(text.slice(start, position + removed + 2))
+        text.replace(position, removed, inserted)
+        new_span = text.slice(start, position + len(inserted) + 2)
+        new_tokens = tokenize(new_span)
+
+        self._add_postings(note, new_tokens - old_tokens)
+        note.trigrams.add(trigram_hashes(new_span))
+        # 消失的索引项可能还出现在便签的其他位置，扫描全文要等到查询或空闲时
+        note.stale -= new_tokens
+        note.stale |= old_tokens - new_tokens
+        if len(note.stale) > _RECHECK_LIMIT:
+            self._stale_notes.add(note)
+            self._recheck_timer.start(RECHECK_DELAY_MS)
+
+    def _confirm(self, note, tokens):
+        """确认便签仍含有这些索引项，已经不再含有的从索引中移除"""
+        stale = tokens & note.stale
+        if not stale:
+            return True
+        note.stale -= stale
+        text = note.text.full()
+        missing = {token for token in stale if token not in text}
+        self._discard(note, missing)
+        return not missing
+
+    def _recheck_stale(self):
+        deadline = time.perf_counter() + INDEX_TIME_BUDGET
+        while self._stale_notes and time.perf_counter() < deadline:
+            note = next(iter(self._stale_notes))
+            text = note.text.full()
+            while note.stale and time.perf_counter() < deadline:
+                token = note.stale.pop()
+                if token not in text:
+                    self._discard(note, (token,))
+            if not note.stale:
+                self._stale_notes.discard(note)
+        if self._stale_notes:
+            self._recheck_timer.start(0)
+
+    def _add_postings(self, note, tokens):
+        postings = self.postings
+        for token in tokens:
+            note_ids = postings.get(token)
+            if note_ids is None:
+                postings[token] = {note.note_id}
+            else:
+                note_ids.add(note.note_id)
+
+    def _discard(self, note, tokens):
+        for token in tokens:
+            note_ids = self.postings.get(token)
+            if note_ids is not None:
+                note_ids.discard(note.note_id)
+                if not note_ids:
+                    del self.postings[token]
+
+    def search(self, query, limit=None):
+        """
+        查询包含全部关键词（空格分隔，不区分大小写）的便签，
+        按便签打开顺序返回便签 id 列表
+        """
+        terms = fold(query).split()
+        if not terms:
+            return []
+        self.flush()
+        tokens = set().union(*map(query_tokens, terms))
+        posting_lists = []
+        for token in tokens:
+            note_ids = self.postings.get(token)
+            if not note_ids:
+                return []
+            posting_lists.append(note_ids)
+        posting_lists.sort(key=len)
+        candidates = set.intersection(*posting_lists)
+        # 二元索引只能保证包含所有字对，三个字以上的关键词还需确认连续出现
+        unverified = [term for term in terms if len(term) > 2]
+        trigrams = trigram_hashes(" ".join(unverified))
+
+        results = []
+        for note_id, note in self.notes.items():
+            if note_id not in candidates:
+                continue
+            if note.stale and not self._confirm(note, tokens):
+                continue
+            if unverified and not (note.trigrams.may_contain(trigrams)
+                                   and all(term in note.text.full() for term in unverified)):
+                continue
+            results.append(note_id)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def title(self, note_id, length=20):
+        """便签的第一行，用于显示搜索结果"""
+        note = self.notes[note_id]
+        if note.document is None:
+            return _display(note.text.slice(0, length).split(PARAGRAPH_SEPARATOR, 1)[0])
+        return note.document.firstBlock().text()[:length]
+
+    def snippet(self, note_id, query, width=40):
+        """返回第一个关键词首次出现位置附近的一段文本，用于显示搜索结果"""
+        note = self.notes[note_id]
+        terms = fold(query).split()
+        position = max(0, note.text.full().find(terms[0])) if terms else 0
+        start = max(0, position - width // 4)
+        if note.document is None:
+            # 隐藏的便签只保存了小写化的文本
+            return _display(note.text.slice(start, start + width)).replace(PARAGRAPH_SEPARATOR, " ")
+        cursor = QTextCursor(note.document)
+        cursor.setPosition(start)
+        cursor.setPosition(min(start + width, note.document.characterCount() - 1),
+                           QTextCursor.MoveMode.KeepAnchor)
+        return cursor.selectedText().replace(PARAGRAPH_SEPARATOR, " ")
+
+
+_search_index = None
+
+
+def get_search_index():
+    """获取全局唯一的搜索索引"""
+    global _search_index
+    if _search_index is None:
+        _search_index = SearchIndex()
+    return _search_index
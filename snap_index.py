@@ -0,0 +1,60 @@
+# snap_index.py
+
+# 距离其他便签边缘多少像素以内时吸附对齐
+SNAP_DISTANCE = 12
+# 网格单元大小(像素)，每个便签登记到它覆盖的所有单元
+CELL_SIZE = 256
+
+
+class SnapIndex:
+    """
+    拖动便签时用于吸附对齐的网格空间索引。
+    拖动开始时登记一次其他便签的位置，每次移动只检查附近单元中的便签，
+    不需要遍历所有窗口
+    """
+
+    def __init__(self, rects, distance=SNAP_DISTANCE, cell_size=CELL_SIZE):
+        self.distance = distance
+        self.cell_size = cell_size
+        # rects 为 (x, y, 宽, 高)
+        self.rects = list(rects)
+        self.cells = {}
+        for number, rect in enumerate(self.rects):
+            for cell in self._cells(rect, distance):
+                self.cells.setdefault(cell, []).append(number)
+
+    def _cells(self, rect, margin):
+        x, y, width, height = rect
+        size = self.cell_size
+        for cx in range((x - margin) // size, (x + width + margin) // size + 1):
+            for cy in range((y - margin) // size, (y + height + margin) // size + 1):
+                yield cx, cy
+
+    def nearby(self, rect):
+        """返回与 rect 距离在吸附范围内的便签"""
+        numbers = set()
+        for cell in self._cells(rect, self.distance):
+            numbers.update(self.cells.get(cell, ()))
+        return [self.rects[number] for number in numbers]
+
+    def snap(self, x, y, width, height):
+        """返回吸附后的左上角位置；附近没有可对齐的边时原样返回"""
+        distance = self.distance
+        best_dx = best_dy = distance + 1
+        for ox, oy, ow, oh in self.nearby((x, y, width, height)):
+            # 垂直方向有重叠（或接近）时才对齐左右边，反之亦然
+            if y - distance <= oy + oh and oy <= y + height + distance:
+                for edge in (ox, ox + ow):
+                    for dx in (edge - x, edge - (x + width)):
+                        if abs(dx) < abs(best_dx):
+                            best_dx = dx
+            if x - distance <= ox + ow and ox <= x + width + distance:
+                for edge in (oy, oy + oh):
+                    for dy in (edge - y, edge - (y + height)):
+                        if abs(dy) < abs(best_dy):
+                            best_dy = dy
+        if abs(best_dx) <= distance:
+            x += best_dx
+        if abs(best_dy) <= distance:
+            y += best_dy
+        return x, y
@@ -1,47 +1,86 @@
 # sticky_note.py
-from PySide6.QtGui import QFont, Qt
+import os
+
+from PySide6.QtCore import QTimer
+from PySide6.QtGui import Qt, QColor
 from PySide6.QtWidgets import QMainWindow, QVBoxLayout, QWidget, QSizeGrip, QApplication
 
 from event_handlers import WindowEventHandler, TextEditEventHandler
-from text_editor import CustomTextEdit
-from ui_components import create_bottom_bar, toggle_pin
+from instrumentation import get_profiler, set_enabled as set_instrumentation_enabled
+from layout_manager import SessionRestorer, available_geometries, clamp_geometry, get_layout_store
+from note_registry import NoteRegistry
+from note_store import get_note_store, append_text
+from search_index import get_search_index
+from theme_dispatcher import ThemeDispatcher
+from style_cache import cached_style, apply_style_sheet, deferred_styles
+from text_editor import CustomTextEdit, PlainTextEdit, LARGE_NOTE_THRESHOLD
+from ui_components import create_bottom_bar, set_pinned
+from version_history import get_version_history
 
 
 
 # 定义全局边框颜色变量
 BORDER_COLOR = "#d4cbb8"
+# 内容停止变化多久后自动保存(毫秒)
+SAVE_DELAY_MS = 800
+# 内容大小变化后多久检查是否需要切换编辑引擎(毫秒)
+ENGINE_CHECK_DELAY_MS = 500
 
 class StickyNote(QMainWindow):
-    def __init__(self):
+    def __init__(self, state=None):
         super().__init__()
-        self.old_pos = None
+        # 构造期间的样式表合并到最后统一应用，每个控件只 polish 一次
+        with deferred_styles():
+            self._build(state)
+
+        # 自动保存：内容或设置变化后延迟保存，连续输入只会保存一次
+        self._save_timer = QTimer(self)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(SAVE_DELAY_MS)
+        self._save_timer.timeout.connect(self.save)
+
+        # 根据内容大小自动切换富文本/纯文本编辑引擎
+        self._engine_timer = QTimer(self)
+        self._engine_timer.setSingleShot(True)
+        self._engine_timer.setInterval(ENGINE_CHECK_DELAY_MS)
+        self._engine_timer.timeout.connect(self.update_engine)
+        self._connect_text_edit()
+
+    def _build(self, state):
         self.is_pinned = False
+        # 被用户隐藏的便签，重新显示前不会出现在屏幕上；从隐藏记录重建的窗口保持隐藏
+        self.is_hidden = bool(state and state.get("hidden"))
+        # 最近一次保存(或载入)的内容 (内容, "html"/"text")，破坏性编辑前直接用它记录历史版本
+        self.saved_content = None
+        # 与 uuid.uuid4().hex 相同格式的随机 id，启动时无需导入 uuid 模块
+        self.note_id = state["id"] if state else os.urandom(16).hex()
 
         self.setWindowFlags(Qt.WindowType.FramelessWindowHint | Qt.WindowType.Tool)
         # self.setWindowTitle("桌面便签")
 
         # 调整窗口的整体样式，使用更柔和的颜色
-        self.setStyleSheet(f"""
+        apply_style_sheet(self, cached_style("window", lambda: f"""
             QMainWindow {{
                 border: 1px solid {BORDER_COLOR};   /* 边框颜色 */
             }}
-        """)
+        """))
         # 初始尺寸
         self.resize(500, 400)
         self.base_size = self.size()
 
-        # 初始字体大小
-        self.current_font_size = 12
-
         # 创建中央 Widget 和布局
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
         main_layout = QVBoxLayout(central_widget)
         main_layout.setContentsMargins(1, 1, 1, 1)
         main_layout.setSpacing(0)
+        self.main_layout = main_layout
 
-        # 创建文本编辑区域
-        self.text_edit = CustomTextEdit()
+        # 创建文本编辑区域，超大的纯文本便签直接使用纯文本引擎
+        if state and state.get("engine") == "plain":
+            self.text_edit = PlainTextEdit()
+        else:
+            self.text_edit = CustomTextEdit()
         main_layout.addWidget(self.text_edit)
 
         # 底部区域，用作拖动句柄和按钮区域
@@ -56,17 +95,192 @@ class StickyNote(QMainWindow):
         # 初始化事件处理器
         self.window_event_handler = WindowEventHandler(self)
         self.text_event_handler = TextEditEventHandler(self)
-        QApplication.instance().installEventFilter(self)
-
-        # 首次设置字体
-        font = QFont("Source Han Sans SC", max(8, self.current_font_size))
-        self.text_edit.setFont(font)
-
-    # sticky_note.py
+        # 系统主题变化由全局分发器统一通知
+        ThemeDispatcher.instance().register(self.text_edit)
+
+        if state:
+            self.apply_state(state)
+
+    def _connect_text_edit(self):
+        document = self.text_edit.document()
+        document.contentsChanged.connect(self.schedule_save)
+        document.contentsChanged.connect(self._check_engine_soon)
+        self.text_edit.settings_listener = self.schedule_save
+        self.text_edit.checklist_listener = self._on_checklist_changed
+        self.text_edit.snapshot_listener = self.record_saved_version
+        self.text_edit.undo_history.set_note(self.note_id, lambda: self.saved_content)
+        get_search_index().attach(self.note_id, document)
+        profiler = get_profiler()
+        if profiler is not None:
+            profiler.watch(self)
+
+    def _check_engine_soon(self):
+        """内容变化时只比较字符数，真正的检查延迟进行"""
+        count = self.text_edit.document().characterCount()
+        if self.text_edit.is_plain_engine:
+            needs_check = count < LARGE_NOTE_THRESHOLD // 2
+        else:
+            needs_check = count > LARGE_NOTE_THRESHOLD
+        if needs_check and not self._engine_timer.isActive():
+            self._engine_timer.start()
+
+    def update_engine(self):
+        """
+        超过 LARGE_NOTE_THRESHOLD 且没有富文本格式的便签切换到纯文本引擎，
+        内容减少到一半以下时切换回富文本引擎
+        """
+        text_edit = self.text_edit
+        if text_edit.chunked_edit is not None:
+            # 等分批粘贴/清除格式完成后再切换
+            self._engine_timer.start()
+            return
+        count = text_edit.document().characterCount()
+        if text_edit.is_plain_engine:
+            if count < LARGE_NOTE_THRESHOLD // 2:
+                self.set_plain_engine(False)
+        elif count > LARGE_NOTE_THRESHOLD and not text_edit.has_rich_formatting():
+            self.set_plain_engine(True)
+
+    def set_plain_engine(self, plain):
+        """切换编辑引擎，保留内容、设置、光标与滚动位置"""
+        old = self.text_edit
+        if old.is_plain_engine == plain:
+            return
+        with deferred_styles():
+            new = PlainTextEdit() if plain else CustomTextEdit()
+            new.take_over(old)
+        top_position = old.top_visible_position()
+        had_focus = old.hasFocus()
+
+        ThemeDispatcher.instance().unregister(old)
+        ThemeDispatcher.instance().register(new)
+        self.main_layout.replaceWidget(old, new)
+        old.settings_listener = None
+        old.deleteLater()
+
+        self.text_edit = new
+        self.text_event_handler.attach(new)
+        self._connect_text_edit()
+        if had_focus:
+            new.setFocus()
+        # 等新编辑器完成排版后再恢复滚动位置
+        QTimer.singleShot(0, new, lambda: new.scroll_to_position(top_position))
+        self.schedule_save()
+
+    def note_state(self, archived=False):
+        """导出便签状态，用于持久化"""
+        text_edit = self.text_edit
+        geometry = self.geometry()
+        if text_edit.is_plain_engine:
+            content = {"engine": "plain", "text": text_edit.toPlainText()}
+        else:
+            content = {"html": text_edit.toHtml()}
+        return {
+            "id": self.note_id,
+            **content,
+            "geometry": [geometry.x(), geometry.y(), geometry.width(), geometry.height()],
+            "is_pinned": self.is_pinned,
+            "bg_color": text_edit.style_manager.bg_color,
+            "text_color": text_edit.style_manager.text_color,
+            "theme": text_edit.user_theme_preference,
+            "font_family": text_edit.font().family(),
+            "font_size": text_edit.current_font_size,
+            "archived": archived,
+            "hidden": self.is_hidden,
+            "markdown": text_edit.markdown is not None,
+        }
+
+    def apply_state(self, state):
+        """从保存的状态恢复便签"""
+        text_edit = self.text_edit
+        self.saved_content = _state_content(state)
+        if "text" in state:
+            text_edit.setPlainText(state["text"])
+        else:
+            text_edit.setHtml(state.get("html", ""))
+        if state.get("geometry"):
+            x, y, w, h = state["geometry"]
+            self.move(x, y)
+            self.resize(w, h)
+
+        theme = state.get("theme")
+        if theme == "dark":
+            text_edit.set_dark_mode()
+        elif theme == "light":
+            text_edit.set_light_mode()
+        elif theme == "custom":
+            text_edit.update_style(bg_color=QColor(state["bg_color"]),
+                                   text_color=QColor(state["text_color"]))
+            text_edit.user_theme_preference = "custom"
+
+        # 与默认字体相同时不再设置，避免重复的字体匹配和重新排版
+        family = state.get("font_family")
+        if family and family != text_edit.font().family():
+            font = text_edit.font()
+            font.setFamily(family)
+            text_edit.setFont(font)
+        text_edit.current_font_size = state.get("font_size", text_edit.current_font_size)
+        text_edit.set_font_size()
+        text_edit.set_markdown_mode(bool(state.get("markdown")))
+
+        if state.get("is_pinned"):
+            self.set_pinned(True)
+
+    def schedule_save(self):
+        """延迟保存，重复调用只会重新计时"""
+        self._save_timer.start()
+
+    def save(self):
+        """在后台线程保存便签，并按需记录历史版本"""
+        self._save_timer.stop()
+        state = self.note_state()
+        get_note_store().put_async(state)
+        self.record_version(state=state)
+
+    def record_version(self, force=False, state=None):
+        """
+        在后台记录一个历史版本。
+        自动保存时距上次记录不足 SNAPSHOT_INTERVAL 秒则跳过；force 用于清空、恢复等破坏性编辑之前
+        """
+        state = state or self.note_state()
+        self.saved_content = _state_content(state)
+        content, kind = self.saved_content
+        if force or not self.text_edit.document().isEmpty():
+            get_version_history().snapshot(self.note_id, content, kind, force=force)
 
+    def record_saved_version(self):
+        """
+        清空、清除格式、恢复版本之前记录历史版本：直接使用最近一次保存的内容，不在界面线程重新导出文档。
+        之后尚未保存的修改(最多 SAVE_DELAY_MS)仍在撤销栈中
+        """
+        if self.saved_content is not None:
+            content, kind = self.saved_content
+            get_version_history().snapshot(self.note_id, content, kind, force=True)
+
+    def show_history(self):
+        """打开便签的历史版本"""
+        from history_dialog import HistoryDialog
+        # 等后台写完，列表中包含刚刚记录的版本
+        get_version_history().wait()
+        HistoryDialog(self).show()
+
+    def persist_on_close(self, keep_open):
+        """关闭前同步保存；空便签直接删除，其余归档"""
+        self._save_timer.stop()
+        store = get_note_store()
+        if self.text_edit.document().isEmpty() and not keep_open:
+            store.delete(self.note_id)
+            get_version_history().delete(self.note_id)
+        else:
+            store.put(self.note_state(archived=not keep_open))
 
     def toggle_pin(self):
-        toggle_pin(self)
+        self.set_pinned(not self.is_pinned)
+
+    def set_pinned(self, pinned):
+        # __init__ 中恢复置顶状态时计时器尚未创建
+        if set_pinned(self, pinned) and hasattr(self, '_save_timer'):
+            self.schedule_save()
 
     def change_background_color(self):
         self.text_edit.change_background_color()
@@ -88,6 +302,10 @@ class StickyNote(QMainWindow):
     def mouseReleaseEvent(self, event):
         self.window_event_handler.mouse_release_event(event)
 
+    def moveEvent(self, event):
+        self.window_event_handler.move_event(event)
+        super().moveEvent(event)
+
     def wheelEvent(self, event):
         self.window_event_handler.wheel_event(event)
 
@@ -119,11 +337,6 @@ class StickyNote(QMainWindow):
     def copy_plain_text(self):
         self.text_edit.copy_plain_text()
 
-
-    def eventFilter(self, obj, event):
-        # 调用自定义的事件处理方法
-        return self.window_event_handler.event_filter(obj, event)
-
     # 在 sticky_note.py 中
     def create_new_note(self):
         """
@@ -136,30 +349,306 @@ class StickyNote(QMainWindow):
         new_pos = self.pos()
         new_note.move(new_pos.x() + 30, new_pos.y() + 30)
         new_note.show()
+
+    def show_search(self):
+        """打开搜索所有便签的弹窗"""
+        from search_dialog import SearchDialog
+        SearchDialog.instance(find_window, show_window).popup()
+
+    def show_clipboard_history(self):
+        """打开剪贴板历史，所选记录粘贴到本便签"""
+        from clipboard_dialog import ClipboardDialog
+        ClipboardDialog.instance().popup(self)
+
+    def hide_note(self):
+        """隐藏便签；至少保留一个可见的便签"""
+        if not any(window.isVisible() for window in open_windows if window is not self):
+            return
+        _hide_window(self)
+
+    def save_layout(self):
+        """把当前可见便签的位置保存为命名布局"""
+        from PySide6.QtWidgets import QInputDialog
+        name, ok = QInputDialog.getText(self, "保存布局", "布局名称(如 工作、家里)：")
+        if ok and name.strip():
+            save_layout(name.strip())
+
+    def switch_layout(self, name):
+        apply_layout(name)
+
+    def delete_layout(self, name):
+        get_layout_store().delete(name)
+
+    def release(self):
+        """释放窗口与相关资源（状态已保存），不会触发退出"""
+        global window_count
+        self._save_timer.stop()
+        self._engine_timer.stop()
+        ThemeDispatcher.instance().unregister(self.text_edit)
+        get_search_index().detach(self.note_id)
+        self.text_edit.undo_history.discard_spilled()
+        if self in open_windows:
+            open_windows.remove(self)
+            window_count -= 1
+        self.deleteLater()
+
+    def snap_targets(self):
+        """拖动吸附的目标：其他可见便签的 (x, y, 宽, 高)"""
+        targets = []
+        for window in open_windows:
+            if window is not self and window.isVisible():
+                geometry = window.frameGeometry()
+                targets.append((geometry.x(), geometry.y(), geometry.width(), geometry.height()))
+        return targets
+
+    def toggle_markdown_mode(self):
+        """开启或关闭 Markdown/待办模式"""
+        self.text_edit.set_markdown_mode(self.text_edit.markdown is None)
+
+    def _on_checklist_changed(self, done, total):
+        """底栏显示待办项完成数量，没有待办项时隐藏"""
+        self.checklist_label.setText(f"✓ {done}/{total}")
+        self.checklist_label.setVisible(total > 0)
+
+    def toggle_instrumentation(self):
+        """开启或关闭性能监视浮层与跟踪"""
+        set_instrumentation_enabled(get_profiler() is None, open_windows)
+
+    def pin_all_notes(self):
+        set_all_pinned(True)
+
+    def unpin_all_notes(self):
+        set_all_pinned(False)
+
     def close_and_update_count(self):
         """关闭窗口并手动触发计数更新"""
 
+        # 最后一个便签保持打开状态，下次启动时恢复
+        self.persist_on_close(keep_open=window_count <= 1 and not _restoring())
+        ThemeDispatcher.instance().unregister(self.text_edit)
+        get_search_index().detach(self.note_id)
+        self.text_edit.undo_history.discard_spilled()
+        if self in open_windows:
+            open_windows.remove(self)
         # 先减少计数
         on_window_destroyed()
         # 再关闭窗口
         self.close()
 
+
+def _state_content(state):
+    """状态中的便签内容 (内容, "html"/"text")"""
+    if "text" in state:
+        return state["text"], "text"
+    return state.get("html", ""), "html"
+
 # 全局窗口计数
 window_count = 0
+# 当前打开的便签（包括隐藏但仍保留窗口的便签）
+open_windows = []
 def on_window_destroyed():
     """窗口销毁时调用"""
     global window_count
     # print("当前窗口数:", window_count)
     window_count -= 1
     # print("递减后窗口数:", window_count)
-    if window_count <= 0:
+    # 启动恢复尚未完成时，剩下的便签稍后仍会显示
+    if window_count <= 0 and not _restoring():
         QApplication.quit()
 
-def create_window():
+def create_window(state=None):
     """创建新窗口并增加计数"""
     global window_count
-    window = StickyNote()
+    window = StickyNote(state)
+    open_windows.append(window)
     # print("当前窗口数", window_count)
     window_count += 1
     # print("递增当前窗口数:", window_count)
     return window
+
+def restore_windows():
+    """
+    启动时恢复上次打开的便签；隐藏的便签只登记为记录，不创建窗口。
+    置顶和在屏幕内的便签优先：第一个便签立即创建并显示，其余由 SessionRestorer 在空闲时逐个创建。
+    返回已创建的窗口
+    """
+    global session_restorer
+    states = []
+    for state in get_note_store().notes.values():
+        if state.get("archived"):
+            continue
+        if state.get("hidden"):
+            hidden_notes.add_state(state)
+        else:
+            states.append(state)
+    if states:
+        session_restorer = SessionRestorer(create_window)
+        return [session_restorer.start(states)]
+    if len(hidden_notes):
+        # 所有便签都被隐藏时显示第一个，保证有可操作的窗口
+        return [_take_hidden(hidden_notes.note_ids()[0])]
+    return []
+
+def _restoring():
+    return session_restorer is not None and bool(session_restorer.pending)
+
+def finish_restore():
+    """立即创建所有尚未恢复的便签"""
+    if session_restorer is not None:
+        session_restorer.finish()
+
+def handle_instance_command(command):
+    """处理其他启动进程转发过来的命令"""
+    name = command.get("command")
+    if name == "new":
+        window = create_window()
+        cascade(window)
+        _bring_to_front(window)
+    elif name == "add":
+        # 命令行新建的便签只显示，不抢占焦点
+        window = create_window({"id": command["id"], "text": command.get("text", "")})
+        cascade(window)
+        window.show()
+        window.save()
+    elif name == "append":
+        append_to_note(command["note"], command.get("text", ""))
+    elif name == "layout":
+        apply_layout(command.get("name", ""))
+    elif name == "sync":
+        # 命令行读取存储前，先写入尚未保存的修改
+        save_all_windows()
+    elif name == "show":
+        for note_id in hidden_notes.note_ids():
+            _take_hidden(note_id)
+        for window in open_windows:
+            _bring_to_front(window)
+    elif name == "focus":
+        target = str(command.get("note", ""))
+        if target in hidden_notes:
+            show_window(target)
+            return
+        for index, window in enumerate(open_windows, start=1):
+            if target in (str(index), window.note_id):
+                _bring_to_front(window)
+                break
+
+def cascade(window):
+    """新窗口相对上一个窗口错开一些，避免完全重叠"""
+    if len(open_windows) > 1:
+        last_pos = open_windows[-2].pos()
+        window.move(last_pos.x() + 30, last_pos.y() + 30)
+
+def note_window(note_id):
+    """便签的窗口，隐藏的便签按需重新创建窗口但保持隐藏；不存在时返回 None"""
+    window = find_window(note_id)
+    if window is None and note_id in hidden_notes:
+        window = hidden_notes.take(note_id)
+        hidden_notes.note_hidden(window)
+    return window
+
+def append_to_note(note_id, text):
+    """在便签末尾追加文本；隐藏的便签保持隐藏，没有窗口的便签直接修改存储"""
+    window = note_window(note_id)
+    if window is None:
+        store = get_note_store()
+        state = store.notes.get(note_id)
+        if state is None:
+            raise KeyError(f"便签不存在: {note_id}")
+        store.put(append_text(dict(state), text))
+        return
+    window.text_edit.append_text(text)
+    window.save()
+
+def set_all_pinned(pinned):
+    """批量置顶或取消置顶所有打开的便签"""
+    for window in open_windows:
+        window.set_pinned(pinned)
+
+def find_window(note_id):
+    """按 id 查找打开的便签窗口；尚未恢复的便签立即创建"""
+    for window in open_windows:
+        if window.note_id == note_id:
+            return window
+    if session_restorer is not None:
+        return session_restorer.restore_now(note_id)
+    return None
+
+def show_window(note_id):
+    """显示便签（隐藏的便签会按需重新创建窗口），返回窗口；不存在时返回 None"""
+    window = _take_hidden(note_id) if note_id in hidden_notes else find_window(note_id)
+    if window is not None:
+        _bring_to_front(window)
+    return window
+
+def _take_hidden(note_id):
+    window = hidden_notes.take(note_id)
+    window.is_hidden = False
+    window.schedule_save()
+    return window
+
+def _hide_window(window):
+    window.is_hidden = True
+    window.save()
+    window.hide()
+    hidden_notes.note_hidden(window)
+
+def save_layout(name):
+    """把当前可见便签的位置与置顶状态保存为命名布局"""
+    finish_restore()
+    notes = {}
+    for window in open_windows:
+        if window.isVisible():
+            geometry = window.geometry()
+            notes[window.note_id] = {"geometry": [geometry.x(), geometry.y(), geometry.width(), geometry.height()],
+                                     "is_pinned": window.is_pinned}
+    get_layout_store().save(name, notes)
+
+def apply_layout(name):
+    """
+    一步切换到命名布局：显示布局中的便签并移到保存的位置(限制在当前屏幕内)，隐藏其余便签。
+    布局不存在或其中的便签都已删除时不做任何改变，返回是否切换
+    """
+    layout = get_layout_store().get(name)
+    if not layout:
+        return False
+    finish_restore()
+    screens = available_geometries()
+    shown = []
+    for note_id, entry in layout.items():
+        window = _take_hidden(note_id) if note_id in hidden_notes else find_window(note_id)
+        if window is None:
+            continue
+        x, y, width, height = clamp_geometry(entry["geometry"], screens)
+        window.move(x, y)
+        window.resize(width, height)
+        window.set_pinned(entry.get("is_pinned", False))
+        window.show()
+        window.schedule_save()
+        shown.append(window)
+    if not shown:
+        return False
+    for window in list(open_windows):
+        if window not in shown and window.isVisible():
+            _hide_window(window)
+    return True
+
+def _bring_to_front(window):
+    window.show()
+    window.raise_()
+    window.activateWindow()
+
+def save_all_windows():
+    """退出前同步保存所有打开的便签"""
+    store = get_note_store()
+    for window in open_windows:
+        if window._save_timer.isActive():
+            state = window.note_state()
+            store.put(state)
+            window.record_version(state=state)
+    store.wait()
+    get_version_history().wait()
+
+# 隐藏的便签，超出上限后释放为紧凑记录
+hidden_notes = NoteRegistry(create_window)
+# 启动时分批恢复便签，恢复完成前仍保留尚未创建的便签
+session_restorer = None
@@ -0,0 +1,60 @@
+# style_cache.py
+import time
+from contextlib import contextmanager
+
+# 样式表应用统计：setStyleSheet 会触发控件重新 polish，记录次数和耗时
+polish_stats = {"count": 0, "seconds": 0.0}
+
+# 已编译的样式表字符串，所有便签共用
+_styles = {}
+
+# deferred_styles() 期间暂存的样式表：控件 -> 样式表，退出时每个控件只应用最后一次
+_deferred = None
+_defer_depth = 0
+
+
+def cached_style(key, build):
+    """按 key 缓存样式表字符串，首次使用时调用 build() 生成"""
+    style = _styles.get(key)
+    if style is None:
+        style = _styles[key] = build()
+    return style
+
+
+def apply_style_sheet(widget, style):
+    """应用样式表；与当前样式相同时跳过，避免无谓的重新 polish"""
+    if _deferred is not None:
+        _deferred[widget] = style
+        return True
+    if widget.styleSheet() == style:
+        return False
+    start = time.perf_counter()
+    widget.setStyleSheet(style)
+    polish_stats["count"] += 1
+    polish_stats["seconds"] += time.perf_counter() - start
+    return True
+
+
+@contextmanager
+def deferred_styles():
+    """
+    期间的样式表只记录不应用，退出时每个控件只应用最终的样式表。
+    创建窗口时默认配色、系统主题、保存的配色会依次设置，合并后只 polish 一次。可以嵌套
+    """
+    global _deferred, _defer_depth
+    if _defer_depth == 0:
+        _deferred = {}
+    _defer_depth += 1
+    try:
+        yield
+    finally:
+        _defer_depth -= 1
+        if _defer_depth == 0:
+            pending, _deferred = _deferred, None
+            for widget, style in pending.items():
+                apply_style_sheet(widget, style)
+
+
+def reset_polish_stats():
+    polish_stats["count"] = 0
+    polish_stats["seconds"] = 0.0
@@ -1,54 +1,218 @@
 # text_editor.py
-from PySide6.QtWidgets import QTextEdit, QColorDialog, QFontDialog
-from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QTextEdit, QPlainTextEdit
+from PySide6.QtCore import Qt, QPoint, QTimer
+from PySide6.QtGui import QColor, QFont
+
+from chunked_edit import (ChunkedPaste, ChunkedPlainTextConversion,
+                          CHUNKED_PASTE_THRESHOLD, CHUNKED_FORMAT_THRESHOLD)
+from style_cache import cached_style, apply_style_sheet, deferred_styles
+from undo_history import UndoHistory
 from PySide6.QtWidgets import QApplication
 
-class CustomTextEdit(QTextEdit):
-
-    def __init__(self):
-        super().__init__()
-        self.current_font_size = 12
-        self.set_font_size()
-        self.style_manager = StyleSheetManager(self)
-        # 添加用户主题偏好属性
-        self.user_theme_preference = None  # None表示跟随系统，"dark"表示深色，"light"表示浅色,"custom"
-        # 启动时检测并设置系统主题
-        self.set_system_theme_mode()
+# 超过该字符数且没有富文本格式的便签自动切换到纯文本编辑引擎
+LARGE_NOTE_THRESHOLD = 1_000_000
+# 连续缩放时最多每帧应用一次字体大小(毫秒)
+ZOOM_APPLY_DELAY_MS = 16
+# 搜索命中的高亮颜色与最多高亮的数量
+HIGHLIGHT_COLOR = "#ffd54f"
+MAX_HIGHLIGHTS = 1000
+# 便签默认字体
+DEFAULT_FONT_FAMILY = "Source Han Sans SC"
+DEFAULT_FONT_SIZE = 12
+
+_default_font = None
+
+
+def default_font():
+    """
+    便签默认字体，所有便签共用同一个 QFont。
+    字体匹配只在第一次使用时进行，之后的窗口直接复用匹配结果
+    """
+    global _default_font
+    if _default_font is None:
+        _default_font = QFont(DEFAULT_FONT_FAMILY, DEFAULT_FONT_SIZE)
+    return _default_font
+
+
+class NoteEditorMixin:
+    """
+    富文本 (CustomTextEdit) 与纯文本 (PlainTextEdit) 两种编辑引擎共用的功能，
+    两者对外提供相同的接口
+    """
+
+    # 样式表中使用的控件选择器
+    STYLE_SELECTOR = ""
+    is_plain_engine = False
+
+    def init_editor(self):
+        # 颜色、字体等需要持久化的设置变化时调用
+        self.settings_listener = None
+        # 清空、清除格式等破坏性编辑之前调用，用于记录历史版本
+        self.snapshot_listener = None
+        # Markdown/待办模式下待办项完成数量变化时调用，参数为 (已完成, 全部)
+        self.checklist_listener = None
+        # Markdown/待办模式，None 表示未开启
+        self.markdown = None
+        # 大段文本分块粘贴、大文档分批清除格式，None 表示不自动分批
+        self.chunked_paste_threshold = CHUNKED_PASTE_THRESHOLD
+        self.chunked_format_threshold = CHUNKED_FORMAT_THRESHOLD
+        # 正在进行的分批编辑，同一时间只有一个
+        self.chunked_edit = None
+        self.current_font_size = DEFAULT_FONT_SIZE
+        # 缩放时先只更新 current_font_size，由定时器合并后统一应用，避免每一步都重新排版
+        self._zoom_timer = QTimer(self)
+        self._zoom_timer.setSingleShot(True)
+        self._zoom_timer.setInterval(ZOOM_APPLY_DELAY_MS)
+        self._zoom_timer.timeout.connect(self.set_font_size)
+        # 直接设置默认字体，避免先按控件字体排版一次再换字体
+        self.setFont(default_font())
+        # 有上限的撤销历史，大段编辑前的内容可写入磁盘
+        self.undo_history = UndoHistory(self)
+        # 初始样式与系统主题合并为一次样式表应用
+        with deferred_styles():
+            self.style_manager = StyleSheetManager(self)
+            # 添加用户主题偏好属性
+            self.user_theme_preference = None  # None表示跟随系统，"dark"表示深色，"light"表示浅色,"custom"
+            # 启动时检测并设置系统主题
+            self.set_system_theme_mode()
 
     def set_font_size(self):
         """设置字体大小"""
+        self._zoom_timer.stop()
         # 获取当前字体并只修改字体大小
         font = self.font()
+        if font.pointSize() == max(8, self.current_font_size):
+            return
+        # 只修改控件字体(即文档默认字体)，不改动各段文字自身的格式
         font.setPointSize(max(8, self.current_font_size))
         self.setFont(font)
+        self.notify_settings_changed()
+
+    def notify_settings_changed(self):
+        """通知设置已变化"""
+        if self.settings_listener is not None:
+            self.settings_listener()
+
+    def notify_before_destructive_edit(self):
+        if self.snapshot_listener is not None:
+            self.snapshot_listener()
+
+    def notify_checklist_changed(self, done, total):
+        if self.checklist_listener is not None:
+            self.checklist_listener(done, total)
+
+    def set_markdown_mode(self, enabled):
+        """开启或关闭 Markdown/待办模式"""
+        if enabled == (self.markdown is not None):
+            return
+        if enabled:
+            from markdown_mode import MarkdownMode
+            self.markdown = MarkdownMode(self)
+        else:
+            self.markdown.close()
+            self.markdown = None
+            self.notify_checklist_changed(0, 0)
+        self.notify_settings_changed()
+
+    def take_over(self, other):
+        """接管另一个编辑器的内容与设置，切换编辑引擎时使用"""
+        self.setFont(other.font())
+        self.current_font_size = other.current_font_size
+        self.set_font_size()
+        self.user_theme_preference = other.user_theme_preference
+        self.chunked_paste_threshold = other.chunked_paste_threshold
+        self.chunked_format_threshold = other.chunked_format_threshold
+        style = other.style_manager
+        self.style_manager.update_style(bg_color=QColor(style.bg_color), text_color=QColor(style.text_color),
+                                        scroll_hidden=style.scroll_hidden)
+
+        cursor_position = other.textCursor().position()
+        self.setPlainText(other.toPlainText())
+        cursor = self.textCursor()
+        cursor.setPosition(min(cursor_position, self.document().characterCount() - 1))
+        self.setTextCursor(cursor)
+        # 内容就绪后再开启高亮，只需高亮一遍
+        self.set_markdown_mode(other.markdown is not None)
+
+    def top_visible_position(self):
+        """视口顶部第一个字符在文档中的位置"""
+        return self.cursorForPosition(QPoint(0, 0)).position()
 
     def increase_font_size(self):
         """放大字体"""
         self.current_font_size += 2
-        self.set_font_size()
+        self._schedule_font_size()
 
     def decrease_font_size(self):
         """缩小字体"""
         if self.current_font_size > 8:
             self.current_font_size -= 2
-            self.set_font_size()
+            self._schedule_font_size()
 
-    def paste_plain_text(self):
-        """粘贴纯文本"""
-        from PySide6.QtWidgets import QApplication
-        clipboard = QApplication.clipboard()
-        plain_text = clipboard.text()
-        if plain_text:
+    def _schedule_font_size(self):
+        # 计时中不重新计时，连续滚动时也能保持每帧最多排版一次
+        if not self._zoom_timer.isActive():
+            self._zoom_timer.start()
+
+    def paste_plain_text(self, chunked=None, text=None):
+        """
+        粘贴纯文本，text 为 None 时粘贴剪贴板中的文字
+        chunked 为 None 时，超过 chunked_paste_threshold 的内容自动分块粘贴
+        """
+        if text is None:
+            from PySide6.QtWidgets import QApplication
+            text = QApplication.clipboard().text()
+        plain_text = text
+        if not plain_text or self.chunked_edit is not None:
+            return
+        self.undo_history.before_edit(len(plain_text))
+        if chunked is None:
+            chunked = (self.chunked_paste_threshold is not None
+                       and len(plain_text) > self.chunked_paste_threshold)
+        if chunked:
+            self._start_chunked_edit(ChunkedPaste(self, plain_text, on_finished=self._on_chunked_edit_finished))
+        else:
             self.insertPlainText(plain_text)
 
-    def convert_to_plain_text(self):
+    def insertFromMimeData(self, source):
+        self.undo_history.before_edit(len(source.text()))
+        super().insertFromMimeData(source)
+
+    def append_text(self, text):
+        """在末尾另起一段追加纯文本（命令行追加），不移动用户的光标"""
+        from PySide6.QtGui import QTextCursor, QTextCharFormat
+        document = self.document()
+        cursor = QTextCursor(document)
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(text if document.isEmpty() else "\n" + text, QTextCharFormat())
+
+    def _start_chunked_edit(self, chunked_edit):
+        self.chunked_edit = chunked_edit
+        chunked_edit.start()
+
+    def _on_chunked_edit_finished(self):
+        self.chunked_edit = None
+
+    def convert_to_plain_text(self, chunked=None):
         """
         将所有文本转换为普通格式（纯文本格式）
+        chunked 为 None 时，段落数超过 chunked_format_threshold 的文档自动分批处理
         """
         from PySide6.QtGui import QTextCursor, QTextCharFormat, QTextBlockFormat
 
+        if self.chunked_edit is not None:
+            return
         # 获取文档
         doc = self.document()
+        if self.has_rich_formatting():
+            self.notify_before_destructive_edit()
+            self.undo_history.before_edit(doc.characterCount())
+        if chunked is None:
+            chunked = (self.chunked_format_threshold is not None
+                       and doc.blockCount() > self.chunked_format_threshold)
+        if chunked:
+            self._start_chunked_edit(ChunkedPlainTextConversion(self, on_finished=self._on_chunked_edit_finished))
+            return
 
         # 创建普通字符格式和段落格式
         char_format = QTextCharFormat()
@@ -61,16 +225,47 @@ class CustomTextEdit(QTextEdit):
         # 应用普通格式（清除所有格式）
         cursor.setCharFormat(char_format)
         cursor.setBlockFormat(block_format)
+        self._mark_formatting_cleared()
 
     def clear_all(self):
         """
-        彻底清空所有内容和格式
+        彻底清空所有内容和格式，可以撤销
         """
-        # 先转换为纯文本格式
-        self.convert_to_plain_text()
-        # 然后清除内容
-        self.clear()
+        from PySide6.QtGui import QTextCursor, QTextCharFormat, QTextBlockFormat
 
+        if self.chunked_edit is not None:
+            self.chunked_edit.cancel()
+        document = self.document()
+        if not document.isEmpty():
+            self.notify_before_destructive_edit()
+        self.undo_history.before_edit(document.characterCount())
+        # 内容会被整个删除，无需先逐段清除格式，只需重置剩下的空段落与输入格式。
+        # 不使用 clear()：它会同时清空撤销历史
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        cursor.select(QTextCursor.SelectionType.Document)
+        cursor.removeSelectedText()
+        cursor.setBlockFormat(QTextBlockFormat())
+        cursor.setBlockCharFormat(QTextCharFormat())
+        cursor.endEditBlock()
+        self.setCurrentCharFormat(QTextCharFormat())
+
+
+    def replace_content(self, content, html=False):
+        """用 content 替换全部内容，替换本身可以撤销"""
+        from PySide6.QtGui import QTextCursor, QTextDocument
+        cursor = self.textCursor()
+        cursor.beginEditBlock()
+        cursor.select(QTextCursor.SelectionType.Document)
+        if not html:
+            cursor.insertText(content)
+        elif self.is_plain_engine:
+            document = QTextDocument()
+            document.setHtml(content)
+            cursor.insertText(document.toPlainText())
+        else:
+            cursor.insertHtml(content)
+        cursor.endEditBlock()
 
     def copy_plain_text(self):
         """复制纯文本"""
@@ -80,12 +275,42 @@ class CustomTextEdit(QTextEdit):
         if plain_text:
             clipboard.setText(plain_text)
 
+    def highlight_matches(self, terms):
+        """高亮所有命中的关键词，并选中光标之后的下一处命中（到末尾后从头开始）"""
+        from PySide6.QtGui import QTextCharFormat
+
+        document = self.document()
+        highlight = QTextCharFormat()
+        highlight.setBackground(QColor(HIGHLIGHT_COLOR))
+        selections = []
+        for term in terms:
+            cursor = document.find(term)
+            while not cursor.isNull() and len(selections) < MAX_HIGHLIGHTS:
+                selection = QTextEdit.ExtraSelection()
+                selection.cursor = cursor
+                selection.format = highlight
+                selections.append(selection)
+                cursor = document.find(term, cursor)
+        self.setExtraSelections(selections)
+
+        cursor = document.find(terms[0], self.textCursor())
+        if cursor.isNull():
+            cursor = document.find(terms[0])
+        if not cursor.isNull():
+            self.setTextCursor(cursor)
+            self.ensureCursorVisible()
+
+    def clear_highlights(self):
+        self.setExtraSelections([])
+
     def update_style(self, bg_color=None, text_color=None):
         """更新文本编辑器样式"""
         self.style_manager.update_style(bg_color=bg_color, text_color=text_color)
+        self.notify_settings_changed()
 
     def change_background_color(self):
         """更改背景颜色"""
+        from PySide6.QtWidgets import QColorDialog
         current_bg_color = self.palette().base().color()
         color = QColorDialog.getColor(current_bg_color, self, "选择背景颜色")
         self.user_theme_preference = "custom"
@@ -94,6 +319,7 @@ class CustomTextEdit(QTextEdit):
 
     def change_font_color(self):
         """更改字体颜色"""
+        from PySide6.QtWidgets import QColorDialog
         current_color = self.palette().text().color()
         color = QColorDialog.getColor(current_color, self, "选择字体颜色")
         self.user_theme_preference = "custom"
@@ -106,57 +332,171 @@ class CustomTextEdit(QTextEdit):
 
     def change_font_dialog(self):
         """更改字体"""
+        from PySide6.QtWidgets import QFontDialog
         current_font = self.font()
         ok, font = QFontDialog.getFont(current_font, self)
 
         if ok:
+            self._zoom_timer.stop()
             self.setFont(font)
             self.current_font_size = font.pointSize()
+            self.notify_settings_changed()
     def set_dark_mode(self):
         """设置深色模式"""
-        from PySide6.QtGui import QColor
-        dark_bg = QColor(45, 45, 45)      # 深灰色背景
-        dark_text = QColor(240, 240, 240) # 浅灰色文字
-        self.update_style(bg_color=dark_bg, text_color=dark_text)
+        self._apply_theme("dark")
         # 记录用户偏好
         self.user_theme_preference = "dark"
+        self.notify_settings_changed()
 
     def set_light_mode(self):
         """设置浅色模式"""
-        from PySide6.QtGui import QColor
-        light_bg = QColor(255, 255, 255)  # 白色背景
-        light_text = QColor(0, 0, 0)      # 黑色文字
-        self.update_style(bg_color=light_bg, text_color=light_text)
+        self._apply_theme("light")
         # 记录用户偏好
         self.user_theme_preference = "light"
+        self.notify_settings_changed()
 
     def set_system_theme_mode(self):
         """根据系统主题设置深色或浅色模式"""
         # 记录用户偏好为跟随系统
         self.user_theme_preference = None
+        self._apply_theme(system_theme())
+        self.notify_settings_changed()
+
+    def apply_system_theme(self, theme):
+        """系统主题变化时由 ThemeDispatcher 调用，theme 已由调用方统一检测"""
+        if self.user_theme_preference is None:
+            self._apply_theme(theme)
+
+    def _apply_theme(self, theme):
+        bg_color, text_color = THEME_COLORS[theme]
+        self.style_manager.update_style(bg_color=QColor(bg_color), text_color=QColor(text_color))
+
+
+class CustomTextEdit(NoteEditorMixin, QTextEdit):
+    """富文本编辑引擎"""
+
+    STYLE_SELECTOR = "QTextEdit"
+
+    def __init__(self):
+        super().__init__()
+        # 清除格式后文档中仍会残留用过的格式，记录清除时撤销栈中的步骤数供 has_rich_formatting 判断：
+        # 撤销到清除之前、或撤销后又有新的修改时格式可能已经恢复，None 表示没有清除
+        self.formatting_cleared_steps = None
+        self.init_editor()
+        self.document().redoAvailable.connect(self._on_redo_available)
+
+    def insertFromMimeData(self, source):
+        """粘贴富文本时先清理 HTML，图片转存到图片存储中，文档里只保留引用"""
+        if not (source.hasHtml() or source.hasImage()) or not self.acceptRichText():
+            super().insertFromMimeData(source)
+            return
+        from PySide6.QtGui import QTextDocumentFragment
+        from paste_sanitizer import sanitize_html, image_html
+
+        self.formatting_cleared_steps = None
+        self.undo_history.before_edit(len(source.text()))
+        if source.hasHtml():
+            html = sanitize_html(source.html())
+        else:
+            html = image_html(source.imageData())
+        self.textCursor().insertFragment(QTextDocumentFragment.fromHtml(html, self.document()))
+        self.ensureCursorVisible()
+
+    def loadResource(self, resource_type, url):
+        # 图片存储中的图片在首次绘制时才加载，文档会缓存加载结果
+        from image_store import IMAGE_SCHEME, get_image_store
+        if url.scheme() == IMAGE_SCHEME:
+            return get_image_store().image(url.path())
+        return super().loadResource(resource_type, url)
+
+    def _on_chunked_edit_finished(self):
+        if isinstance(self.chunked_edit, ChunkedPlainTextConversion) and self.chunked_edit.completed:
+            self._mark_formatting_cleared()
+        super()._on_chunked_edit_finished()
+
+    def _mark_formatting_cleared(self):
+        self.formatting_cleared_steps = self.document().availableUndoSteps()
+
+    def _on_redo_available(self, available):
+        # 撤销到清除格式之前后又有新的修改，重做栈被丢弃，清除已不可能再重做
+        steps = self.formatting_cleared_steps
+        if not available and steps is not None and self.document().availableUndoSteps() < steps:
+            self.formatting_cleared_steps = None
+
+    def replace_content(self, content, html=False):
+        super().replace_content(content, html)
+        if html:
+            self.formatting_cleared_steps = None
+
+    def has_rich_formatting(self):
+        """
+        文档是否含有富文本格式。
+        只检查文档的格式集合而不遍历内容，可能把已删除内容用过的格式也算在内
+        """
+        steps = self.formatting_cleared_steps
+        if steps is not None and self.document().availableUndoSteps() >= steps:
+            return False
+        for text_format in self.document().allFormats():
+            if text_format.isListFormat() or text_format.isImageFormat():
+                return True
+            if text_format.isFrameFormat() and text_format.objectType() != 0:
+                # 表格
+                return True
+            if (text_format.isCharFormat() or text_format.isBlockFormat()) and text_format.propertyCount():
+                return True
+        return False
+
+    def scroll_to_position(self, position):
+        """滚动使 position 所在段落位于视口顶部"""
+        block = self.document().findBlock(position)
+        top = self.document().documentLayout().blockBoundingRect(block).top()
+        self.verticalScrollBar().setValue(int(top))
+
+
+class PlainTextEdit(NoteEditorMixin, QPlainTextEdit):
+    """纯文本编辑引擎，用于超大便签，排版开销远小于 QTextEdit"""
+
+    STYLE_SELECTOR = "QPlainTextEdit"
+    is_plain_engine = True
+
+    def __init__(self):
+        super().__init__()
+        self.init_editor()
+
+    def convert_to_plain_text(self, chunked=None):
+        """纯文本引擎中没有格式需要清除"""
+
+    def has_rich_formatting(self):
+        return False
 
-        # 尝试检测系统主题
-        try:
-            # 对于 Windows 系统
-            if hasattr(Qt, 'ColorScheme'):
-                # Qt 6.5+ 提供了系统主题检测
-                color_scheme = QApplication.styleHints().colorScheme()
-                if color_scheme == Qt.ColorScheme.Dark:
-                    self.set_dark_mode()
-                else:
-                    self.set_light_mode()
-                self.user_theme_preference = None
-            else:
-                # 对于较老版本的 Qt，使用默认浅色模式
-                self.set_light_mode()
+    def toHtml(self):
+        return self.document().toHtml()
 
-        except Exception as e:
-            print(f"设置系统主题时出错: {e}")
-            self.set_light_mode()
+    def scroll_to_position(self, position):
+        """滚动使 position 所在段落位于视口顶部"""
+        # QPlainTextEdit 的滚动条以段落为单位
+        self.verticalScrollBar().setValue(self.document().findBlock(position).blockNumber())
 
 
+# 深色/浅色模式的 (背景色, 文字色)
+THEME_COLORS = {
+    "dark": ("#2d2d2d", "#f0f0f0"),   # 深灰色背景, 浅灰色文字
+    "light": ("#ffffff", "#000000"),  # 白色背景, 黑色文字
+}
 
 
+def system_theme():
+    """检测系统主题，返回 "dark" 或 "light" """
+    try:
+        if hasattr(Qt, 'ColorScheme'):
+            # Qt 6.5+ 提供了系统主题检测
+            if QApplication.styleHints().colorScheme() == Qt.ColorScheme.Dark:
+                return "dark"
+    except Exception as e:
+        print(f"检测系统主题时出错: {e}")
+    # 对于较老版本的 Qt，使用默认浅色模式
+    return "light"
+
 
 class StyleSheetManager:
     def __init__(self, text_edit):
@@ -176,34 +516,31 @@ class StyleSheetManager:
             self.bg_color = bg_color.name() if bg_color.isValid() else self.bg_color
         if text_color is not None:
             self.text_color = text_color.name() if text_color.isValid() else self.text_color
-        if scroll_hidden is not None:
+        if scroll_hidden is not None and scroll_hidden != self.scroll_hidden:
             self.scroll_hidden = scroll_hidden
-
-        scrollbar_style = self._get_scrollbar_style()
-
-        style = f"""
-            QTextEdit {{
+            # 焦点切换时只改滚动条策略，不重新解析样式表
+            self.text_edit.setVerticalScrollBarPolicy(
+                Qt.ScrollBarPolicy.ScrollBarAlwaysOff if scroll_hidden
+                else Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+
+        style = cached_style((self.text_edit.STYLE_SELECTOR, self.bg_color, self.text_color), self._build_style)
+        # 样式没有变化时 apply_style_sheet 会直接跳过
+        apply_style_sheet(self.text_edit, style)
+
+    def _build_style(self):
+        return f"""
+            {self.text_edit.STYLE_SELECTOR} {{
                 border: none;
                 padding: 10px;
                 background-color: {self.bg_color};
                 color: {self.text_color};
             }}
-            {scrollbar_style}
+            {self._get_scrollbar_style()}
         """
 
-        self.text_edit.setStyleSheet(style)
-
     def _get_scrollbar_style(self):
-        """获取滚动条样式"""
-        if self.scroll_hidden:
-            return """
-                QScrollBar:vertical {
-                    width: 0px;
-                    background: transparent;
-                }
-            """
-        else:
-            return """
+        """获取滚动条样式，隐藏滚动条通过滚动条策略实现"""
+        return """
                    QScrollBar:vertical {
                        background: rgba(0, 0, 0, 0.05);
                        width: 10px;
@@ -0,0 +1,63 @@
+# theme_dispatcher.py
+from PySide6.QtCore import QObject, QEvent, QTimer
+from PySide6.QtWidgets import QApplication
+
+from text_editor import system_theme
+
+
+class ThemeDispatcher(QObject):
+    """
+    应用级的系统主题监听器。
+    整个应用只监听一次主题变化，再统一通知所有已注册的便签，
+    而不是每个便签都在应用上安装事件过滤器。
+    """
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """获取全局唯一的分发器"""
+        if cls._instance is None:
+            cls._instance = cls(QApplication.instance())
+        return cls._instance
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.text_edits = []
+        self.current_theme = system_theme()
+
+        # 一次主题切换可能触发多次通知，合并到下一次事件循环统一处理
+        self._dispatch_timer = QTimer(self)
+        self._dispatch_timer.setSingleShot(True)
+        self._dispatch_timer.setInterval(0)
+        self._dispatch_timer.timeout.connect(self.dispatch)
+
+        style_hints = app.styleHints()
+        if hasattr(style_hints, 'colorSchemeChanged'):
+            # Qt 6.5+ 直接提供主题变化信号
+            style_hints.colorSchemeChanged.connect(self._dispatch_timer.start)
+        else:
+            # 较老版本的 Qt 只能监听调色板变化事件，应用上只安装这一个过滤器
+            app.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if obj is QApplication.instance() and event.type() == QEvent.Type.ApplicationPaletteChange:
+            self._dispatch_timer.start()
+        return False
+
+    def register(self, text_edit):
+        """注册需要跟随系统主题的文本编辑器"""
+        self.text_edits.append(text_edit)
+
+    def unregister(self, text_edit):
+        if text_edit in self.text_edits:
+            self.text_edits.remove(text_edit)
+
+    def dispatch(self, force=False):
+        """检测一次系统主题，并应用到所有跟随系统主题的便签"""
+        theme = system_theme()
+        if theme == self.current_theme and not force:
+            return
+        self.current_theme = theme
+        for text_edit in self.text_edits:
+            text_edit.apply_system_theme(theme)
@@ -1,9 +1,10 @@
 # ui_components.py
 from PySide6.QtCore import QSize
-from PySide6.QtGui import QIcon, QPixmap, Qt
-from PySide6.QtWidgets import QWidget, QHBoxLayout, QPushButton
+from PySide6.QtGui import Qt
+from PySide6.QtWidgets import QWidget, QHBoxLayout, QPushButton, QLabel
 
-from resource import ICON_PATH_DEFAULT, ICON_PATH_CHECKED
+from resource import ICON_PATH_DEFAULT, ICON_PATH_CHECKED, get_icon
+from style_cache import cached_style, apply_style_sheet
 
 # 全局变量定义
 BOTTOM_BAR_HEIGHT = 45
@@ -19,40 +20,39 @@ def create_bottom_bar(parent):
     创建底部工具栏
     """
     bottom_bar = QWidget()
+    bottom_bar.setObjectName("bottom_bar")
     bottom_bar.setFixedHeight(BOTTOM_BAR_HEIGHT)
-    bottom_bar.setStyleSheet(StyleSheetManager.get_bottom_bar_style())
+    # 底栏和按钮共用一份样式表，每个窗口只应用一次
+    apply_style_sheet(bottom_bar, StyleSheetManager.get_bottom_bar_style())
 
     bottom_layout = QHBoxLayout(bottom_bar)
     bottom_layout.setContentsMargins(10, 5, 10, 5)
 
     # 置顶按钮
     parent.pin_button = QPushButton()
+    parent.pin_button.setObjectName("pin_button")
     parent.pin_button.setCheckable(True)
     parent.pin_button.clicked.connect(parent.toggle_pin)
     parent.pin_button.setFixedSize(PIN_BUTTON_SIZE, PIN_BUTTON_SIZE)
     parent.pin_button.setToolTip("置顶/取消置顶便签(Ctrl+T)")
 
-    # 创建图标对象，使用 resource_path 获取正确路径
-    pin_icon_default = QIcon(QPixmap(ICON_PATH_DEFAULT))
-    parent.pin_button.setIcon(pin_icon_default)
+    # 图标在所有窗口间共享
+    parent.pin_button.setIcon(get_icon(ICON_PATH_DEFAULT))
     parent.pin_button.setIconSize(QSize(PIN_ICON_SIZE, PIN_ICON_SIZE))
 
-    # 使用样式表来控制图标和背景颜色
-    parent.pin_button.setStyleSheet(StyleSheetManager.get_pin_button_style())
-
     # 字体缩小按钮
     parent.font_down_button = QPushButton("-")
+    parent.font_down_button.setObjectName("font_button")
     parent.font_down_button.setFixedSize(FONT_BUTTON_SIZE, FONT_BUTTON_SIZE)
     parent.font_down_button.clicked.connect(parent.decrease_font_size)
     parent.font_down_button.setToolTip("缩小字体 (Ctrl+'-')/(鼠标滚轮+Ctrl)")
-    parent.font_down_button.setStyleSheet(StyleSheetManager.get_font_button_style())
 
     # 字体放大按钮
     parent.font_up_button = QPushButton("+")
+    parent.font_up_button.setObjectName("font_button")
     parent.font_up_button.setFixedSize(FONT_BUTTON_SIZE, FONT_BUTTON_SIZE)
     parent.font_up_button.clicked.connect(parent.increase_font_size)
     parent.font_up_button.setToolTip("放大字体 (Ctrl+'+')/(鼠标滚轮+Ctrl)")
-    parent.font_up_button.setStyleSheet(StyleSheetManager.get_font_button_style())
 
     # 将按钮添加到布局中，并让它们靠左
     bottom_layout.addWidget(parent.pin_button)
@@ -60,18 +60,32 @@ def create_bottom_bar(parent):
     bottom_layout.addWidget(parent.font_up_button)
     bottom_layout.addStretch()
 
+    # Markdown/待办模式下显示待办项完成数量
+    parent.checklist_label = QLabel()
+    parent.checklist_label.setObjectName("checklist_label")
+    parent.checklist_label.setToolTip("已完成/全部待办项")
+    parent.checklist_label.hide()
+    bottom_layout.addWidget(parent.checklist_label)
+
     return bottom_bar
 
 
 def toggle_pin(parent):
-    parent.is_pinned = not parent.is_pinned
+    set_pinned(parent, not parent.is_pinned)
+
+
+def set_pinned(parent, pinned):
+    """设置便签置顶状态；状态未变化时直接返回"""
+    if parent.is_pinned == pinned:
+        return False
+    parent.is_pinned = pinned
     parent.pin_button.setChecked(parent.is_pinned)  # 确保按钮状态与逻辑同步
 
     # 动态切换图标
     if parent.is_pinned:
-        parent.pin_button.setIcon(QIcon(QPixmap(ICON_PATH_CHECKED)))
+        parent.pin_button.setIcon(get_icon(ICON_PATH_CHECKED))
     else:
-        parent.pin_button.setIcon(QIcon(QPixmap(ICON_PATH_DEFAULT)))
+        parent.pin_button.setIcon(get_icon(ICON_PATH_DEFAULT))
 
     # 尝试使用 win32 模块进行置顶，效果更稳定
     try:
@@ -87,14 +101,30 @@ def toggle_pin(parent):
                                   win32con.SWP_NOMOVE | win32con.SWP_NOSIZE | win32con.SWP_NOACTIVATE)
     except ImportError:
         # 如果无法导入 win32 模块（例如在非 Windows 系统上），则使用 Qt 原生方法
-        flags = parent.windowFlags()
-        if parent.is_pinned:
-            parent.setWindowFlags(flags | Qt.WindowType.WindowStaysOnTopHint)
-        else:
-            parent.setWindowFlags(flags & ~Qt.WindowType.WindowStaysOnTopHint)
+        set_stays_on_top(parent, parent.is_pinned)
+    return True
+
+
+def set_stays_on_top(widget, on_top):
+    """
+    切换窗口置顶标志。
+    原生窗口已创建时直接修改其标志（xcb/cocoa 会就地更新层叠属性），
+    避免 QWidget.setWindowFlags 销毁并重建原生窗口、重新 polish 样式表导致的闪烁
+    """
+    flags = widget.windowFlags()
+    if on_top:
+        flags |= Qt.WindowType.WindowStaysOnTopHint
+    else:
+        flags &= ~Qt.WindowType.WindowStaysOnTopHint
 
-        # 重新显示窗口以应用标志
-        parent.show()
+    window = widget.windowHandle()
+    if window is None:
+        # 原生窗口尚未创建，设置标志没有重建开销，显示时生效
+        widget.setWindowFlags(flags)
+        return
+    # 同步 QWidget 记录的标志，保证 windowFlags() 与原生窗口一致
+    widget.overrideWindowFlags(flags)
+    window.setFlags(flags)
 
 
 class StyleSheetManager:
@@ -106,29 +136,40 @@ class StyleSheetManager:
     BUTTON_CHECKED_HOVER_COLOR = BUTTON_HOVER_COLOR
     BUTTON_PRESSED_COLOR = BUTTON_HOVER_COLOR
     BUTTON_BACKGROUND_COLOR = "transparent"
+    # 待办项完成数量的文字颜色
+    CHECKLIST_LABEL_COLOR = "#6b6355"
 
     @staticmethod
     def get_bottom_bar_style():
-        return f"""
-        background-color: {StyleSheetManager.BOTTOM_BAR_BACKGROUND_COLOR}; 
-        border-top: 1px solid {StyleSheetManager.BOTTOM_BAR_BORDER_COLOR};
-        """
+        """底栏及其按钮的完整样式表，所有窗口共用同一个字符串"""
+        return cached_style("bottom_bar", lambda: f"""
+        * {{
+            background-color: {StyleSheetManager.BOTTOM_BAR_BACKGROUND_COLOR}; 
+            border-top: 1px solid {StyleSheetManager.BOTTOM_BAR_BORDER_COLOR};
+        }}
+        {StyleSheetManager.get_pin_button_style()}
+        {StyleSheetManager.get_font_button_style()}
+        QLabel#checklist_label {{
+            border: none;
+            color: {StyleSheetManager.CHECKLIST_LABEL_COLOR};
+        }}
+        """)
 
     @staticmethod
     def get_pin_button_style():
         return f"""
-        QPushButton {{
+        QPushButton#pin_button {{
             border: none;
             border-radius: {PIN_BUTTON_RADIUS};
             background-color: {StyleSheetManager.BUTTON_BACKGROUND_COLOR};
         }}
-        QPushButton:hover {{
+        QPushButton#pin_button:hover {{
             background-color: {StyleSheetManager.BUTTON_HOVER_COLOR};
         }}
-        QPushButton:checked {{
+        QPushButton#pin_button:checked {{
             background-color: {StyleSheetManager.BUTTON_BACKGROUND_COLOR};
         }}
-        QPushButton:checked:hover {{
+        QPushButton#pin_button:checked:hover {{
             background-color: {StyleSheetManager.BUTTON_CHECKED_HOVER_COLOR};
         }}
         """
@@ -136,17 +177,17 @@ class StyleSheetManager:
     @staticmethod
     def get_font_button_style():
         return f"""
-        QPushButton {{
+        QPushButton#font_button {{
             border: none;
             border-radius: {FONT_BUTTON_RADIUS};
             font-size: 18px;
             padding: -2px 0px 0px 0px;
             text-align: center;
         }}
-        QPushButton:hover {{
+        QPushButton#font_button:hover {{
             background-color: {StyleSheetManager.BUTTON_HOVER_COLOR};
         }}
-        QPushButton:pressed {{
+        QPushButton#font_button:pressed {{
             background-color: {StyleSheetManager.BUTTON_PRESSED_COLOR};
         }}
         """
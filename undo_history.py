@@ -0,0 +1,241 @@
+# undo_history.py
+import os
+import shutil
+import time
+import zlib
+
+from PySide6.QtCore import QObject, QThreadPool, QTimer
+
+from note_store import default_data_dir
+
+# 撤销历史的上限：步数与估算占用的内存(字节)，None 表示不限制
+UNDO_MAX_STEPS = 1000
+UNDO_MAX_BYTES = 32 * 1024 * 1024
+# 清空撤销栈后留在文档缓冲区中的估算内存超过该值(字节)才重建文档缓冲区
+COMPACT_BYTES = 4 * 1024 * 1024
+# 超过该字符数的编辑（大段粘贴、清空、清除格式）之前，先把最近保存的内容压缩写入磁盘
+SPILL_THRESHOLD = 100_000
+# 每个便签最多保留的磁盘记录数
+MAX_SPILLED = 20
+UNDO_DIR_NAME = "undo"
+# QTextDocument 内部以 UTF-16 保存文字
+BYTES_PER_CHAR = 2
+
+
+class UndoHistory(QObject):
+    """
+    编辑器的撤销历史策略。
+    Qt 的撤销栈没有上限，被删除和替换的文字会一直留在文档内部的缓冲区中，
+    因此按步数和估算内存限制撤销历史，超出时清空撤销栈释放内存。
+    Qt 的撤销栈只能整体清空，为了让刚做的大段编辑仍能撤销：大段编辑之前预计会超出预算时先清空较早的历史，
+    只有最新一步超出预算时也不清空，等到下一步再清理。
+    Qt 本身已把连续输入合并为一个撤销步骤，步数按合并后的步骤计算。
+    大段编辑之前，便签最近保存的内容在后台压缩写入磁盘，撤销历史被清空后仍能恢复
+    """
+
+    def __init__(self, text_edit, max_steps=UNDO_MAX_STEPS, max_bytes=UNDO_MAX_BYTES):
+        super().__init__(text_edit)
+        self.text_edit = text_edit
+        self.max_steps = max_steps
+        self.max_bytes = max_bytes
+        # 设置便签 id 后才会写入磁盘
+        self.spill_directory = None
+        # 返回便签最近保存的 (内容, "html"/"text")，没有时返回 None
+        self.saved_content = None
+        self.steps = 0
+        self.bytes = 0
+        self.trimmed = 0
+        self._pending_bytes = 0
+        # 被删除但仍留在文档缓冲区中的文字(估算字节数)，清空撤销栈后重建文档才能释放
+        self._garbage = 0
+        self._spilled_content = None
+        self._trim_scheduled = False
+        # 最近一次计入步数的分批编辑
+        self._chunked_edit = None
+        document = text_edit.document()
+        document.contentsChange.connect(self._on_contents_change)
+        document.undoCommandAdded.connect(self._on_command_added)
+
+    def set_note(self, note_id, saved_content=None):
+        self.spill_directory = os.path.join(default_data_dir(), UNDO_DIR_NAME, note_id)
+        self.saved_content = saved_content
+
+    def _on_contents_change(self, _position, removed, added):
+        document = self.text_edit.document()
+        # setPlainText/setHtml 等不可撤销的修改期间撤销被临时关闭
+        if document.isUndoRedoEnabled():
+            self._pending_bytes += (removed + added) * BYTES_PER_CHAR
+            # 只修改格式时报告的删除与插入数量相同，缓冲区中的文字不变
+            if removed != added:
+                self._garbage += removed * BYTES_PER_CHAR
+        elif document.isEmpty():
+            # 不可撤销的整篇替换会清空撤销栈和文档缓冲区
+            self.steps = self.bytes = self._pending_bytes = self._garbage = 0
+
+    def _over_budget(self):
+        over_steps = self.max_steps is not None and self.steps > self.max_steps
+        # 只有最新一步超出预算时保留它，仍可撤销
+        over_bytes = self.max_bytes is not None and self.bytes > self.max_bytes and self.steps > 1
+        return over_steps or over_bytes
+
+    def _on_command_added(self):
+        # 分批编辑的各批合并为一个撤销步骤，但每批结束时都会发出信号
+        chunked_edit = self.text_edit.chunked_edit
+        if chunked_edit is None or chunked_edit is not self._chunked_edit:
+            self.steps += 1
+        self._chunked_edit = chunked_edit
+        self.bytes += self._pending_bytes
+        self._pending_bytes = 0
+        if self._over_budget() and not self._trim_scheduled:
+            # 正在编辑时不能修改撤销栈，留到下一次事件循环
+            self._trim_scheduled = True
+            QTimer.singleShot(0, self, self._trim_if_over_budget)
+
+    def _trim_if_over_budget(self):
+        self._trim_scheduled = False
+        # 期间可能已在大段编辑之前清理过
+        if not self._over_budget():
+            return
+        if self.text_edit.chunked_edit is not None:
+            # 分批编辑需要在取消时撤销已完成的部分，结束后再清理
+            self._trim_scheduled = True
+            QTimer.singleShot(100, self, self._trim_if_over_budget)
+            return
+        self.trim()
+
+    def trim(self, compact_bytes=COMPACT_BYTES):
+        """清空撤销栈，留在文档缓冲区中的文字超过 compact_bytes 时重建文档释放内存"""
+        document = self.text_edit.document()
+        document.clearUndoRedoStacks()
+        if self._garbage >= compact_bytes:
+            self._compact(document)
+            self._garbage = 0
+        self.steps = self.bytes = self._pending_bytes = 0
+        self.trimmed += 1
+
+    def _compact(self, document):
+        """
+        清空撤销栈后，被删除的文字仍留在文档内部只增不减的缓冲区中，
+        需要用相同的内容重建文档才能真正释放
+        """
+        from PySide6.QtGui import QTextCursor
+        cursor = self.text_edit.textCursor()
+        anchor, position = cursor.anchor(), cursor.position()
+        scroll = self.text_edit.verticalScrollBar().value()
+        selection = QTextCursor(document)
+        selection.select(QTextCursor.SelectionType.Document)
+        fragment = selection.selection()
+        # 内容不变，不通知搜索索引、自动保存等监听者
+        blocked = document.blockSignals(True)
+        document.setUndoRedoEnabled(False)
+        try:
+            document.clear()
+            QTextCursor(document).insertFragment(fragment)
+        finally:
+            document.setUndoRedoEnabled(True)
+            document.blockSignals(blocked)
+        # 屏蔽信号期间语法高亮没有处理重建的段落，原有的格式与待办计数随旧段落一起被清除
+        if self.text_edit.markdown is not None:
+            self.text_edit.markdown.highlighter.rehighlight()
+        cursor = QTextCursor(document)
+        end = document.characterCount() - 1
+        cursor.setPosition(min(anchor, end))
+        cursor.setPosition(min(position, end), QTextCursor.MoveMode.KeepAnchor)
+        self.text_edit.setTextCursor(cursor)
+        self.text_edit.verticalScrollBar().setValue(scroll)
+        self.text_edit.viewport().update()
+
+    def before_edit(self, size):
+        """
+        即将进行 size 个字符的大段编辑。
+        编辑后会超出内存预算时先清空较早的撤销历史，这次编辑本身仍能撤销；
+        便签最近保存的内容在后台写入磁盘，撤销历史被清空后仍能恢复。
+        不在界面线程导出文档，最近保存之后的修改由撤销栈覆盖；同一份内容只写一次
+        """
+        if size < SPILL_THRESHOLD:
+            return
+        if (self.max_bytes is not None and self.steps
+                and self.bytes + self._pending_bytes + size * BYTES_PER_CHAR > self.max_bytes):
+            # 重建文档的开销与当前内容的大小成正比，残留的文字比当前内容少时留到之后，除非已超出预算
+            live = self.text_edit.document().characterCount() * BYTES_PER_CHAR
+            self.trim(compact_bytes=min(self.max_bytes, max(COMPACT_BYTES, live)))
+        saved = self.saved_content() if self.saved_content is not None else None
+        if self.spill_directory is None or not saved or not saved[0] or saved is self._spilled_content:
+            return
+        self._spilled_content = saved
+        content, kind = saved
+        directory = self.spill_directory
+        path = os.path.join(directory, f"{time.time_ns() // 1_000_000}.{'html' if kind == 'html' else 'txt'}.z")
+        # 压缩和写盘在后台线程进行
+        _writer().start(lambda: _write_spill(directory, path, content))
+
+    def discard_spilled(self):
+        """删除便签的磁盘记录（便签关闭或释放时）"""
+        directory = self.spill_directory
+        if directory is not None:
+            self._spilled_content = None
+            # 与写入在同一个后台线程中依次进行，不会被尚未完成的写入重新创建
+            _writer().start(lambda: shutil.rmtree(directory, ignore_errors=True))
+
+    def spilled(self):
+        """磁盘上的记录，返回 [(时间戳, 路径)]，最新的在前"""
+        return spilled_entries(self.spill_directory) if self.spill_directory else []
+
+    def restore(self, path):
+        """用磁盘记录替换当前内容，替换本身可以撤销"""
+        with open(path, "rb") as f:
+            content = zlib.decompress(f.read()).decode("utf-8")
+        self.before_edit(self.text_edit.document().characterCount())
+        self.text_edit.replace_content(content, html=path.endswith(".html.z"))
+
+
+_pool = None
+
+
+def _writer():
+    """写入和删除磁盘记录的后台线程，按提交顺序执行"""
+    global _pool
+    if _pool is None:
+        _pool = QThreadPool()
+        _pool.setMaxThreadCount(1)
+    return _pool
+
+
+def spilled_entries(directory):
+    """目录中的撤销记录，返回 [(时间戳, 路径)]，最新的在前"""
+    if not os.path.isdir(directory):
+        return []
+    entries = []
+    for name in os.listdir(directory):
+        stamp = name.split(".", 1)[0]
+        if name.endswith(".z") and stamp.isdigit():
+            entries.append((int(stamp) / 1000, os.path.join(directory, name)))
+    entries.sort(reverse=True)
+    return entries
+
+
+def spilled_texts(root=None):
+    """所有便签的撤销磁盘记录解压后的内容，用于查找其中引用的图片；读取期间被删除的记录跳过"""
+    root = root or os.path.join(default_data_dir(), UNDO_DIR_NAME)
+    if not os.path.isdir(root):
+        return
+    for name in os.listdir(root):
+        for _, path in spilled_entries(os.path.join(root, name)):
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            yield zlib.decompress(data).decode("utf-8")
+
+
+def _write_spill(directory, path, content):
+    os.makedirs(directory, exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(zlib.compress(content.encode("utf-8"), 1))
+    os.replace(path + ".tmp", path)
+    for _, old_path in spilled_entries(directory)[MAX_SPILLED:]:
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
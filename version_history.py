@@ -0,0 +1,319 @@
+# version_history.py
+# 便签版本历史，模块级别只导入标准库
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from note_store import default_data_dir
+
+HISTORY_DIR_NAME = "history"
+HISTORY_SUFFIX = ".history"
+# 两次自动快照的最小间隔(秒)，破坏性编辑之前的快照不受限制
+SNAPSHOT_INTERVAL = 60
+# 每隔多少个版本保存一个完整的关键帧，还原任意版本最多应用 KEYFRAME_INTERVAL - 1 个差异
+KEYFRAME_INTERVAL = 20
+# 每个便签最多保留的版本数，超出时删除最早的一组(关键帧及其后的差异)
+MAX_VERSIONS = 500
+# 差异中间部分的行数乘积超过该值时不再逐行比较，直接保存新内容，避免 difflib 的平方级开销
+MAX_DIFF_WORK = 4_000_000
+# 最多为多少个最近记录过版本的便签在内存中保留最新版本的内容，其余便签下次记录时从磁盘还原
+LATEST_CACHE_SIZE = 8
+
+
+def common_affixes(old_lines, new_lines):
+    """两个行列表相同的开头与结尾的行数 (prefix, suffix)，两者不重叠"""
+    limit = min(len(old_lines), len(new_lines))
+    prefix = 0
+    while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < limit - prefix
+           and old_lines[len(old_lines) - 1 - suffix] == new_lines[len(new_lines) - 1 - suffix]):
+        suffix += 1
+    return prefix, suffix
+
+
+def diff_work(old_lines, new_lines):
+    """逐行比较两个行列表的代价：去掉相同的开头和结尾后中间部分的行数乘积"""
+    prefix, suffix = common_affixes(old_lines, new_lines)
+    return (len(old_lines) - prefix - suffix) * (len(new_lines) - prefix - suffix)
+
+
+def make_delta(old, new):
+    """
+    按行计算 new 相对 old 的差异：[起始行, 结束行] 表示复制 old 中的行，字符串表示新插入的文字。
+    先去掉相同的开头和结尾，只比较中间改动的部分
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    prefix, suffix = common_affixes(old_lines, new_lines)
+
+    delta = [[0, prefix]] if prefix else []
+    old_middle = old_lines[prefix:len(old_lines) - suffix]
+    new_middle = new_lines[prefix:len(new_lines) - suffix]
+    if old_middle and new_middle and len(old_middle) * len(new_middle) <= MAX_DIFF_WORK:
+        from difflib import SequenceMatcher
+        matcher = SequenceMatcher(None, old_middle, new_middle)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                delta.append([prefix + i1, prefix + i2])
+            elif j2 > j1:
+                delta.append("".join(new_middle[j1:j2]))
+    elif new_middle:
+        delta.append("".join(new_middle))
+    if suffix:
+        delta.append([len(old_lines) - suffix, len(old_lines)])
+    return delta
+
+
+def apply_delta(old_lines, delta):
+    """对按行拆分的旧版本应用差异，返回新版本的行列表"""
+    lines = []
+    for op in delta:
+        if isinstance(op, str):
+            lines.extend(op.splitlines(keepends=True))
+        else:
+            lines.extend(old_lines[op[0]:op[1]])
+    return lines
+
+
+class NoteHistory:
+    """
+    单个便签的版本历史，保存在一个追加写的文件中，每条记录是一行 JSON 头加压缩后的数据。
+    每个版本保存相对上一版本的差异，每 KEYFRAME_INTERVAL 个版本保存一个完整关键帧，
+    读取任意版本只需从最近的关键帧开始应用少量差异
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        self.last_snapshot = 0.0
+        # 最新版本的内容，计算下一个差异时无需从磁盘还原
+        self._latest = None
+        # 文件中最后一条完整记录的结尾，崩溃时写了一半的记录在下次写入前截掉
+        self._valid_end = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        with open(self.path, "rb") as f:
+            while True:
+                start = f.tell()
+                header = f.readline()
+                if not header:
+                    break
+                try:
+                    entry = json.loads(header)
+                except ValueError:
+                    break
+                entry["start"], entry["offset"] = start, f.tell()
+                if entry["offset"] + entry["length"] > size:
+                    break
+                f.seek(entry["length"], os.SEEK_CUR)
+                self.entries.append(entry)
+                self._valid_end = f.tell()
+        if self.entries:
+            self.last_snapshot = self.entries[-1]["t"]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self, content, kind="html", timestamp=None):
+        """记录一个新版本；与最新版本相同时跳过，返回是否记录"""
+        with self._lock:
+            latest = self._latest_locked()
+            if latest == content:
+                return False
+            since_key = 0
+            for entry in reversed(self.entries):
+                if entry["key"]:
+                    break
+                since_key += 1
+            data = None
+            key = latest is None or since_key >= KEYFRAME_INTERVAL - 1
+            if not key:
+                data = zlib.compress(json.dumps(make_delta(latest, content), ensure_ascii=False).encode("utf-8"))
+            full = zlib.compress(content.encode("utf-8")) if key or len(data) > len(content) // 4 else None
+            if full is not None and (data is None or len(full) <= len(data)):
+                # 改动很大时差异不比完整内容小，直接保存关键帧
+                data, key = full, True
+
+            entry = {"t": timestamp or time.time(), "length": len(data), "key": key, "kind": kind,
+                     "chars": len(content)}
+            header = (json.dumps(entry) + "\n").encode("utf-8")
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "r+b" if os.path.exists(self.path) else "wb") as f:
+                f.truncate(self._valid_end)
+                f.seek(self._valid_end)
+                f.write(header + data)
+            entry["start"], entry["offset"] = self._valid_end, self._valid_end + len(header)
+            self._valid_end = entry["offset"] + len(data)
+            self.entries.append(entry)
+            self.last_snapshot = entry["t"]
+            self._latest = content
+            if len(self.entries) > MAX_VERSIONS:
+                self._prune_locked()
+            return True
+
+    def drop_latest(self):
+        """释放内存中最新版本的内容，需要时再从磁盘还原"""
+        with self._lock:
+            self._latest = None
+
+    def _latest_locked(self):
+        if self._latest is None and self.entries:
+            self._latest = self._version_locked(len(self.entries) - 1)
+        return self._latest
+
+    def version(self, index):
+        """还原第 index 个版本(0 为最早)的内容"""
+        with self._lock:
+            if index == len(self.entries) - 1 and self._latest is not None:
+                return self._latest
+            return self._version_locked(index)
+
+    def _version_locked(self, index):
+        start = index
+        while not self.entries[start]["key"]:
+            start -= 1
+        with open(self.path, "rb") as f:
+            lines = None
+            for entry in self.entries[start:index + 1]:
+                f.seek(entry["offset"])
+                data = zlib.decompress(f.read(entry["length"])).decode("utf-8")
+                if entry["key"]:
+                    lines = data.splitlines(keepends=True)
+                else:
+                    lines = apply_delta(lines, json.loads(data))
+        return "".join(lines)
+
+    def _prune_locked(self):
+        """删除最早的一组版本(第一个关键帧到第二个关键帧之前)，原子地重写文件"""
+        keys = [i for i, entry in enumerate(self.entries) if entry["key"]]
+        if len(keys) < 2:
+            return
+        keep = self.entries[keys[1]:]
+        start = keep[0]["start"]
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(self._valid_end - start)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        for entry in keep:
+            entry["start"] -= start
+            entry["offset"] -= start
+        self._valid_end -= start
+        self.entries = keep
+
+    def disk_size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+
+def record_texts(directory):
+    """
+    目录中所有历史文件每条记录解压后的文字：关键帧为完整内容，差异为 JSON，用于查找其中引用的图片。
+    读取期间被删除的文件跳过，其他错误照常抛出
+    """
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if not name.endswith(HISTORY_SUFFIX):
+            continue
+        history = NoteHistory(os.path.join(directory, name))
+        try:
+            f = open(history.path, "rb")
+        except FileNotFoundError:
+            continue
+        with f:
+            for entry in history.entries:
+                f.seek(entry["offset"])
+                yield zlib.decompress(f.read(entry["length"])).decode("utf-8")
+
+
+class VersionHistory:
+    """
+    所有便签的版本历史；压缩与写盘在后台单线程中按顺序进行。
+    只有最近记录过版本的 LATEST_CACHE_SIZE 个便签在内存中保留最新版本的内容
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(default_data_dir(), HISTORY_DIR_NAME)
+        self._histories = {}
+        # note_id -> 保留了最新版本内容的历史，最近记录的在后；只在后台线程中修改
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _path(self, note_id):
+        return os.path.join(self.directory, note_id + HISTORY_SUFFIX)
+
+    def history(self, note_id):
+        with self._lock:
+            history = self._histories.get(note_id)
+            if history is None:
+                history = self._histories[note_id] = NoteHistory(self._path(note_id))
+            return history
+
+    def snapshot(self, note_id, content, kind="html", force=False):
+        """
+        在后台记录便签的一个版本。
+        距上次快照不足 SNAPSHOT_INTERVAL 秒时跳过，force 为 True 时(破坏性编辑之前)总是记录
+        """
+        history = self.history(note_id)
+        if not force and time.time() - history.last_snapshot < SNAPSHOT_INTERVAL:
+            return False
+        # 先占用时间，避免后台写入完成前重复提交
+        history.last_snapshot = time.time()
+        self._start(lambda: self._record(note_id, history, content, kind))
+        return True
+
+    def _record(self, note_id, history, content, kind):
+        history.record(content, kind)
+        self._recent[note_id] = history
+        self._recent.move_to_end(note_id)
+        while len(self._recent) > LATEST_CACHE_SIZE:
+            self._recent.popitem(last=False)[1].drop_latest()
+
+    def delete(self, note_id):
+        """删除便签的全部历史版本(便签被删除时)，在尚未完成的写入之后进行"""
+        with self._lock:
+            self._histories.pop(note_id, None)
+        self._start(lambda: self._delete(note_id))
+
+    def _delete(self, note_id):
+        self._recent.pop(note_id, None)
+        try:
+            os.remove(self._path(note_id))
+        except OSError:
+            pass
+
+    def _start(self, task):
+        if self._pool is None:
+            from PySide6.QtCore import QThreadPool
+            self._pool = QThreadPool()
+            self._pool.setMaxThreadCount(1)
+        self._pool.start(task)
+
+    def wait(self):
+        """等待后台写入完成"""
+        if self._pool is not None:
+            self._pool.waitForDone()
+
+
+_version_history = None
+
+
+def get_version_history():
+    """获取全局版本历史"""
+    global _version_history
+    if _version_history is None:
+        _version_history = VersionHistory()
+    return _version_history